@@ -0,0 +1,223 @@
+import argparse
+import sys
+from datetime import datetime, timezone
+
+from sqlalchemy import text
+
+from app.db.session import SessionLocal
+from app.services.catalog import check_catalog_items, rebuild_catalog_items
+from app.services.catalog_import import IMPORT_FORMATS, import_catalog
+from app.services.dashboard import get_dashboard_totals, rebuild_dashboard_totals, recompute_dashboard_totals
+from app.core.config import settings
+from app.services.events import notify_inventory_change
+from app.services.movement_partitions import (
+    archive_movement_partitions,
+    ensure_movement_partitions,
+    list_movement_partitions,
+)
+from app.services.sales_reports import check_sales_rollups, rebuild_sales_rollups
+from app.services.warehouses import ensure_default_warehouse
+
+
+def rebuild_catalog(_: argparse.Namespace) -> int:
+    with SessionLocal() as db:
+        count = rebuild_catalog_items(db)
+        db.commit()
+    print(f"catalog_items rebuilt: {count} active variants")
+    return 0
+
+
+def check_catalog(_: argparse.Namespace) -> int:
+    with SessionLocal() as db:
+        problems = check_catalog_items(db)
+    for problem in problems:
+        print(
+            f"{problem['variant_id']} {problem['problem']} "
+            f"read_model_qty={problem['read_model_qty']} stock_view_qty={problem['stock_view_qty']}"
+        )
+    print(f"catalog_items check: {len(problems)} inconsistent rows")
+    return 1 if problems else 0
+
+
+def rebuild_dashboard(_: argparse.Namespace) -> int:
+    with SessionLocal() as db:
+        totals = rebuild_dashboard_totals(db)
+        db.commit()
+    print("dashboard_totals rebuilt: " + " ".join(f"{key}={value}" for key, value in totals.items()))
+    return 0
+
+
+def check_dashboard(_: argparse.Namespace) -> int:
+    with SessionLocal() as db:
+        stored = get_dashboard_totals(db)
+        recomputed = recompute_dashboard_totals(db)
+    mismatches = 0
+    for key, value in recomputed.items():
+        marker = "ok" if stored[key] == value else "MISMATCH"
+        mismatches += marker != "ok"
+        print(f"{key}: stored={stored[key]} recomputed={value} {marker}")
+    return 1 if mismatches else 0
+
+
+def rebuild_sales(args: argparse.Namespace) -> int:
+    since = None
+    if args.since:
+        try:
+            since = datetime.strptime(args.since, "%Y-%m-%d").date()
+        except ValueError:
+            print(f"--since expects YYYY-MM-DD, got {args.since}")
+            return 2
+
+    with SessionLocal() as db:
+        counts = rebuild_sales_rollups(db, since)
+        db.commit()
+    scope = f"from {since}" if since else "all days"
+    print(f"sales rollups rebuilt ({scope}, {settings.sales_report_timezone}): " + " ".join(
+        f"{key}={value}" for key, value in counts.items()
+    ))
+    return 0
+
+
+def check_sales(_: argparse.Namespace) -> int:
+    with SessionLocal() as db:
+        problems = check_sales_rollups(db)
+    for problem in problems:
+        print(
+            f"{problem['sale_date']} {problem['level']} {problem['key'] or '-'} "
+            f"tickets={problem['stored_tickets']}/{problem['ledger_tickets']} "
+            f"units={problem['stored_units']}/{problem['ledger_units']} "
+            f"revenue={problem['stored_revenue']}/{problem['ledger_revenue']} "
+            f"cost={problem['stored_cost']}/{problem['ledger_cost']}"
+        )
+    print(f"sales rollups check: {len(problems)} inconsistent rows (stored/ledger)")
+    return 1 if problems else 0
+
+
+def import_catalog_file(args: argparse.Namespace) -> int:
+    fmt = args.format or args.path.rsplit(".", 1)[-1].lower().replace("ndjson", "jsonl")
+    if fmt not in IMPORT_FORMATS:
+        print(f"unknown format for {args.path}, pass --format csv or --format jsonl")
+        return 2
+
+    with SessionLocal() as db:
+        user_id = db.execute(
+            text("SELECT id::text FROM users WHERE username = :username AND is_active"),
+            {"username": args.user},
+        ).scalar()
+        if not user_id:
+            print(f"user not found: {args.user}")
+            return 2
+        warehouse_id = ensure_default_warehouse(db)
+        with open(args.path, "rb") as stream:
+            summary, variant_ids = import_catalog(db, stream, fmt, user_id, warehouse_id)
+        notify_inventory_change(db, variant_ids)
+        db.commit()
+
+    for error in summary["errors"]:
+        print(f"row {error['row']} {error['code'] or '-'}: {error['error']}")
+    if summary["errors_truncated"]:
+        print(f"... {summary['failed'] - len(summary['errors'])} more errors")
+    print(f"catalog import: {summary['rows']} rows, {summary['created']} created, {summary['failed']} failed")
+    return 1 if summary["failed"] else 0
+
+
+def set_user_active(args: argparse.Namespace) -> int:
+    # The users trigger notifies running API processes, which drop the user
+    # from their auth cache right away.
+    with SessionLocal() as db:
+        updated = db.execute(
+            text("UPDATE users SET is_active = :is_active WHERE username = :username"),
+            {"is_active": args.active == "on", "username": args.username},
+        ).rowcount
+        db.commit()
+    if not updated:
+        print(f"user not found: {args.username}")
+        return 1
+    print(f"{args.username}: is_active={args.active == 'on'}")
+    return 0
+
+
+def movement_partitions(args: argparse.Namespace) -> int:
+    with SessionLocal() as db:
+        created = ensure_movement_partitions(db, args.months_ahead)
+        db.commit()
+        partitions = list_movement_partitions(db)
+    for partition in partitions:
+        print(
+            f"{partition['name']}: ~{partition['estimated_rows']} rows, "
+            f"{partition['total_bytes'] / 1024 / 1024:.1f} MB"
+        )
+    print(f"stock_movements partitions: {len(partitions)} ({created} created)")
+    return 0
+
+
+def archive_movements(args: argparse.Namespace) -> int:
+    try:
+        before = datetime.strptime(args.before, "%Y-%m").date()
+    except ValueError:
+        print(f"--before expects YYYY-MM, got {args.before}")
+        return 2
+    current_month = datetime.now(timezone.utc).date().replace(day=1)
+    if before > current_month:
+        print(f"--before cannot be later than the current month ({current_month:%Y-%m})")
+        return 2
+
+    with SessionLocal() as db:
+        archived = archive_movement_partitions(db, before, args.drop)
+        db.commit()
+    for name in archived:
+        print(f"{name}: {'dropped' if args.drop else 'moved to the archive schema'}")
+    print(f"stock_movements: {len(archived)} partitions before {before:%Y-%m} detached")
+    return 0
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(prog="python -m app.cli", description="Ma' Girls API maintenance commands")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    commands.add_parser("rebuild-catalog", help="Recreate catalog_items from the base tables").set_defaults(
+        handler=rebuild_catalog
+    )
+    commands.add_parser("check-catalog", help="Compare catalog_items against v_variant_stock").set_defaults(
+        handler=check_catalog
+    )
+    commands.add_parser("rebuild-dashboard", help="Recompute dashboard_totals from the sales ledger").set_defaults(
+        handler=rebuild_dashboard
+    )
+    commands.add_parser(
+        "check-dashboard", help="Compare dashboard_totals against a full recompute"
+    ).set_defaults(handler=check_dashboard)
+    sales_rebuild = commands.add_parser(
+        "rebuild-sales-rollups", help="Recompute the daily sales rollups from the sales ledger"
+    )
+    sales_rebuild.add_argument("--since", help="only rebuild sale dates from YYYY-MM-DD on")
+    sales_rebuild.set_defaults(handler=rebuild_sales)
+    commands.add_parser(
+        "check-sales-rollups", help="Compare the daily sales rollups against the sales ledger"
+    ).set_defaults(handler=check_sales)
+    catalog_import = commands.add_parser("import-catalog", help="Bulk-load products from a CSV or JSONL file")
+    catalog_import.add_argument("path")
+    catalog_import.add_argument("--user", required=True, help="username recorded on the stock movements")
+    catalog_import.add_argument("--format", choices=IMPORT_FORMATS)
+    catalog_import.set_defaults(handler=import_catalog_file)
+    user_active = commands.add_parser("set-user-active", help="Activate or deactivate a user account")
+    user_active.add_argument("username")
+    user_active.add_argument("active", choices=["on", "off"])
+    user_active.set_defaults(handler=set_user_active)
+
+    partitions = commands.add_parser(
+        "movement-partitions", help="Create upcoming stock_movements partitions and list them"
+    )
+    partitions.add_argument("--months-ahead", type=int, default=settings.movement_partitions_ahead)
+    partitions.set_defaults(handler=movement_partitions)
+    archive = commands.add_parser("archive-movements", help="Detach stock_movements partitions older than a month")
+    archive.add_argument("--before", required=True, help="first month to keep, YYYY-MM")
+    archive.add_argument("--drop", action="store_true", help="drop the detached partitions instead of archiving")
+    archive.set_defaults(handler=archive_movements)
+
+    args = parser.parse_args(argv)
+    return args.handler(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,4 +1,7 @@
-﻿from pydantic_settings import BaseSettings, SettingsConfigDict
+﻿from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
+
+from pydantic import field_validator
+from pydantic_settings import BaseSettings, SettingsConfigDict
 
 
 class Settings(BaseSettings):
@@ -6,9 +9,46 @@ class Settings(BaseSettings):
     jwt_secret: str
     jwt_algorithm: str = "HS256"
     jwt_expires_minutes: int = 1440
+    db_pool_size: int = 5
+    db_max_overflow: int = 10
+    db_pool_recycle_seconds: int = 1800
+    db_pool_timeout_seconds: float = 30
+    db_statement_timeout_ms: int | None = None
+    db_lock_timeout_ms: int | None = None
+    db_prepared_statements: bool = True
+    db_prepare_threshold: int = 1
     default_warehouse_name: str = "Main Warehouse"
+    movement_partitions_ahead: int = 3
+    movement_partitions_check_hours: float = 24
+    sales_report_timezone: str = "UTC"
+    low_stock_cover_days: int = 28
+    idempotency_ttl_hours: float = 24
+    idempotency_cleanup_minutes: float = 60
+    lookup_cache_enabled: bool = True
+    lookup_cache_max_entries: int = 5000
+    lookup_cache_ttl_seconds: float = 300
+    lookup_cache_stock_ttl_seconds: float = 5
+    login_hash_workers: int = 2
+    login_hash_queue_limit: int = 32
+    auth_cache_enabled: bool = True
+    auth_cache_max_entries: int = 1000
+    auth_cache_ttl_seconds: float = 30
+    metrics_enabled: bool = True
+    events_enabled: bool = True
+    events_database_url: str | None = None
+    events_heartbeat_seconds: float = 15
 
     model_config = SettingsConfigDict(env_file=".env", env_file_encoding="utf-8")
 
+    @field_validator("sales_report_timezone")
+    @classmethod
+    def _known_timezone(cls, value: str) -> str:
+        # Checkout passes it to Postgres; an unknown zone would fail every sale.
+        try:
+            ZoneInfo(value)
+        except ZoneInfoNotFoundError:
+            raise ValueError(f"unknown time zone: {value}") from None
+        return value
+
 
 settings = Settings()
@@ -0,0 +1,47 @@
+import bisect
+import threading
+from typing import Any
+
+DEFAULT_BUCKETS_MS = (1, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000)
+
+
+class Histogram:
+    def __init__(self, buckets: tuple[float, ...] = DEFAULT_BUCKETS_MS):
+        self.buckets = tuple(sorted(buckets))
+        self._counts = [0] * (len(self.buckets) + 1)
+        self._lock = threading.Lock()
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def observe(self, value: float) -> None:
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            self._counts[index] += 1
+            self.count += 1
+            self.total += value
+            self.max = max(self.max, value)
+
+    def snapshot(self) -> tuple[dict[str, int], int, float, float]:
+        with self._lock:
+            counts = list(self._counts)
+            count, total, peak = self.count, self.total, self.max
+
+        # Cumulative, Prometheus-style: each bucket counts observations <= le.
+        buckets: dict[str, int] = {}
+        running = 0
+        for bound, bucket_count in zip(self.buckets, counts):
+            running += bucket_count
+            buckets[f"{bound:g}"] = running
+        buckets["+Inf"] = count
+        return buckets, count, total, peak
+
+    def stats(self) -> dict[str, Any]:
+        buckets, count, total, peak = self.snapshot()
+        return {
+            "count": count,
+            "sum": round(total, 3),
+            "max": round(peak, 3),
+            "avg": round(total / count, 3) if count else 0.0,
+            "buckets": buckets,
+        }
@@ -0,0 +1,107 @@
+import time
+from typing import Any
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+from sqlalchemy.pool import AsyncAdaptedQueuePool, QueuePool
+
+from app.core.config import settings
+from app.core.metrics import Histogram
+
+
+class PoolMetrics:
+    def __init__(self):
+        self.wait_ms = Histogram()
+        self.checkout_ms = Histogram()
+        self.timeouts = 0
+
+    def stats(self) -> dict[str, Any]:
+        return {
+            "timeouts": self.timeouts,
+            "wait_ms": self.wait_ms.stats(),
+            "checkout_ms": self.checkout_ms.stats(),
+        }
+
+
+class _InstrumentedPoolMixin:
+    metrics: PoolMetrics
+
+    def connect(self):
+        # Time spent waiting for a free slot (or opening a new connection).
+        started = time.perf_counter()
+        try:
+            return super().connect()
+        except PoolTimeoutError:
+            self.metrics.timeouts += 1
+            raise
+        finally:
+            self.metrics.wait_ms.observe((time.perf_counter() - started) * 1000)
+
+
+class InstrumentedQueuePool(_InstrumentedPoolMixin, QueuePool):
+    metrics = PoolMetrics()
+
+
+class InstrumentedAsyncQueuePool(_InstrumentedPoolMixin, AsyncAdaptedQueuePool):
+    metrics = PoolMetrics()
+
+
+def prepare_threshold() -> int | None:
+    # psycopg switches a statement to a server-side prepared one after this
+    # many executions of the same SQL text on a connection. None turns it off,
+    # which transaction-mode poolers (PgBouncer < 1.21) need.
+    return settings.db_prepare_threshold if settings.db_prepared_statements else None
+
+
+def engine_options() -> dict[str, Any]:
+    return {
+        "pool_pre_ping": True,
+        "pool_size": settings.db_pool_size,
+        "max_overflow": settings.db_max_overflow,
+        "pool_recycle": settings.db_pool_recycle_seconds,
+        "pool_timeout": settings.db_pool_timeout_seconds,
+        "connect_args": {"prepare_threshold": prepare_threshold()},
+    }
+
+
+def instrument_engine(engine: Engine) -> None:
+    metrics = type(engine.pool).metrics
+
+    @event.listens_for(engine, "checkout")
+    def _on_checkout(dbapi_connection, connection_record, connection_proxy):
+        connection_record.info["checked_out_at"] = time.perf_counter()
+
+    @event.listens_for(engine, "checkin")
+    def _on_checkin(dbapi_connection, connection_record):
+        checked_out_at = connection_record.info.pop("checked_out_at", None)
+        if checked_out_at is not None:
+            metrics.checkout_ms.observe((time.perf_counter() - checked_out_at) * 1000)
+
+    timeouts = {
+        "statement_timeout": settings.db_statement_timeout_ms,
+        "lock_timeout": settings.db_lock_timeout_ms,
+    }
+    timeouts = {name: value for name, value in timeouts.items() if value is not None}
+    if not timeouts:
+        return
+
+    @event.listens_for(engine, "connect")
+    def _set_timeouts(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        for name, value in timeouts.items():
+            cursor.execute("SELECT set_config(%s, %s, false)", (name, f"{value}ms"))
+        cursor.close()
+        dbapi_connection.commit()
+
+
+def pool_stats(engine: Engine) -> dict[str, Any]:
+    pool = engine.pool
+    return {
+        "size": pool.size(),
+        "max_overflow": settings.db_max_overflow,
+        "checked_out": pool.checkedout(),
+        "idle": pool.checkedin(),
+        "overflow": max(pool.overflow(), 0),
+        **type(pool).metrics.stats(),
+    }
@@ -0,0 +1,130 @@
+import threading
+import time
+from collections import deque
+from collections.abc import Iterator
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any
+
+from sqlalchemy import event, text
+from sqlalchemy.engine import Engine
+from sqlalchemy.sql.elements import TextClause
+
+UNNAMED_QUERY = "unnamed"
+LATENCY_SAMPLES = 1000
+
+
+class QueryStats:
+    def __init__(self):
+        self.calls = 0
+        self.errors = 0
+        self.rows = 0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+        self.recent_ms: deque[float] = deque(maxlen=LATENCY_SAMPLES)
+
+    def snapshot(self, name: str) -> dict[str, Any]:
+        recent = sorted(self.recent_ms)
+        return {
+            "name": name,
+            "calls": self.calls,
+            "errors": self.errors,
+            "rows": self.rows,
+            "total_ms": round(self.total_ms, 3),
+            "mean_ms": round(self.total_ms / self.calls, 3) if self.calls else 0.0,
+            "p95_ms": round(recent[int(len(recent) * 0.95) - 1], 3) if len(recent) >= 20 else None,
+            "max_ms": round(self.max_ms, 3),
+        }
+
+
+_lock = threading.Lock()
+_clauses: dict[tuple[str, str], TextClause] = {}
+_stats: dict[str, QueryStats] = {}
+
+
+class DbTime:
+    def __init__(self):
+        self.queries = 0
+        self.seconds = 0.0
+
+
+# Set per HTTP request by the metrics middleware. Threadpool and run_sync
+# calls run in a copy of the request context, so they add to the same object.
+_db_time: ContextVar[DbTime | None] = ContextVar("db_time", default=None)
+
+
+@contextmanager
+def track_db_time() -> Iterator[DbTime]:
+    db_time = DbTime()
+    token = _db_time.set(db_time)
+    try:
+        yield db_time
+    finally:
+        _db_time.reset(token)
+
+
+def named_query(name: str, sql: str) -> TextClause:
+    # Statements are registered by name so the stats below can be grouped per
+    # query. The SQL text of each name stays byte-identical between calls,
+    # which is what psycopg keys its prepared statements on.
+    key = (name, sql)
+    clause = _clauses.get(key)
+    if clause is None:
+        clause = text(sql).execution_options(query_name=name)
+        with _lock:
+            _clauses.setdefault(key, clause)
+            _stats.setdefault(name, QueryStats())
+    return clause
+
+
+def _query_name(context: Any) -> str:
+    if context is None:
+        return UNNAMED_QUERY
+    return context.execution_options.get("query_name", UNNAMED_QUERY)
+
+
+def _record(name: str, elapsed_ms: float, rows: int, failed: bool) -> None:
+    db_time = _db_time.get()
+    if db_time is not None:
+        db_time.queries += 1
+        db_time.seconds += elapsed_ms / 1000
+    with _lock:
+        stats = _stats.setdefault(name, QueryStats())
+        stats.calls += 1
+        stats.errors += failed
+        stats.rows += max(rows, 0)
+        stats.total_ms += elapsed_ms
+        stats.max_ms = max(stats.max_ms, elapsed_ms)
+        stats.recent_ms.append(elapsed_ms)
+
+
+@event.listens_for(Engine, "before_cursor_execute")
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("query_started_at", []).append(time.perf_counter())
+
+
+@event.listens_for(Engine, "after_cursor_execute")
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    started = conn.info["query_started_at"].pop()
+    _record(_query_name(context), (time.perf_counter() - started) * 1000, cursor.rowcount, False)
+
+
+@event.listens_for(Engine, "handle_error")
+def _handle_error(exception_context):
+    started_at = exception_context.connection.info.get("query_started_at") if exception_context.connection else None
+    if not started_at:
+        return
+    elapsed_ms = (time.perf_counter() - started_at.pop()) * 1000
+    _record(_query_name(exception_context.execution_context), elapsed_ms, 0, True)
+
+
+def query_stats() -> list[dict[str, Any]]:
+    with _lock:
+        rows = [stats.snapshot(name) for name, stats in _stats.items() if stats.calls]
+    return sorted(rows, key=lambda row: row["total_ms"], reverse=True)
+
+
+def reset_query_stats() -> None:
+    with _lock:
+        for name in _stats:
+            _stats[name] = QueryStats()
@@ -1,11 +1,20 @@
 ﻿from sqlalchemy import create_engine
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
 from sqlalchemy.orm import sessionmaker
 
 from app.core.config import settings
+from app.db.pool import InstrumentedAsyncQueuePool, InstrumentedQueuePool, engine_options, instrument_engine
 
-engine = create_engine(settings.database_url, pool_pre_ping=True)
+engine = create_engine(settings.database_url, poolclass=InstrumentedQueuePool, **engine_options())
+instrument_engine(engine)
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+# Same URL, psycopg's async driver: hot endpoints await the database instead
+# of holding a threadpool worker for the whole round trip.
+async_engine = create_async_engine(settings.database_url, poolclass=InstrumentedAsyncQueuePool, **engine_options())
+instrument_engine(async_engine.sync_engine)
+AsyncSessionLocal = async_sessionmaker(autoflush=False, bind=async_engine)
+
 
 def get_db():
     db = SessionLocal()
@@ -13,3 +22,8 @@ def get_db():
         yield db
     finally:
         db.close()
+
+
+async def get_async_db():
+    async with AsyncSessionLocal() as db:
+        yield db
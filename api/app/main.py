@@ -1,27 +1,137 @@
-﻿from decimal import Decimal
-from typing import Any
-
-from fastapi import Depends, FastAPI, HTTPException, status
+﻿import asyncio
+import csv
+import json
+import logging
+import time
+from contextlib import asynccontextmanager
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+from typing import Any, Literal
+from zoneinfo import ZoneInfo
+
+import psycopg
+from fastapi import Depends, FastAPI, File, Header, HTTPException, Query, Request, Response, UploadFile, status
+from fastapi.concurrency import run_in_threadpool
+from fastapi.encoders import jsonable_encoder
 from fastapi.middleware.cors import CORSMiddleware
-from sqlalchemy import text
-from sqlalchemy.exc import IntegrityError
+from fastapi.responses import JSONResponse, StreamingResponse
+from sqlalchemy.exc import DataError, IntegrityError, OperationalError, SQLAlchemyError
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 
-from app.core.security import create_access_token, verify_password
-from app.db.session import get_db
+from app.core.config import settings
+from app.core.security import create_access_token
+from app.db.pool import pool_stats, prepare_threshold
+from app.db.queries import named_query, query_stats, reset_query_stats
+from app.db.session import SessionLocal, async_engine, engine, get_async_db, get_db
 from app.schemas.auth import LoginRequest, TokenResponse
 from app.schemas.inventory import (
+    CatalogImportResponse,
+    CatalogSearchItem,
     InventoryByCodeResponse,
+    InventoryChanges,
     InventoryListItem,
     InventoryUpdateRequest,
     LowStockItem,
     ScanUpsertRequest,
+    StockIncreaseBatchRequest,
+    StockIncreaseBatchResponse,
     StockIncreaseRequest,
+    StockIncreaseResult,
+    StockHistoryBucket,
+    StockMovementEntry,
+)
+from app.schemas.sales import (
+    CategoryMarginReport,
+    CheckoutRequest,
+    CheckoutResponse,
+    DashboardSummary,
+    SalesPeriodReport,
+    TopSellerReport,
+)
+from app.schemas.sync import SyncOperationResult, SyncReplayRequest, SyncReplayResponse
+from app.services.auth_cache import auth_cache_stats
+from app.services.catalog import (
+    adjust_catalog_stock,
+    list_catalog_changes,
+    refresh_catalog_items,
+    search_catalog_items,
+)
+from app.services.catalog_import import IMPORT_FORMATS, import_catalog
+from app.services.dashboard import (
+    adjust_invested_for_stock,
+    get_dashboard_totals,
+    remove_invested_for_variant,
+    reprice_dashboard_totals,
+)
+from app.services.deps import get_current_user, get_current_user_async
+from app.services.events import broker, build_snapshot_event, notify_inventory_change
+from app.services.exports import (
+    EXPORT_MEDIA_TYPES,
+    ExportFormat,
+    MovementType,
+    export_inventory,
+    export_stock_movements,
+)
+from app.services.idempotency import (
+    claim_idempotency_key,
+    maintain_idempotency_keys,
+    store_idempotent_response,
+)
+from app.services.lookup_cache import (
+    code_cache,
+    invalidate_codes,
+    invalidate_stock,
+    invalidate_variants,
+    lookup_cache_stats,
+    stock_cache,
+    variant_cache,
 )
-from app.schemas.sales import CheckoutRequest, CheckoutResponse, DashboardSummary
-from app.services.deps import get_current_user
+from app.services.movement_partitions import maintain_movement_partitions
+from app.services.pagination import decode_cursor, encode_cursor
+from app.services.password_pool import PasswordPoolSaturated, password_pool
+from app.services.request_metrics import PROMETHEUS_MEDIA_TYPE, RequestMetricsMiddleware, render_metrics
+from app.services.sales_reports import (
+    CHECKOUT_ROLLUP_CTES,
+    ReportInterval,
+    TopSellersOrder,
+    category_margins,
+    sales_by_period,
+    top_sellers,
+)
+from app.services.stock_history import (
+    HistoryInterval,
+    bucket_stock_movements,
+    list_stock_movements,
+    variant_exists,
+)
+from app.services.warehouses import (
+    DEFAULT_BATCH_CODE,
+    ensure_default_batch,
+    ensure_default_warehouse,
+    load_default_warehouse,
+)
+
+logger = logging.getLogger(__name__)
+
+
+@asynccontextmanager
+async def lifespan(_: FastAPI):
+    await run_in_threadpool(load_default_warehouse)
+    partitions_task = asyncio.create_task(maintain_movement_partitions())
+    idempotency_task = asyncio.create_task(maintain_idempotency_keys())
+    # Started even with the event stream disabled: its user_events listener
+    # is what lets the auth cache keep users (see services/auth_cache.py).
+    broker.start(asyncio.get_running_loop())
+    yield
+    broker.stop()
+    partitions_task.cancel()
+    idempotency_task.cancel()
+    await async_engine.dispose()
 
-app = FastAPI(title="Ma' Girls API", version="0.1.0")
+
+app = FastAPI(title="Ma' Girls API", version="0.1.0", lifespan=lifespan)
 
 app.add_middleware(
     CORSMiddleware,
@@ -29,147 +139,298 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor"],
 )
 
+if settings.metrics_enabled:
+    app.add_middleware(RequestMetricsMiddleware)
 
-def ensure_default_warehouse(db: Session) -> str:
-    warehouse = db.execute(
-        text("SELECT id::text AS id FROM warehouses ORDER BY created_at ASC LIMIT 1")
-    ).mappings().first()
 
-    if warehouse:
-        return warehouse["id"]
+@app.exception_handler(PoolTimeoutError)
+async def pool_timeout_handler(_: Request, __: PoolTimeoutError):
+    return JSONResponse(
+        status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+        content={"detail": "Database busy, try again"},
+        headers={"Retry-After": "1"},
+    )
 
-    created = db.execute(
-        text("INSERT INTO warehouses (name) VALUES ('Main Warehouse') RETURNING id::text AS id")
-    ).mappings().first()
-    return created["id"]
 
+@app.exception_handler(OperationalError)
+async def operational_error_handler(_: Request, __: OperationalError):
+    # Lock timeouts, deadlocks and lost connections: nothing was committed,
+    # so the request can be resent.
+    return JSONResponse(
+        status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+        content={"detail": "Database busy, try again"},
+        headers={"Retry-After": "1"},
+    )
 
-def ensure_default_batch(db: Session, warehouse_id: str, variant_id: str) -> str:
-    batch = db.execute(
-        text(
-            """
-            SELECT id::text AS id
-            FROM inventory_batches
-            WHERE warehouse_id = CAST(:warehouse_id AS uuid)
-              AND variant_id = CAST(:variant_id AS uuid)
-              AND batch_code = 'DEFAULT'
-              AND expires_at IS NULL
-            LIMIT 1
-            """
-        ),
-        {"warehouse_id": warehouse_id, "variant_id": variant_id},
-    ).mappings().first()
-
-    if batch:
-        return batch["id"]
-
-    created = db.execute(
-        text(
-            """
-            INSERT INTO inventory_batches (warehouse_id, variant_id, batch_code, expires_at)
-            VALUES (CAST(:warehouse_id AS uuid), CAST(:variant_id AS uuid), 'DEFAULT', NULL)
-            RETURNING id::text AS id
-            """
-        ),
-        {"warehouse_id": warehouse_id, "variant_id": variant_id},
-    ).mappings().first()
-    return created["id"]
+INVENTORY_SORT_KEYS: dict[str, tuple[tuple[str, str], ...]] = {
+    "name": (("product_name", "varchar"), ("variant_name", "text"), ("variant_id", "uuid")),
+    "qty": (("qty_on_hand", "int"), ("product_name", "varchar"), ("variant_name", "text"), ("variant_id", "uuid")),
+    "price": (("sale_price", "numeric"), ("variant_id", "uuid")),
+    "updated": (("updated_at", "timestamptz"), ("variant_id", "uuid")),
+}
+LOW_STOCK_SORT_KEYS: dict[str, tuple[tuple[str, str], ...]] = {
+    "qty": (("qty_on_hand", "int"), ("product_name", "varchar"), ("variant_name", "text"), ("variant_id", "uuid")),
+    "cover": (("cover_sort", "numeric"), ("variant_id", "uuid")),
+}
+NIL_UUID = "00000000-0000-0000-0000-000000000000"
 
 
 def get_variant_by_code(db: Session, code: str) -> dict[str, Any] | None:
+    code_generation = code_cache.generation()
+    variant_generation = variant_cache.generation()
+    stock_generation = stock_cache.generation()
+
+    variant_id = code_cache.get(code)
+    if variant_id:
+        static = variant_cache.get(variant_id)
+        qty_on_hand = stock_cache.get(variant_id)
+        if static is not None and qty_on_hand is not None:
+            return {**static, "qty_on_hand": qty_on_hand}
+
+        if static is not None:
+            qty_on_hand = db.execute(
+                named_query("variant.stock_by_id", "SELECT qty_on_hand FROM catalog_items WHERE variant_id = CAST(:variant_id AS uuid)"),
+                {"variant_id": variant_id},
+            ).scalar()
+            if qty_on_hand is not None:
+                stock_cache.set(variant_id, qty_on_hand, stock_generation)
+                return {**static, "qty_on_hand": qty_on_hand}
+
     row = db.execute(
-        text(
+        named_query("variant.by_code",
             """
             SELECT
-              pv.id::text AS variant_id,
-              p.name AS product_name,
-              COALESCE(pv.variant_name, CONCAT_WS(' / ', pv.color, pv.size)) AS variant_name,
-              pv.sale_price,
-              pv.purchase_price,
-              COALESCE(vs.qty_on_hand, 0) AS qty_on_hand
+              ci.variant_id::text AS variant_id,
+              ci.product_name,
+              ci.variant_name,
+              ci.sale_price,
+              ci.purchase_price,
+              ci.qty_on_hand
             FROM barcode_variants bv
-            JOIN product_variants pv ON pv.id = bv.variant_id
-            JOIN products p ON p.id = pv.product_id
-            LEFT JOIN v_variant_stock vs ON vs.variant_id = pv.id
+            JOIN catalog_items ci ON ci.variant_id = bv.variant_id
             WHERE bv.barcode_code = :code
-              AND p.is_active = TRUE
-              AND pv.is_active = TRUE
             LIMIT 1
             """
         ),
         {"code": code},
     ).mappings().first()
 
-    return dict(row) if row else None
+    if not row:
+        return None
 
+    variant = dict(row)
+    static = {key: value for key, value in variant.items() if key != "qty_on_hand"}
+    code_cache.set(code, variant["variant_id"], code_generation)
+    variant_cache.set(variant["variant_id"], static, variant_generation)
+    stock_cache.set(variant["variant_id"], variant["qty_on_hand"], stock_generation)
+    return variant
 
-def list_inventory_items(db: Session) -> list[dict[str, Any]]:
+
+def get_variants_by_codes(db: Session, codes: list[str]) -> dict[str, dict[str, Any]]:
     rows = db.execute(
-        text(
+        named_query("variant.by_codes",
             """
-            SELECT
-              pv.id::text AS variant_id,
-              p.name AS product_name,
-              COALESCE(pv.variant_name, CONCAT_WS(' / ', pv.color, pv.size)) AS variant_name,
-              p.category,
-              p.brand,
-              pv.location,
-              p.photo_url,
-              pv.sale_price,
-              pv.purchase_price,
-              COALESCE(vs.qty_on_hand, 0) AS qty_on_hand,
-              (
-                SELECT bv.barcode_code
-                FROM barcode_variants bv
-                WHERE bv.variant_id = pv.id
-                ORDER BY bv.is_primary DESC, bv.created_at ASC
-                LIMIT 1
-              ) AS primary_code
-            FROM product_variants pv
-            JOIN products p ON p.id = pv.product_id
-            LEFT JOIN v_variant_stock vs ON vs.variant_id = pv.id
-            WHERE p.is_active = TRUE AND pv.is_active = TRUE
-            ORDER BY p.name ASC, variant_name ASC
+            SELECT DISTINCT ON (bv.barcode_code)
+              bv.barcode_code AS code,
+              ci.variant_id::text AS variant_id,
+              ci.product_name,
+              ci.variant_name,
+              ci.sale_price,
+              ci.purchase_price,
+              ci.qty_on_hand
+            FROM barcode_variants bv
+            JOIN catalog_items ci ON ci.variant_id = bv.variant_id
+            WHERE bv.barcode_code = ANY(CAST(:codes AS varchar[]))
+            ORDER BY bv.barcode_code, bv.is_primary DESC, bv.created_at ASC
             """
+        ),
+        {"codes": codes},
+    ).mappings().all()
+
+    result: dict[str, dict[str, Any]] = {}
+    for row in rows:
+        variant = dict(row)
+        result[variant.pop("code")] = variant
+    return result
+
+
+def list_inventory_items(
+    db: Session,
+    *,
+    limit: int,
+    cursor: list[Any] | None = None,
+    sort: str = "name",
+    order: str = "asc",
+    category: str | None = None,
+    brand: str | None = None,
+    location: str | None = None,
+    min_qty: int | None = None,
+    max_qty: int | None = None,
+) -> list[dict[str, Any]]:
+    sort_columns = INVENTORY_SORT_KEYS[sort]
+    direction = "DESC" if order == "desc" else "ASC"
+    conditions: list[str] = []
+    params: dict[str, Any] = {"limit": limit}
+
+    for column, value in (("category", category), ("brand", brand), ("location", location)):
+        if value is not None:
+            conditions.append(f"{column} = :{column}")
+            params[column] = value
+    if min_qty is not None:
+        conditions.append("qty_on_hand >= :min_qty")
+        params["min_qty"] = min_qty
+    if max_qty is not None:
+        conditions.append("qty_on_hand <= :max_qty")
+        params["max_qty"] = max_qty
+    if cursor is not None:
+        placeholders = []
+        for index, ((_, column_type), value) in enumerate(zip(sort_columns, cursor)):
+            params[f"cursor_{index}"] = value
+            placeholders.append(f"CAST(:cursor_{index} AS {column_type})")
+        comparison = "<" if direction == "DESC" else ">"
+        conditions.append(
+            f"({', '.join(column for column, _ in sort_columns)}) {comparison} ({', '.join(placeholders)})"
         )
+
+    where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+    order_by = ", ".join(f"{column} {direction}" for column, _ in sort_columns)
+    rows = db.execute(
+        named_query("inventory.list_items",
+            f"""
+            SELECT
+              variant_id::text AS variant_id,
+              product_name,
+              variant_name,
+              category,
+              brand,
+              location,
+              photo_url,
+              sale_price,
+              purchase_price,
+              qty_on_hand,
+              primary_code,
+              reorder_point,
+              reorder_qty,
+              updated_at
+            FROM catalog_items
+            {where}
+            ORDER BY {order_by}
+            LIMIT :limit
+            """
+        ),
+        params,
     ).mappings().all()
     return [dict(row) for row in rows]
 
 
+def list_low_stock_items(
+    db: Session,
+    *,
+    limit: int,
+    cursor: list[Any] | None = None,
+    sort: str = "qty",
+) -> list[dict[str, Any]]:
+    # The low-stock set is idx_catalog_items_low_stock (qty_on_hand <=
+    # reorder_point). Days of cover = stock / average daily units sold over the
+    # last LOW_STOCK_COVER_DAYS, from the daily sales rollups; NULL (sorted
+    # last) when nothing sold.
+    sort_columns = LOW_STOCK_SORT_KEYS[sort]
+    today = datetime.now(ZoneInfo(settings.sales_report_timezone)).date()
+    params: dict[str, Any] = {
+        "limit": limit,
+        "cover_days": settings.low_stock_cover_days,
+        "sales_from": today - timedelta(days=settings.low_stock_cover_days - 1),
+    }
+    conditions = ["ci.qty_on_hand <= ci.reorder_point"]
+    if cursor is not None:
+        placeholders = []
+        for index, ((_, column_type), value) in enumerate(zip(sort_columns, cursor)):
+            params[f"cursor_{index}"] = value
+            placeholders.append(f"CAST(:cursor_{index} AS {column_type})")
+        conditions.append(f"({', '.join(column for column, _ in sort_columns)}) > ({', '.join(placeholders)})")
+    order_by = ", ".join(column for column, _ in sort_columns)
+
+    cover = """
+        LEFT JOIN LATERAL (
+          SELECT ROUND(ci.qty_on_hand * CAST(:cover_days AS numeric) / NULLIF(SUM(sdv.units), 0), 1) AS days_of_cover
+          FROM sales_daily_variants sdv
+          WHERE sdv.variant_id = ci.variant_id
+            AND sdv.sale_date >= :sales_from
+        ) cover ON TRUE
+    """
+    if sort == "qty":
+        # Page straight off the index, then look up sales for that page only.
+        source = f"""
+            SELECT ci.*, cover.days_of_cover
+            FROM (
+              SELECT *
+              FROM catalog_items ci
+              WHERE {' AND '.join(conditions)}
+              ORDER BY {order_by}
+              LIMIT :limit
+            ) ci
+            {cover}
+        """
+    else:
+        # Cover depends on sales, so the whole (small) set is ranked.
+        source = f"""
+            SELECT *
+            FROM (
+              SELECT ci.*, cover.days_of_cover, COALESCE(cover.days_of_cover, 'Infinity') AS cover_sort
+              FROM catalog_items ci
+              {cover}
+            ) ci
+            WHERE {' AND '.join(conditions)}
+            ORDER BY {order_by}
+            LIMIT :limit
+        """
+    sql = f"""
+        SELECT
+          low.variant_id::text AS variant_id,
+          low.product_name,
+          low.variant_name,
+          low.qty_on_hand,
+          low.primary_code,
+          low.reorder_point,
+          low.reorder_qty,
+          low.days_of_cover,
+          {"low.cover_sort" if sort == "cover" else "NULL"} AS cover_sort
+        FROM ({source}) low
+        ORDER BY {", ".join(f"low.{column}" for column, _ in sort_columns)}
+    """
+
+    shape = f"{sort}_after" if cursor is not None else sort
+    rows = db.execute(named_query(f"inventory.low_stock.{shape}", sql), params).mappings().all()
+    return [dict(row) for row in rows]
+
+
 def get_inventory_item_by_variant(db: Session, variant_id: str) -> dict[str, Any] | None:
     row = db.execute(
-        text(
+        named_query("inventory.item_by_variant",
             """
             SELECT
-              pv.id::text AS variant_id,
-              p.id::text AS product_id,
-              p.name AS product_name,
-              p.brand,
-              p.category,
-              p.description,
-              p.photo_url,
-              COALESCE(pv.variant_name, CONCAT_WS(' / ', pv.color, pv.size)) AS variant_name,
-              pv.color,
-              pv.size,
-              pv.location,
-              pv.sale_price,
-              pv.purchase_price,
-              COALESCE(vs.qty_on_hand, 0) AS qty_on_hand,
-              (
-                SELECT bv.barcode_code
-                FROM barcode_variants bv
-                WHERE bv.variant_id = pv.id
-                ORDER BY bv.is_primary DESC, bv.created_at ASC
-                LIMIT 1
-              ) AS primary_code
-            FROM product_variants pv
-            JOIN products p ON p.id = pv.product_id
-            LEFT JOIN v_variant_stock vs ON vs.variant_id = pv.id
-            WHERE pv.id = CAST(:variant_id AS uuid)
-              AND p.is_active = TRUE
-              AND pv.is_active = TRUE
+              variant_id::text AS variant_id,
+              product_id::text AS product_id,
+              product_name,
+              brand,
+              category,
+              description,
+              photo_url,
+              variant_name,
+              color,
+              size,
+              location,
+              sale_price,
+              purchase_price,
+              qty_on_hand,
+              primary_code,
+              reorder_point,
+              reorder_qty
+            FROM catalog_items
+            WHERE variant_id = CAST(:variant_id AS uuid)
             LIMIT 1
             """
         ),
@@ -183,79 +444,132 @@ def health():
     return {"status": "ok"}
 
 
-@app.post("/auth/login", response_model=TokenResponse)
-def login(payload: LoginRequest, db: Session = Depends(get_db)):
-    user = db.execute(
-        text(
-            """
-            SELECT id::text AS id, username, password_hash, full_name, is_active
-            FROM users
-            WHERE username = :username
-            LIMIT 1
-            """
-        ),
-        {"username": payload.username},
-    ).mappings().first()
+@app.get("/metrics", include_in_schema=False)
+def metrics():
+    if not settings.metrics_enabled:
+        raise HTTPException(status_code=404, detail="Not Found")
+    return Response(render_metrics(), media_type=PROMETHEUS_MEDIA_TYPE)
+
+
+@app.get("/events/stream")
+async def events_stream(request: Request, _: dict = Depends(get_current_user)):
+    if not settings.events_enabled:
+        raise HTTPException(status_code=503, detail="Event stream disabled")
+
+    def snapshot() -> dict[str, Any]:
+        with SessionLocal() as db:
+            return build_snapshot_event(db)
+
+    async def stream():
+        queue = broker.subscribe()
+        try:
+            event = await run_in_threadpool(snapshot)
+            while True:
+                yield f"event: {event['event']}\ndata: {json.dumps(event)}\n\n"
+                while True:
+                    try:
+                        event = await asyncio.wait_for(queue.get(), timeout=settings.events_heartbeat_seconds)
+                        break
+                    except asyncio.TimeoutError:
+                        if await request.is_disconnected():
+                            return
+                        yield ": ping\n\n"
+                if event["event"] == "resync":
+                    event = await run_in_threadpool(snapshot)
+        finally:
+            broker.unsubscribe(queue)
+
+    return StreamingResponse(
+        stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
 
-    if not user or not user["is_active"]:
-        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid credentials")
 
-    if not verify_password(payload.password, user["password_hash"]):
-        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid credentials")
+@app.get("/internal/lookup-cache")
+def lookup_cache(_: dict = Depends(get_current_user)):
+    return lookup_cache_stats()
 
-    db.execute(
-        text("UPDATE users SET last_login_at = now() WHERE id = CAST(:id AS uuid)"),
-        {"id": user["id"]},
-    )
-    db.commit()
 
-    token = create_access_token(subject=user["id"])
-    return TokenResponse(
-        access_token=token,
-        user_id=user["id"],
-        username=user["username"],
-        full_name=user["full_name"],
-    )
+@app.get("/internal/auth-cache")
+def auth_cache(_: dict = Depends(get_current_user)):
+    return auth_cache_stats()
 
 
-@app.get("/dashboard/summary", response_model=DashboardSummary)
-def dashboard_summary(
-    db: Session = Depends(get_db),
-    _: dict = Depends(get_current_user),
-):
-    metrics = db.execute(
-        text(
-            """
-            WITH invested AS (
-              SELECT COALESCE(SUM(vs.qty_on_hand * pv.purchase_price), 0) AS amount
-              FROM v_variant_stock vs
-              JOIN product_variants pv ON pv.id = vs.variant_id
-              JOIN products p ON p.id = pv.product_id
-              WHERE pv.is_active = TRUE
-                AND p.is_active = TRUE
-                AND vs.qty_on_hand > 0
-            ),
-            sales_gross AS (
-              SELECT COALESCE(SUM(total), 0) AS amount
-              FROM sales
-              WHERE status = 'CONFIRMED'
+@app.get("/internal/login-pool")
+def login_pool(_: dict = Depends(get_current_user)):
+    return password_pool.stats()
+
+
+@app.get("/internal/db-pool")
+async def db_pool(_: dict = Depends(get_current_user_async)):
+    return {"sync": pool_stats(engine), "async": pool_stats(async_engine.sync_engine)}
+
+
+@app.get("/internal/query-stats")
+def get_query_stats(_: dict = Depends(get_current_user)):
+    return {"prepare_threshold": prepare_threshold(), "queries": query_stats()}
+
+
+@app.delete("/internal/query-stats", status_code=status.HTTP_204_NO_CONTENT)
+def clear_query_stats(_: dict = Depends(get_current_user)):
+    reset_query_stats()
+
+
+@app.post("/auth/login", response_model=TokenResponse)
+async def login(payload: LoginRequest, db: AsyncSession = Depends(get_async_db)):
+    started = time.perf_counter()
+    # Timed on every outcome: the 401 and 503 paths are part of the load too.
+    try:
+        user = (await db.execute(
+            named_query("auth.user_by_username",
+                """
+                SELECT id::text AS id, username, password_hash, full_name, is_active
+                FROM users
+                WHERE username = :username
+                LIMIT 1
+                """
             ),
-            cogs AS (
-              SELECT COALESCE(SUM(si.qty * pv.purchase_price), 0) AS amount
-              FROM sale_items si
-              JOIN sales s ON s.id = si.sale_id
-              JOIN product_variants pv ON pv.id = si.variant_id
-              WHERE s.status = 'CONFIRMED'
+            {"username": payload.username},
+        )).mappings().first()
+
+        if not user or not user["is_active"]:
+            raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid credentials")
+
+        try:
+            verified = await password_pool.verify(payload.password, user["password_hash"])
+        except PasswordPoolSaturated:
+            raise HTTPException(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                detail="Too many logins in progress, try again",
+                headers={"Retry-After": "1"},
             )
-            SELECT
-              invested.amount AS invested_amount,
-              sales_gross.amount AS gross_sales,
-              cogs.amount AS cost_of_goods_sold,
-              (sales_gross.amount - cogs.amount) AS profit
-            FROM invested, sales_gross, cogs
-            """
+        if not verified:
+            raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid credentials")
+
+        await db.execute(
+            named_query("auth.touch_last_login", "UPDATE users SET last_login_at = now() WHERE id = CAST(:id AS uuid)"),
+            {"id": user["id"]},
         )
-    ).mappings().first()
+        await db.commit()
+
+        token = create_access_token(subject=user["id"])
+        return TokenResponse(
+            access_token=token,
+            user_id=user["id"],
+            username=user["username"],
+            full_name=user["full_name"],
+        )
+    finally:
+        password_pool.login_ms.observe((time.perf_counter() - started) * 1000)
+
+
+@app.get("/dashboard/summary", response_model=DashboardSummary)
+async def dashboard_summary(
+    db: AsyncSession = Depends(get_async_db),
+    _: dict = Depends(get_current_user_async),
+):
+    metrics = await db.run_sync(get_dashboard_totals)
 
     return DashboardSummary(
         invested_amount=float(metrics["invested_amount"]),
@@ -265,21 +579,73 @@ def dashboard_summary(
     )
 
 
-@app.post("/catalog/scan-upsert")
-def scan_upsert(
-    payload: ScanUpsertRequest,
+def report_range(date_from: date | None, date_to: date | None) -> tuple[date, date]:
+    # Dates are sale dates in SALES_REPORT_TIMEZONE; `to` is exclusive and
+    # defaults to tomorrow there, `from` to 30 days before `to`.
+    if date_to is None:
+        date_to = datetime.now(ZoneInfo(settings.sales_report_timezone)).date() + timedelta(days=1)
+    if date_from is None:
+        date_from = date_to - timedelta(days=30)
+    if date_from >= date_to:
+        raise HTTPException(status_code=400, detail="from must be before to")
+    return date_from, date_to
+
+
+@app.get("/reports/sales", response_model=list[SalesPeriodReport])
+def sales_report(
+    interval: ReportInterval = "day",
+    date_from: date | None = Query(default=None, alias="from"),
+    date_to: date | None = Query(default=None, alias="to"),
     db: Session = Depends(get_db),
-    user: dict = Depends(get_current_user),
+    _: dict = Depends(get_current_user),
 ):
+    return sales_by_period(db, interval, *report_range(date_from, date_to))
+
+
+@app.get("/reports/top-sellers", response_model=list[TopSellerReport])
+def top_sellers_report(
+    order_by: TopSellersOrder = "units",
+    limit: int = Query(default=20, ge=1, le=200),
+    date_from: date | None = Query(default=None, alias="from"),
+    date_to: date | None = Query(default=None, alias="to"),
+    db: Session = Depends(get_db),
+    _: dict = Depends(get_current_user),
+):
+    return top_sellers(db, *report_range(date_from, date_to), order_by=order_by, limit=limit)
+
+
+@app.get("/reports/category-margin", response_model=list[CategoryMarginReport])
+def category_margin_report(
+    date_from: date | None = Query(default=None, alias="from"),
+    date_to: date | None = Query(default=None, alias="to"),
+    db: Session = Depends(get_db),
+    _: dict = Depends(get_current_user),
+):
+    return category_margins(db, *report_range(date_from, date_to))
+
+
+def upsert_scanned_product(
+    db: Session,
+    payload: ScanUpsertRequest,
+    user: dict,
+    idempotency_key: str | None = None,
+) -> dict[str, Any]:
+    if idempotency_key:
+        stored = claim_idempotency_key(db, user["id"], idempotency_key, "catalog.scan_upsert", payload)
+        if stored is not None:
+            return stored
+
     existing = get_variant_by_code(db, payload.code)
     if existing:
+        # Nothing to store; drops the idempotency claim along with it.
+        db.rollback()
         return {"created": False, "message": "Code already exists", "variant": existing}
 
     warehouse_id = ensure_default_warehouse(db)
 
     try:
         product = db.execute(
-            text(
+            named_query("catalog.insert_product",
                 """
                 INSERT INTO products (name, brand, category, description, photo_url)
                 VALUES (:name, :brand, :category, :description, :photo_url)
@@ -296,7 +662,7 @@ def scan_upsert(
         ).mappings().first()
 
         variant = db.execute(
-            text(
+            named_query("catalog.insert_variant",
                 """
                 INSERT INTO product_variants (
                   product_id,
@@ -331,12 +697,12 @@ def scan_upsert(
         ).mappings().first()
 
         db.execute(
-            text("INSERT INTO barcodes (code) VALUES (:code) ON CONFLICT (code) DO NOTHING"),
+            named_query("catalog.insert_barcode", "INSERT INTO barcodes (code) VALUES (:code) ON CONFLICT (code) DO NOTHING"),
             {"code": payload.code},
         )
 
         db.execute(
-            text(
+            named_query("catalog.link_barcode",
                 """
                 INSERT INTO barcode_variants (barcode_code, variant_id, is_primary)
                 VALUES (:code, CAST(:variant_id AS uuid), TRUE)
@@ -348,7 +714,7 @@ def scan_upsert(
         batch_id = ensure_default_batch(db, warehouse_id, variant["id"])
 
         db.execute(
-            text(
+            named_query("stock.upsert_balance",
                 """
                 INSERT INTO stock_balances (warehouse_id, batch_id, qty_on_hand)
                 VALUES (CAST(:warehouse_id AS uuid), CAST(:batch_id AS uuid), :qty)
@@ -362,7 +728,7 @@ def scan_upsert(
 
         if payload.initial_qty > 0:
             db.execute(
-                text(
+                named_query("stock.insert_initial_movement",
                     """
                     INSERT INTO stock_movements (
                       warehouse_id,
@@ -394,22 +760,133 @@ def scan_upsert(
                 },
             )
 
+        touched_variants = refresh_catalog_items(db, [variant["id"]])
+        if payload.initial_qty > 0:
+            adjust_invested_for_stock(db, {variant["id"]: payload.initial_qty})
+        notify_inventory_change(db, touched_variants)
+        # Read inside the transaction so a stored (idempotent) response holds
+        # the same variant the caller gets.
+        created_variant = db.execute(
+            named_query("variant.by_id",
+                """
+                SELECT
+                  variant_id::text AS variant_id,
+                  product_name,
+                  variant_name,
+                  sale_price,
+                  purchase_price,
+                  qty_on_hand
+                FROM catalog_items
+                WHERE variant_id = CAST(:variant_id AS uuid)
+                """
+            ),
+            {"variant_id": variant["id"]},
+        ).mappings().first()
+        result = {"created": True, "variant": dict(created_variant)}
+        if idempotency_key:
+            store_idempotent_response(db, user["id"], idempotency_key, result)
         db.commit()
     except IntegrityError as exc:
         db.rollback()
         raise HTTPException(status_code=400, detail=f"Failed to upsert scanned product: {exc.orig}")
 
-    created_variant = get_variant_by_code(db, payload.code)
-    return {"created": True, "variant": created_variant}
+    invalidate_codes([payload.code])
+    invalidate_variants(touched_variants)
 
+    return result
 
-@app.get("/inventory/by-code/{code}", response_model=InventoryByCodeResponse)
-def inventory_by_code(
-    code: str,
+
+@app.post("/catalog/scan-upsert")
+def scan_upsert(
+    payload: ScanUpsertRequest,
+    idempotency_key: str | None = Header(None, alias="Idempotency-Key", min_length=1, max_length=255),
+    db: Session = Depends(get_db),
+    user: dict = Depends(get_current_user),
+):
+    return upsert_scanned_product(db, payload, user, idempotency_key)
+
+
+@app.post("/catalog/import", response_model=CatalogImportResponse)
+def catalog_import(
+    file: UploadFile = File(...),
+    format: Literal["csv", "jsonl"] | None = Query(default=None),
+    db: Session = Depends(get_db),
+    user: dict = Depends(get_current_user),
+):
+    fmt = format or (file.filename or "").rsplit(".", 1)[-1].lower().replace("ndjson", "jsonl")
+    if fmt not in IMPORT_FORMATS:
+        raise HTTPException(status_code=400, detail="Unknown file format, pass format=csv or format=jsonl")
+
+    warehouse_id = ensure_default_warehouse(db)
+    try:
+        summary, variant_ids = import_catalog(db, file.file, fmt, user["id"], warehouse_id)
+        notify_inventory_change(db, variant_ids)
+        db.commit()
+    except (csv.Error, UnicodeDecodeError) as exc:
+        db.rollback()
+        raise HTTPException(status_code=400, detail=f"Unreadable import file: {exc}")
+    except (IntegrityError, DataError, psycopg.IntegrityError, psycopg.DataError) as exc:
+        # The COPY into staging runs on the raw psycopg cursor, so its errors
+        # arrive unwrapped.
+        db.rollback()
+        diag = getattr(exc, "orig", exc).diag
+        problem = f"violates {diag.constraint_name}" if diag.constraint_name else diag.message_primary
+        raise HTTPException(status_code=400, detail=f"Import rejected: {problem}")
+
+    return summary
+
+
+@app.get("/catalog/search", response_model=list[CatalogSearchItem])
+def catalog_search(
+    response: Response,
+    q: str = Query(min_length=2, max_length=200),
+    limit: int = Query(20, ge=1, le=100),
+    cursor: str | None = None,
     db: Session = Depends(get_db),
     _: dict = Depends(get_current_user),
 ):
-    variant = get_variant_by_code(db, code)
+    if not q.strip():
+        raise HTTPException(status_code=400, detail="Empty search")
+
+    rows = search_catalog_items(
+        db,
+        q,
+        limit=limit + 1,
+        cursor=decode_cursor(cursor, "search", 2) if cursor else None,
+    )
+
+    if len(rows) > limit:
+        rows = rows[:limit]
+        response.headers["X-Next-Cursor"] = encode_cursor("search", [rows[-1]["score"], rows[-1]["variant_id"]])
+
+    return [
+        CatalogSearchItem(
+            variant_id=row["variant_id"],
+            product_name=row["product_name"],
+            variant_name=row["variant_name"],
+            category=row["category"],
+            brand=row["brand"],
+            location=row["location"],
+            photo_url=row["photo_url"],
+            sale_price=float(row["sale_price"]),
+            purchase_price=float(row["purchase_price"]),
+            qty_on_hand=int(row["qty_on_hand"]),
+            primary_code=row["primary_code"],
+            reorder_point=row["reorder_point"],
+            reorder_qty=row["reorder_qty"],
+            score=float(row["score"]),
+        )
+        for row in rows
+    ]
+
+
+@app.get("/inventory/by-code/{code}", response_model=InventoryByCodeResponse)
+async def inventory_by_code(
+    code: str,
+    db: AsyncSession = Depends(get_async_db),
+    _: dict = Depends(get_current_user_async),
+):
+    variant = await db.run_sync(get_variant_by_code, code)
     if not variant:
         raise HTTPException(status_code=404, detail="Code not found")
 
@@ -426,10 +903,45 @@ def inventory_by_code(
 
 @app.get("/inventory/items", response_model=list[InventoryListItem])
 def inventory_items(
+    response: Response,
+    limit: int = Query(100, ge=1, le=500),
+    cursor: str | None = None,
+    sort: Literal["name", "qty", "price", "updated"] = "name",
+    order: Literal["asc", "desc"] = "asc",
+    category: str | None = None,
+    brand: str | None = None,
+    location: str | None = None,
+    min_qty: int | None = None,
+    max_qty: int | None = None,
     db: Session = Depends(get_db),
     _: dict = Depends(get_current_user),
 ):
-    rows = list_inventory_items(db)
+    sort_columns = INVENTORY_SORT_KEYS[sort]
+    cursor_key = f"{sort}:{order}"
+    try:
+        rows = list_inventory_items(
+            db,
+            limit=limit + 1,
+            cursor=decode_cursor(cursor, cursor_key, len(sort_columns)) if cursor else None,
+            sort=sort,
+            order=order,
+            category=category,
+            brand=brand,
+            location=location,
+            min_qty=min_qty,
+            max_qty=max_qty,
+        )
+    except DataError:
+        db.rollback()
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+    if len(rows) > limit:
+        rows = rows[:limit]
+        last = rows[-1]
+        response.headers["X-Next-Cursor"] = encode_cursor(
+            cursor_key, [last[column] for column, _ in sort_columns]
+        )
+
     return [
         InventoryListItem(
             variant_id=row["variant_id"],
@@ -443,18 +955,265 @@ def inventory_items(
             purchase_price=float(row["purchase_price"]),
             qty_on_hand=int(row["qty_on_hand"]),
             primary_code=row["primary_code"],
+            reorder_point=row["reorder_point"],
+            reorder_qty=row["reorder_qty"],
         )
         for row in rows
     ]
 
 
-@app.patch("/inventory/items/{variant_id}", response_model=InventoryListItem)
-def update_inventory_item(
+@app.get("/inventory/changes", response_model=InventoryChanges)
+def inventory_changes(
+    since: str | None = None,
+    limit: int = Query(500, ge=1, le=2000),
+    db: Session = Depends(get_db),
+    _: dict = Depends(get_current_user),
+):
+    # Cursor: [since_xid, horizon_xid, after_xid, after_variant_id]. horizon_xid
+    # is the oldest snapshot xmin seen while paging through one sync pass and
+    # becomes since_xid for the next pass.
+    if since:
+        since_xid, horizon_xid, after_xid, after_variant_id = decode_cursor(since, "changes", 4)
+    else:
+        since_xid, horizon_xid, after_xid, after_variant_id = "0", None, None, None
+
+    try:
+        rows, snapshot_xmin = list_catalog_changes(
+            db,
+            since_xid=since_xid,
+            after_xid=after_xid or "0",
+            after_variant_id=after_variant_id or NIL_UUID,
+            limit=limit + 1,
+        )
+    except DataError:
+        db.rollback()
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+    if horizon_xid is None or int(snapshot_xmin) < int(horizon_xid):
+        horizon_xid = snapshot_xmin
+
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    if has_more:
+        cursor = encode_cursor("changes", [since_xid, horizon_xid, rows[-1]["change_xid"], rows[-1]["variant_id"]])
+    else:
+        cursor = encode_cursor("changes", [horizon_xid, None, None, None])
+
+    return InventoryChanges(
+        items=[
+            InventoryListItem(
+                variant_id=row["variant_id"],
+                product_name=row["product_name"],
+                variant_name=row["variant_name"],
+                category=row["category"],
+                brand=row["brand"],
+                location=row["location"],
+                photo_url=row["photo_url"],
+                sale_price=float(row["sale_price"]),
+                purchase_price=float(row["purchase_price"]),
+                qty_on_hand=int(row["qty_on_hand"]),
+                primary_code=row["primary_code"],
+                reorder_point=row["reorder_point"],
+                reorder_qty=row["reorder_qty"],
+            )
+            for row in rows
+            if not row["removed"]
+        ],
+        removed=[row["variant_id"] for row in rows if row["removed"]],
+        cursor=cursor,
+        has_more=has_more,
+    )
+
+
+def stock_history_page(
+    db: Session,
+    response: Response,
+    *,
+    variant_id: str | None,
+    limit: int,
+    cursor: str | None,
+    created_from: datetime | None,
+    created_to: datetime | None,
+    movement_types: list[str] | None,
+) -> list[StockMovementEntry]:
+    try:
+        rows = list_stock_movements(
+            db,
+            limit=limit + 1,
+            cursor=decode_cursor(cursor, "history", 2) if cursor else None,
+            variant_id=variant_id,
+            created_from=created_from,
+            created_to=created_to,
+            movement_types=movement_types,
+        )
+    except DataError:
+        db.rollback()
+        raise HTTPException(status_code=400, detail="Invalid variant id or cursor")
+    if variant_id is not None and not rows and not variant_exists(db, variant_id):
+        raise HTTPException(status_code=404, detail="Variant not found")
+
+    if len(rows) > limit:
+        rows = rows[:limit]
+        response.headers["X-Next-Cursor"] = encode_cursor("history", [rows[-1]["created_at"], rows[-1]["id"]])
+    return [StockMovementEntry(**row) for row in rows]
+
+
+def stock_history_buckets(
+    db: Session,
+    *,
+    variant_id: str | None,
+    interval: HistoryInterval,
+    tz: str,
+    created_from: datetime | None,
+    created_to: datetime | None,
+    movement_types: list[str] | None,
+) -> list[StockHistoryBucket]:
+    try:
+        buckets = bucket_stock_movements(
+            db,
+            interval=interval,
+            tz=tz,
+            variant_id=variant_id,
+            created_from=created_from,
+            created_to=created_to,
+            movement_types=movement_types,
+        )
+    except DataError:
+        db.rollback()
+        raise HTTPException(status_code=400, detail="Invalid variant id or time zone")
+    if variant_id is not None and not buckets and not variant_exists(db, variant_id):
+        raise HTTPException(status_code=404, detail="Variant not found")
+    return [StockHistoryBucket(**bucket) for bucket in buckets]
+
+
+@app.get("/inventory/items/{variant_id}/history", response_model=list[StockMovementEntry])
+def variant_stock_history(
     variant_id: str,
-    payload: InventoryUpdateRequest,
+    response: Response,
+    limit: int = Query(100, ge=1, le=500),
+    cursor: str | None = None,
+    created_from: datetime | None = Query(default=None, alias="from"),
+    created_to: datetime | None = Query(default=None, alias="to"),
+    movement_type: list[MovementType] | None = Query(default=None),
+    db: Session = Depends(get_db),
+    _: dict = Depends(get_current_user),
+):
+    return stock_history_page(
+        db,
+        response,
+        variant_id=variant_id,
+        limit=limit,
+        cursor=cursor,
+        created_from=created_from,
+        created_to=created_to,
+        movement_types=movement_type,
+    )
+
+
+@app.get("/inventory/items/{variant_id}/history/buckets", response_model=list[StockHistoryBucket])
+def variant_stock_history_buckets(
+    variant_id: str,
+    interval: HistoryInterval = "day",
+    tz: str = "UTC",
+    created_from: datetime | None = Query(default=None, alias="from"),
+    created_to: datetime | None = Query(default=None, alias="to"),
+    movement_type: list[MovementType] | None = Query(default=None),
+    db: Session = Depends(get_db),
+    _: dict = Depends(get_current_user),
+):
+    return stock_history_buckets(
+        db,
+        variant_id=variant_id,
+        interval=interval,
+        tz=tz,
+        created_from=created_from,
+        created_to=created_to,
+        movement_types=movement_type,
+    )
+
+
+@app.get("/inventory/history", response_model=list[StockMovementEntry])
+def store_stock_history(
+    response: Response,
+    limit: int = Query(100, ge=1, le=500),
+    cursor: str | None = None,
+    created_from: datetime | None = Query(default=None, alias="from"),
+    created_to: datetime | None = Query(default=None, alias="to"),
+    movement_type: list[MovementType] | None = Query(default=None),
     db: Session = Depends(get_db),
     _: dict = Depends(get_current_user),
 ):
+    return stock_history_page(
+        db,
+        response,
+        variant_id=None,
+        limit=limit,
+        cursor=cursor,
+        created_from=created_from,
+        created_to=created_to,
+        movement_types=movement_type,
+    )
+
+
+@app.get("/inventory/history/buckets", response_model=list[StockHistoryBucket])
+def store_stock_history_buckets(
+    interval: HistoryInterval = "day",
+    tz: str = "UTC",
+    created_from: datetime | None = Query(default=None, alias="from"),
+    created_to: datetime | None = Query(default=None, alias="to"),
+    movement_type: list[MovementType] | None = Query(default=None),
+    db: Session = Depends(get_db),
+    _: dict = Depends(get_current_user),
+):
+    return stock_history_buckets(
+        db,
+        variant_id=None,
+        interval=interval,
+        tz=tz,
+        created_from=created_from,
+        created_to=created_to,
+        movement_types=movement_type,
+    )
+
+
+def get_item_edited_at(db: Session, variant_id: str) -> datetime | None:
+    # Product and variant rows only change on edits (stock lives elsewhere),
+    # so their updated_at is the time of the last edit. Locked until commit;
+    # NO KEY, so sales and stock movements referencing them are not blocked.
+    return db.execute(
+        named_query("inventory.item_edited_at",
+            """
+            SELECT GREATEST(p.updated_at, pv.updated_at)
+            FROM product_variants pv
+            JOIN products p ON p.id = pv.product_id
+            WHERE pv.id = CAST(:variant_id AS uuid)
+            FOR NO KEY UPDATE
+            """
+        ),
+        {"variant_id": variant_id},
+    ).scalar()
+
+
+def update_variant_item(
+    db: Session,
+    variant_id: str,
+    payload: InventoryUpdateRequest,
+    user: dict,
+    idempotency_key: str | None = None,
+    edited_at: datetime | None = None,
+) -> InventoryListItem:
+    if idempotency_key:
+        stored = claim_idempotency_key(db, user["id"], idempotency_key, f"inventory.update_item.{variant_id}", payload)
+        if stored is not None:
+            return InventoryListItem.model_validate(stored)
+
+    # An edit made at edited_at (e.g. offline) loses to a later one already
+    # on the server.
+    if edited_at is not None:
+        server_edited_at = get_item_edited_at(db, variant_id)
+        if server_edited_at is not None and server_edited_at > edited_at:
+            raise HTTPException(status_code=409, detail="Item was changed on the server after this edit")
+
     current = get_inventory_item_by_variant(db, variant_id)
     if not current:
         raise HTTPException(status_code=404, detail="Variant not found")
@@ -478,11 +1237,15 @@ def update_inventory_item(
         "sale_price": current["sale_price"]
         if data.get("sale_price", current["sale_price"]) is None
         else data.get("sale_price", current["sale_price"]),
+        "reorder_point": current["reorder_point"]
+        if data.get("reorder_point") is None
+        else data["reorder_point"],
+        "reorder_qty": data.get("reorder_qty", current["reorder_qty"]),
     }
 
     try:
         db.execute(
-            text(
+            named_query("inventory.update_product",
                 """
                 UPDATE products
                 SET
@@ -505,53 +1268,99 @@ def update_inventory_item(
             },
         )
 
-        db.execute(
-            text(
+        # The locked previous row gives the price the dashboard delta is
+        # taken against. NO KEY, like the UPDATE itself, so sales and stock
+        # movements referencing the variant are not blocked. color and size
+        # are in uq_variant_unique_per_product: assigning them at all takes
+        # the key lock, so they are written below, only when they change.
+        previous_price = db.execute(
+            named_query("inventory.update_variant",
                 """
-                UPDATE product_variants
+                WITH previous AS (
+                  SELECT id, purchase_price
+                  FROM product_variants
+                  WHERE id = CAST(:variant_id AS uuid)
+                  FOR NO KEY UPDATE
+                )
+                UPDATE product_variants pv
                 SET
                   variant_name = :variant_name,
-                  color = :color,
-                  size = :size,
                   location = :location,
                   purchase_price = :purchase_price,
                   sale_price = :sale_price,
+                  reorder_point = :reorder_point,
+                  reorder_qty = :reorder_qty,
                   updated_at = now()
-                WHERE id = CAST(:variant_id AS uuid)
+                FROM previous
+                WHERE pv.id = previous.id
+                RETURNING previous.purchase_price
                 """
             ),
             {
                 "variant_name": variant_updates["variant_name"],
-                "color": variant_updates["color"],
-                "size": variant_updates["size"],
                 "location": variant_updates["location"],
                 "purchase_price": variant_updates["purchase_price"],
                 "sale_price": variant_updates["sale_price"],
+                "reorder_point": variant_updates["reorder_point"],
+                "reorder_qty": variant_updates["reorder_qty"],
                 "variant_id": variant_id,
             },
+        ).scalar()
+        db.execute(
+            named_query("inventory.update_variant_key",
+                """
+                UPDATE product_variants
+                SET color = :color,
+                    size = :size
+                WHERE id = CAST(:variant_id AS uuid)
+                  AND (color, size) IS DISTINCT FROM (CAST(:color AS varchar), CAST(:size AS varchar))
+                """
+            ),
+            {"color": variant_updates["color"], "size": variant_updates["size"], "variant_id": variant_id},
         )
+        touched_variants = refresh_catalog_items(db, [variant_id])
+        if data.get("purchase_price") is not None and previous_price is not None:
+            reprice_dashboard_totals(db, variant_id, previous_price, variant_updates["purchase_price"])
+        notify_inventory_change(db, touched_variants)
+        updated = get_inventory_item_by_variant(db, variant_id)
+        if not updated:
+            raise HTTPException(status_code=404, detail="Variant not found after update")
+
+        result = InventoryListItem(
+            variant_id=updated["variant_id"],
+            product_name=updated["product_name"],
+            variant_name=updated["variant_name"],
+            category=updated["category"],
+            brand=updated["brand"],
+            location=updated["location"],
+            photo_url=updated["photo_url"],
+            sale_price=float(updated["sale_price"]),
+            purchase_price=float(updated["purchase_price"]),
+            qty_on_hand=int(updated["qty_on_hand"]),
+            primary_code=updated["primary_code"],
+            reorder_point=updated["reorder_point"],
+            reorder_qty=updated["reorder_qty"],
+        )
+        if idempotency_key:
+            store_idempotent_response(db, user["id"], idempotency_key, result)
         db.commit()
     except IntegrityError as exc:
         db.rollback()
         raise HTTPException(status_code=400, detail=f"Update failed: {exc.orig}")
 
-    updated = get_inventory_item_by_variant(db, variant_id)
-    if not updated:
-        raise HTTPException(status_code=404, detail="Variant not found after update")
-
-    return InventoryListItem(
-        variant_id=updated["variant_id"],
-        product_name=updated["product_name"],
-        variant_name=updated["variant_name"],
-        category=updated["category"],
-        brand=updated["brand"],
-        location=updated["location"],
-        photo_url=updated["photo_url"],
-        sale_price=float(updated["sale_price"]),
-        purchase_price=float(updated["purchase_price"]),
-        qty_on_hand=int(updated["qty_on_hand"]),
-        primary_code=updated["primary_code"],
-    )
+    invalidate_variants(touched_variants)
+
+    return result
+
+
+@app.patch("/inventory/items/{variant_id}", response_model=InventoryListItem)
+def update_inventory_item(
+    variant_id: str,
+    payload: InventoryUpdateRequest,
+    db: Session = Depends(get_db),
+    user: dict = Depends(get_current_user),
+):
+    return update_variant_item(db, variant_id, payload, user)
 
 
 @app.delete("/inventory/items/{variant_id}")
@@ -561,7 +1370,7 @@ def delete_inventory_item(
     _: dict = Depends(get_current_user),
 ):
     current = db.execute(
-        text(
+        named_query("inventory.variant_for_delete",
             """
             SELECT
               pv.id::text AS variant_id,
@@ -582,7 +1391,7 @@ def delete_inventory_item(
 
     try:
         db.execute(
-            text(
+            named_query("inventory.deactivate_variant",
                 """
                 UPDATE product_variants
                 SET is_active = FALSE,
@@ -594,7 +1403,7 @@ def delete_inventory_item(
         )
 
         remaining = db.execute(
-            text(
+            named_query("inventory.count_active_variants",
                 """
                 SELECT COUNT(*)::int AS count
                 FROM product_variants
@@ -607,7 +1416,7 @@ def delete_inventory_item(
 
         if remaining and remaining["count"] == 0:
             db.execute(
-                text(
+                named_query("inventory.deactivate_product",
                     """
                     UPDATE products
                     SET is_active = FALSE,
@@ -618,44 +1427,88 @@ def delete_inventory_item(
                 {"product_id": product_id},
             )
 
+        # Locked before refresh_catalog_items removes the row, so the stock
+        # valued here is exactly the stock taken out of the dashboard.
+        invested = db.execute(
+            named_query("inventory.lock_invested_for_delete",
+                """
+                SELECT qty_on_hand * purchase_price
+                FROM catalog_items
+                WHERE variant_id = CAST(:variant_id AS uuid)
+                FOR UPDATE
+                """
+            ),
+            {"variant_id": variant_id},
+        ).scalar()
+        touched_variants = refresh_catalog_items(db, [variant_id])
+        if invested is not None:
+            remove_invested_for_variant(db, invested)
+        notify_inventory_change(db, touched_variants)
         db.commit()
     except IntegrityError as exc:
         db.rollback()
         raise HTTPException(status_code=400, detail=f"Delete failed: {exc.orig}")
 
+    invalidate_variants(touched_variants)
+
     return {"ok": True, "deleted_variant_id": variant_id}
 
 
+@app.get("/export/inventory")
+def export_inventory_file(
+    format: ExportFormat = Query(default="csv"),
+    _: dict = Depends(get_current_user),
+):
+    return StreamingResponse(
+        export_inventory(format),
+        media_type=EXPORT_MEDIA_TYPES[format],
+        headers={"Content-Disposition": f'attachment; filename="inventory.{format}"'},
+    )
+
+
+@app.get("/export/stock-movements")
+def export_stock_movements_file(
+    format: ExportFormat = Query(default="csv"),
+    created_from: datetime | None = Query(default=None, alias="from"),
+    created_to: datetime | None = Query(default=None, alias="to"),
+    movement_type: list[MovementType] | None = Query(default=None),
+    _: dict = Depends(get_current_user),
+):
+    return StreamingResponse(
+        export_stock_movements(format, created_from, created_to, movement_type),
+        media_type=EXPORT_MEDIA_TYPES[format],
+        headers={"Content-Disposition": f'attachment; filename="stock_movements.{format}"'},
+    )
+
+
 @app.get("/inventory/alerts/low-stock", response_model=list[LowStockItem])
 def low_stock_alerts(
+    response: Response,
+    limit: int = Query(100, ge=1, le=500),
+    cursor: str | None = None,
+    sort: Literal["qty", "cover"] = "qty",
     db: Session = Depends(get_db),
     _: dict = Depends(get_current_user),
 ):
-    rows = db.execute(
-        text(
-            """
-            SELECT
-              pv.id::text AS variant_id,
-              p.name AS product_name,
-              COALESCE(pv.variant_name, CONCAT_WS(' / ', pv.color, pv.size)) AS variant_name,
-              COALESCE(vs.qty_on_hand, 0) AS qty_on_hand,
-              (
-                SELECT bv.barcode_code
-                FROM barcode_variants bv
-                WHERE bv.variant_id = pv.id
-                ORDER BY bv.is_primary DESC, bv.created_at ASC
-                LIMIT 1
-              ) AS primary_code
-            FROM product_variants pv
-            JOIN products p ON p.id = pv.product_id
-            LEFT JOIN v_variant_stock vs ON vs.variant_id = pv.id
-            WHERE COALESCE(vs.qty_on_hand, 0) <= 1
-              AND p.is_active = TRUE
-              AND pv.is_active = TRUE
-            ORDER BY qty_on_hand ASC, p.name ASC
-            """
+    sort_columns = LOW_STOCK_SORT_KEYS[sort]
+    cursor_key = f"low_stock:{sort}"
+    try:
+        rows = list_low_stock_items(
+            db,
+            limit=limit + 1,
+            cursor=decode_cursor(cursor, cursor_key, len(sort_columns)) if cursor else None,
+            sort=sort,
+        )
+    except DataError:
+        db.rollback()
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+    if len(rows) > limit:
+        rows = rows[:limit]
+        last = rows[-1]
+        response.headers["X-Next-Cursor"] = encode_cursor(
+            cursor_key, [last[column] for column, _ in sort_columns]
         )
-    ).mappings().all()
 
     return [
         LowStockItem(
@@ -664,17 +1517,25 @@ def low_stock_alerts(
             variant_name=row["variant_name"],
             qty_on_hand=int(row["qty_on_hand"]),
             primary_code=row["primary_code"],
+            reorder_point=row["reorder_point"],
+            reorder_qty=row["reorder_qty"],
+            days_of_cover=row["days_of_cover"],
         )
         for row in rows
     ]
 
 
-@app.post("/inventory/scan-increase")
-def scan_increase(
+def increase_stock(
+    db: Session,
     payload: StockIncreaseRequest,
-    db: Session = Depends(get_db),
-    user: dict = Depends(get_current_user),
-):
+    user: dict,
+    idempotency_key: str | None = None,
+) -> dict[str, Any]:
+    if idempotency_key:
+        stored = claim_idempotency_key(db, user["id"], idempotency_key, "inventory.scan_increase", payload)
+        if stored is not None:
+            return stored
+
     variant = get_variant_by_code(db, payload.code)
     if not variant:
         raise HTTPException(status_code=404, detail="Code not found")
@@ -683,7 +1544,7 @@ def scan_increase(
     batch_id = ensure_default_batch(db, warehouse_id, variant["variant_id"])
 
     db.execute(
-        text(
+        named_query("stock.upsert_balance",
             """
             INSERT INTO stock_balances (warehouse_id, batch_id, qty_on_hand)
             VALUES (CAST(:warehouse_id AS uuid), CAST(:batch_id AS uuid), :qty)
@@ -696,7 +1557,7 @@ def scan_increase(
     )
 
     db.execute(
-        text(
+        named_query("stock.insert_increase_movement",
             """
             INSERT INTO stock_movements (
               warehouse_id,
@@ -728,35 +1589,193 @@ def scan_increase(
         },
     )
 
+    updated = adjust_catalog_stock(db, {variant["variant_id"]: payload.qty})
+    if variant["variant_id"] not in updated:
+        # The cached code points at a variant deleted since, possibly by
+        # another API process; catalog_items only holds active ones.
+        db.rollback()
+        invalidate_codes([payload.code])
+        invalidate_variants([variant["variant_id"]])
+        raise HTTPException(status_code=404, detail="Code not found")
+    adjust_invested_for_stock(db, {variant["variant_id"]: payload.qty})
+    notify_inventory_change(db, [variant["variant_id"]])
+    result = {"ok": True, "updated_stock": int(updated[variant["variant_id"]])}
+    if idempotency_key:
+        store_idempotent_response(db, user["id"], idempotency_key, result)
     db.commit()
-    updated = get_variant_by_code(db, payload.code)
-    return {"ok": True, "updated_stock": int(updated["qty_on_hand"]) if updated else None}
+    invalidate_stock([variant["variant_id"]])
+    return result
 
 
-@app.post("/sales/checkout", response_model=CheckoutResponse)
-def checkout(
-    payload: CheckoutRequest,
-    db: Session = Depends(get_db),
-    user: dict = Depends(get_current_user),
+@app.post("/inventory/scan-increase")
+async def scan_increase(
+    payload: StockIncreaseRequest,
+    idempotency_key: str | None = Header(None, alias="Idempotency-Key", min_length=1, max_length=255),
+    db: AsyncSession = Depends(get_async_db),
+    user: dict = Depends(get_current_user_async),
 ):
+    return await db.run_sync(increase_stock, payload, user, idempotency_key)
+
+
+def increase_stock_batch(db: Session, payload: StockIncreaseBatchRequest, user: dict) -> StockIncreaseBatchResponse:
+    requested: dict[str, dict[str, Any]] = {}
+    for item in payload.items:
+        line = requested.setdefault(item.code, {"qty": 0, "reason": item.reason})
+        line["qty"] += item.qty
+        line["reason"] = line["reason"] or item.reason
+
+    variants = get_variants_by_codes(db, list(requested))
+    found = [code for code in requested if code in variants]
+    demand: dict[str, int] = {}
+    for code in found:
+        variant_id = variants[code]["variant_id"]
+        demand[variant_id] = demand.get(variant_id, 0) + requested[code]["qty"]
+
+    updated: dict[str, int] = {}
+    if found:
+        warehouse_id = ensure_default_warehouse(db)
+        db.execute(
+            named_query("stock.increase_batch",
+                """
+                WITH lines AS (
+                  SELECT *
+                  FROM unnest(
+                    CAST(:variant_ids AS uuid[]),
+                    CAST(:qtys AS int[]),
+                    CAST(:reasons AS text[])
+                  ) AS l(variant_id, qty, reason)
+                ),
+                demand AS (
+                  SELECT variant_id, SUM(qty)::int AS qty
+                  FROM lines
+                  GROUP BY variant_id
+                ),
+                batches AS (
+                  -- Touches a non-key column only, as ensure_default_batch does:
+                  -- writing batch_code would take a FOR UPDATE lock that blocks
+                  -- the FK checks of concurrent movements and sale lines.
+                  INSERT INTO inventory_batches (warehouse_id, variant_id, batch_code, expires_at)
+                  SELECT CAST(:warehouse_id AS uuid), variant_id, :batch_code, NULL
+                  FROM demand
+                  ORDER BY variant_id
+                  ON CONFLICT (warehouse_id, variant_id, batch_code) WHERE expires_at IS NULL
+                  DO UPDATE SET created_at = inventory_batches.created_at
+                  RETURNING id, variant_id
+                ),
+                upserted_balances AS (
+                  INSERT INTO stock_balances (warehouse_id, batch_id, qty_on_hand)
+                  SELECT CAST(:warehouse_id AS uuid), b.id, d.qty
+                  FROM demand d
+                  JOIN batches b ON b.variant_id = d.variant_id
+                  ON CONFLICT (warehouse_id, batch_id)
+                  DO UPDATE SET qty_on_hand = stock_balances.qty_on_hand + EXCLUDED.qty_on_hand,
+                                updated_at = now()
+                )
+                INSERT INTO stock_movements (
+                  warehouse_id,
+                  batch_id,
+                  variant_id,
+                  movement_type,
+                  qty_delta,
+                  reason,
+                  performed_by_user_id
+                )
+                SELECT
+                  CAST(:warehouse_id AS uuid),
+                  b.id,
+                  l.variant_id,
+                  CAST('INCREASE_SCAN' AS stock_movement_type),
+                  l.qty,
+                  l.reason,
+                  CAST(:user_id AS uuid)
+                FROM lines l
+                JOIN batches b ON b.variant_id = l.variant_id
+                """
+            ),
+            {
+                "variant_ids": [variants[code]["variant_id"] for code in found],
+                "qtys": [requested[code]["qty"] for code in found],
+                "reasons": [requested[code]["reason"] or "Stock increase from mobile scan" for code in found],
+                "warehouse_id": warehouse_id,
+                "batch_code": DEFAULT_BATCH_CODE,
+                "user_id": user["id"],
+            },
+        )
+
+        updated = adjust_catalog_stock(db, demand)
+        adjust_invested_for_stock(db, demand)
+        notify_inventory_change(db, list(demand))
+        db.commit()
+        invalidate_stock(list(demand))
+
+    results: list[StockIncreaseResult] = []
+    for code, line in requested.items():
+        variant = variants.get(code)
+        if not variant:
+            results.append(StockIncreaseResult(code=code, qty=line["qty"], ok=False, error="Code not found"))
+            continue
+        results.append(
+            StockIncreaseResult(
+                code=code,
+                qty=line["qty"],
+                ok=True,
+                variant_id=variant["variant_id"],
+                updated_stock=updated.get(variant["variant_id"]),
+            )
+        )
+
+    return StockIncreaseBatchResponse(
+        applied=len(found),
+        failed=len(requested) - len(found),
+        results=results,
+    )
+
+
+@app.post("/inventory/scan-increase/batch", response_model=StockIncreaseBatchResponse)
+async def scan_increase_batch(
+    payload: StockIncreaseBatchRequest,
+    db: AsyncSession = Depends(get_async_db),
+    user: dict = Depends(get_current_user_async),
+):
+    return await db.run_sync(increase_stock_batch, payload, user)
+
+
+def checkout_sale(
+    db: Session,
+    payload: CheckoutRequest,
+    user: dict,
+    idempotency_key: str | None = None,
+) -> CheckoutResponse:
     if not payload.items:
         raise HTTPException(status_code=400, detail="Cart is empty")
 
+    if idempotency_key:
+        stored = claim_idempotency_key(db, user["id"], idempotency_key, "sales.checkout", payload)
+        if stored is not None:
+            return CheckoutResponse.model_validate(stored)
+
     warehouse_id = ensure_default_warehouse(db)
 
-    customer_id: str | None = None
+    requested: dict[str, int] = {}
+    for item in payload.items:
+        requested[item.code] = requested.get(item.code, 0) + item.qty
+
+    variants = get_variants_by_codes(db, list(requested))
+
     subtotal = Decimal("0")
     sale_items: list[dict[str, Any]] = []
+    demand: dict[str, int] = {}
 
     for item in payload.items:
-        variant = get_variant_by_code(db, item.code)
+        variant = variants.get(item.code)
         if not variant:
             raise HTTPException(status_code=404, detail=f"Code not found: {item.code}")
 
+        demand[variant["variant_id"]] = demand.get(variant["variant_id"], 0) + item.qty
         available = int(variant["qty_on_hand"])
         if available <= 0:
             raise HTTPException(status_code=400, detail=f"Out of stock: {variant['product_name']}")
-        if item.qty > available:
+        if demand[variant["variant_id"]] > available:
             raise HTTPException(
                 status_code=400,
                 detail=f"Insufficient stock for {variant['product_name']}. Available: {available}",
@@ -778,38 +1797,23 @@ def checkout(
         )
 
     try:
-        if payload.customer_name:
-            existing_customer = db.execute(
-                text(
-                    """
-                    SELECT id::text AS id
-                    FROM customers
-                    WHERE full_name = :full_name
-                      AND COALESCE(phone, '') = COALESCE(:phone, '')
-                    LIMIT 1
-                    """
-                ),
-                {"full_name": payload.customer_name, "phone": payload.customer_phone},
-            ).mappings().first()
-
-            if existing_customer:
-                customer_id = existing_customer["id"]
-            else:
-                created_customer = db.execute(
-                    text(
-                        """
-                        INSERT INTO customers (full_name, phone)
-                        VALUES (:full_name, :phone)
-                        RETURNING id::text AS id
-                        """
-                    ),
-                    {"full_name": payload.customer_name, "phone": payload.customer_phone},
-                ).mappings().first()
-                customer_id = created_customer["id"]
-
         sale = db.execute(
-            text(
+            named_query("sales.insert_sale",
                 """
+                WITH existing_customer AS (
+                  SELECT id
+                  FROM customers
+                  WHERE full_name = CAST(:customer_lookup_name AS varchar)
+                    AND COALESCE(phone, '') = COALESCE(CAST(:phone AS varchar), '')
+                  LIMIT 1
+                ),
+                created_customer AS (
+                  INSERT INTO customers (full_name, phone)
+                  SELECT CAST(:customer_lookup_name AS varchar), CAST(:phone AS varchar)
+                  WHERE CAST(:customer_lookup_name AS varchar) IS NOT NULL
+                    AND NOT EXISTS (SELECT 1 FROM existing_customer)
+                  RETURNING id
+                )
                 INSERT INTO sales (
                   warehouse_id,
                   customer_id,
@@ -822,7 +1826,7 @@ def checkout(
                 )
                 VALUES (
                   CAST(:warehouse_id AS uuid),
-                  CAST(:customer_id AS uuid),
+                  (SELECT id FROM existing_customer UNION ALL SELECT id FROM created_customer LIMIT 1),
                   :customer_name,
                   :subtotal,
                   :total,
@@ -835,139 +1839,295 @@ def checkout(
             ),
             {
                 "warehouse_id": warehouse_id,
-                "customer_id": customer_id,
+                "customer_lookup_name": payload.customer_name or None,
                 "customer_name": payload.customer_name,
+                "phone": payload.customer_phone,
                 "subtotal": subtotal,
                 "total": subtotal,
                 "created_by_user_id": user["id"],
             },
         ).mappings().first()
 
-        for item in sale_items:
-            db.execute(
-                text(
-                    """
-                    INSERT INTO sale_items (
-                      sale_id,
-                      variant_id,
-                      barcode_code,
-                      qty,
-                      unit_price,
-                      line_total
-                    )
-                    VALUES (
-                      CAST(:sale_id AS uuid),
-                      CAST(:variant_id AS uuid),
-                      :barcode_code,
-                      :qty,
-                      :unit_price,
-                      :line_total
-                    )
-                    """
+        allocations = db.execute(
+            named_query("sales.allocate_checkout",
+                """
+                WITH lines AS (
+                  SELECT *
+                  FROM unnest(
+                    CAST(:variant_ids AS uuid[]),
+                    CAST(:codes AS varchar[]),
+                    CAST(:qtys AS int[]),
+                    CAST(:unit_prices AS numeric[]),
+                    CAST(:line_totals AS numeric[])
+                  ) WITH ORDINALITY AS l(variant_id, barcode_code, qty, unit_price, line_total, line_no)
                 ),
-                {
-                    "sale_id": sale["id"],
-                    "variant_id": item["variant_id"],
-                    "barcode_code": item["code"],
-                    "qty": item["qty"],
-                    "unit_price": item["unit_price"],
-                    "line_total": item["line_total"],
-                },
-            )
-
-            remaining = item["qty"]
-            batches = db.execute(
-                text(
-                    """
-                    SELECT
-                      sb.batch_id::text AS batch_id,
-                      sb.qty_on_hand
-                    FROM stock_balances sb
-                    JOIN inventory_batches ib ON ib.id = sb.batch_id
-                    WHERE sb.warehouse_id = CAST(:warehouse_id AS uuid)
-                      AND ib.variant_id = CAST(:variant_id AS uuid)
-                      AND sb.qty_on_hand > 0
-                    ORDER BY ib.created_at ASC
-                    """
+                inserted_items AS (
+                  INSERT INTO sale_items (sale_id, variant_id, barcode_code, qty, unit_price, line_total, unit_cost)
+                  SELECT CAST(:sale_id AS uuid), l.variant_id, l.barcode_code, l.qty, l.unit_price, l.line_total, pv.purchase_price
+                  FROM lines l
+                  JOIN product_variants pv ON pv.id = l.variant_id
+                  ORDER BY l.line_no
+                ),
+                demand AS (
+                  SELECT variant_id, SUM(qty)::int AS qty
+                  FROM lines
+                  GROUP BY variant_id
+                ),
+                locked AS (
+                  SELECT sb.batch_id, ib.variant_id, ib.created_at, sb.qty_on_hand
+                  FROM stock_balances sb
+                  JOIN inventory_batches ib ON ib.id = sb.batch_id
+                  WHERE sb.warehouse_id = CAST(:warehouse_id AS uuid)
+                    AND ib.variant_id IN (SELECT variant_id FROM demand)
+                    AND sb.qty_on_hand > 0
+                  FOR UPDATE OF sb
+                ),
+                ranked AS (
+                  SELECT
+                    batch_id,
+                    variant_id,
+                    qty_on_hand,
+                    COALESCE(
+                      SUM(qty_on_hand) OVER (
+                        PARTITION BY variant_id
+                        ORDER BY created_at ASC, batch_id ASC
+                        ROWS BETWEEN UNBOUNDED PRECEDING AND 1 PRECEDING
+                      ),
+                      0
+                    ) AS taken_before
+                  FROM locked
+                ),
+                allocation AS (
+                  SELECT r.batch_id, r.variant_id, LEAST(r.qty_on_hand, d.qty - r.taken_before)::int AS take
+                  FROM ranked r
+                  JOIN demand d ON d.variant_id = r.variant_id
+                  WHERE r.taken_before < d.qty
                 ),
-                {"warehouse_id": warehouse_id, "variant_id": item["variant_id"]},
-            ).mappings().all()
-
-            if not batches:
-                raise HTTPException(status_code=400, detail=f"No available stock batches for {item['name']}")
-
-            for batch in batches:
-                if remaining <= 0:
-                    break
-                available = int(batch["qty_on_hand"])
-                take = min(available, remaining)
-
-                db.execute(
-                    text(
-                        """
-                        UPDATE stock_balances
-                        SET qty_on_hand = qty_on_hand - :take,
-                            updated_at = now()
-                        WHERE warehouse_id = CAST(:warehouse_id AS uuid)
-                          AND batch_id = CAST(:batch_id AS uuid)
-                        """
-                    ),
-                    {"take": take, "warehouse_id": warehouse_id, "batch_id": batch["batch_id"]},
+                updated_balances AS (
+                  UPDATE stock_balances sb
+                  SET qty_on_hand = sb.qty_on_hand - a.take,
+                      updated_at = now()
+                  FROM allocation a
+                  WHERE sb.warehouse_id = CAST(:warehouse_id AS uuid)
+                    AND sb.batch_id = a.batch_id
+                ),
+                inserted_movements AS (
+                  INSERT INTO stock_movements (
+                    warehouse_id,
+                    batch_id,
+                    variant_id,
+                    movement_type,
+                    qty_delta,
+                    reason,
+                    reference_sale_id,
+                    performed_by_user_id
+                  )
+                  SELECT
+                    CAST(:warehouse_id AS uuid),
+                    a.batch_id,
+                    a.variant_id,
+                    CAST('DECREASE_SALE' AS stock_movement_type),
+                    -a.take,
+                    'Sale checkout',
+                    CAST(:sale_id AS uuid),
+                    CAST(:user_id AS uuid)
+                  FROM allocation a
+                ),
+                updated_catalog AS (
+                  UPDATE catalog_items ci
+                  SET qty_on_hand = ci.qty_on_hand - taken.qty,
+                      updated_at = now()
+                  FROM (
+                    SELECT variant_id, SUM(take)::int AS qty
+                    FROM allocation
+                    GROUP BY variant_id
+                  ) taken
+                  WHERE ci.variant_id = taken.variant_id
+                  RETURNING taken.qty * ci.purchase_price AS cost
+                ),
+                -- Sibling data-modifying CTEs run in no set order: reading
+                -- updated_catalog makes dashboard_totals wait until the
+                -- catalog_items rows are locked (see services/dashboard.py).
+                -- Their price is also the one a concurrent reprice left, which
+                -- this statement's snapshot of product_variants may predate.
+                updated_totals AS (
+                  UPDATE dashboard_totals
+                  SET gross_sales = gross_sales + CAST(:total AS numeric),
+                      cost_of_goods_sold = cost_of_goods_sold + cost.amount,
+                      invested_amount = invested_amount - cost.amount,
+                      updated_at = now()
+                  FROM (
+                    SELECT COALESCE(SUM(cost), 0) AS amount
+                    FROM updated_catalog
+                  ) cost
+                  WHERE dashboard_totals.id = 1
+                ),
+                """
+                + CHECKOUT_ROLLUP_CTES
+                + """
+                SELECT
+                  d.variant_id::text AS variant_id,
+                  d.qty AS requested,
+                  COALESCE(SUM(a.take), 0)::int AS allocated
+                FROM demand d
+                LEFT JOIN allocation a ON a.variant_id = d.variant_id
+                GROUP BY d.variant_id, d.qty
+                """
+            ),
+            {
+                "variant_ids": [item["variant_id"] for item in sale_items],
+                "codes": [item["code"] for item in sale_items],
+                "qtys": [item["qty"] for item in sale_items],
+                "unit_prices": [item["unit_price"] for item in sale_items],
+                "line_totals": [item["line_total"] for item in sale_items],
+                "sale_id": sale["id"],
+                "total": subtotal,
+                "warehouse_id": warehouse_id,
+                "user_id": user["id"],
+                "sale_tz": settings.sales_report_timezone,
+            },
+        ).mappings().all()
+
+        names = {item["variant_id"]: item["name"] for item in sale_items}
+        for allocation in allocations:
+            if allocation["allocated"] <= 0:
+                raise HTTPException(
+                    status_code=400,
+                    detail=f"No available stock batches for {names[allocation['variant_id']]}",
                 )
-
-                db.execute(
-                    text(
-                        """
-                        INSERT INTO stock_movements (
-                          warehouse_id,
-                          batch_id,
-                          variant_id,
-                          movement_type,
-                          qty_delta,
-                          reason,
-                          reference_sale_id,
-                          performed_by_user_id
-                        )
-                        VALUES (
-                          CAST(:warehouse_id AS uuid),
-                          CAST(:batch_id AS uuid),
-                          CAST(:variant_id AS uuid),
-                          CAST('DECREASE_SALE' AS stock_movement_type),
-                          :qty_delta,
-                          :reason,
-                          CAST(:sale_id AS uuid),
-                          CAST(:user_id AS uuid)
-                        )
-                        """
-                    ),
-                    {
-                        "warehouse_id": warehouse_id,
-                        "batch_id": batch["batch_id"],
-                        "variant_id": item["variant_id"],
-                        "qty_delta": -take,
-                        "reason": "Sale checkout",
-                        "sale_id": sale["id"],
-                        "user_id": user["id"],
-                    },
+            if allocation["allocated"] < allocation["requested"]:
+                raise HTTPException(
+                    status_code=400,
+                    detail=f"Stock race detected for {names[allocation['variant_id']]}",
                 )
 
-                remaining -= take
-
-            if remaining > 0:
-                raise HTTPException(status_code=400, detail=f"Stock race detected for {item['name']}")
-
+        notify_inventory_change(db, list(demand))
+        result = CheckoutResponse(
+            sale_id=sale["id"],
+            ticket_number=sale["ticket_number"],
+            subtotal=float(subtotal),
+            total=float(subtotal),
+            currency="USD",
+        )
+        if idempotency_key:
+            store_idempotent_response(db, user["id"], idempotency_key, result)
         db.commit()
-    except HTTPException:
+    except (HTTPException, SQLAlchemyError):
+        # Database errors propagate so callers classify them: busy (503) on
+        # the HTTP path and in sync replay alike.
         db.rollback()
         raise
-    except Exception as exc:
+    except Exception:
         db.rollback()
-        raise HTTPException(status_code=500, detail=f"Checkout failed: {exc}")
-
-    return CheckoutResponse(
-        sale_id=sale["id"],
-        ticket_number=sale["ticket_number"],
-        subtotal=float(subtotal),
-        total=float(subtotal),
-        currency="USD",
-    )
+        logger.exception("Checkout failed")
+        raise HTTPException(status_code=500, detail="Checkout failed")
+
+    invalidate_stock(list(demand))
+
+    return result
+
+
+@app.post("/sales/checkout", response_model=CheckoutResponse)
+async def checkout(
+    payload: CheckoutRequest,
+    idempotency_key: str | None = Header(None, alias="Idempotency-Key", min_length=1, max_length=255),
+    db: AsyncSession = Depends(get_async_db),
+    user: dict = Depends(get_current_user_async),
+):
+    # The sync query helpers run inside the AsyncSession's greenlet, so every
+    # statement is awaited on psycopg's async connection.
+    return await db.run_sync(checkout_sale, payload, user, idempotency_key)
+
+
+def replay_operations(db: Session, payload: SyncReplayRequest, user: dict) -> SyncReplayResponse:
+    # Operations queued offline, applied in the order sent through the same
+    # functions as the online endpoints, one transaction each. The client_id
+    # is the idempotency key, so a batch resent after a lost response replays
+    # the stored results instead of applying anything twice. A rejected
+    # operation (unknown code, insufficient stock, stale edit) is reported
+    # and the rest of the batch still runs.
+    results: list[SyncOperationResult] = []
+    edited_in_batch: set[str] = set()
+    for operation in payload.operations:
+        try:
+            if operation.type == "scan_increase":
+                result = increase_stock(db, operation.payload, user, operation.client_id)
+            elif operation.type == "scan_upsert":
+                result = upsert_scanned_product(db, operation.payload, user, operation.client_id)
+            elif operation.type == "checkout":
+                result = checkout_sale(db, operation.payload, user, operation.client_id)
+            else:
+                # Only edits from elsewhere make an edit stale, not earlier
+                # edits of the same item in this batch.
+                result = update_variant_item(
+                    db,
+                    operation.variant_id,
+                    operation.payload,
+                    user,
+                    operation.client_id,
+                    edited_at=None if operation.variant_id in edited_in_batch else operation.client_timestamp,
+                )
+                edited_in_batch.add(operation.variant_id)
+        except HTTPException as exc:
+            db.rollback()
+            results.append(
+                SyncOperationResult(
+                    client_id=operation.client_id,
+                    type=operation.type,
+                    ok=False,
+                    status_code=exc.status_code,
+                    error=str(exc.detail),
+                )
+            )
+            continue
+        except DataError:
+            db.rollback()
+            results.append(
+                SyncOperationResult(
+                    client_id=operation.client_id,
+                    type=operation.type,
+                    ok=False,
+                    status_code=400,
+                    error="Invalid value in operation",
+                )
+            )
+            continue
+        except SQLAlchemyError as exc:
+            # A database failure (lock timeout, deadlock, lost connection)
+            # fails this operation only; nothing of it was committed, so the
+            # client can resend it with the same client_id.
+            db.rollback()
+            logger.exception("Sync operation %s failed", operation.client_id)
+            busy = isinstance(exc, OperationalError)
+            results.append(
+                SyncOperationResult(
+                    client_id=operation.client_id,
+                    type=operation.type,
+                    ok=False,
+                    status_code=503 if busy else 500,
+                    error="Database busy, try again" if busy else "Database error",
+                )
+            )
+            continue
+
+        results.append(
+            SyncOperationResult(
+                client_id=operation.client_id,
+                type=operation.type,
+                ok=True,
+                status_code=200,
+                result=jsonable_encoder(result),
+            )
+        )
+
+    applied = sum(result.ok for result in results)
+    return SyncReplayResponse(applied=applied, failed=len(results) - applied, results=results)
+
+
+@app.post("/sync/replay", response_model=SyncReplayResponse)
+async def sync_replay(
+    payload: SyncReplayRequest,
+    db: AsyncSession = Depends(get_async_db),
+    user: dict = Depends(get_current_user_async),
+):
+    return await db.run_sync(replay_operations, payload, user)
@@ -1,4 +1,6 @@
-﻿from pydantic import BaseModel, Field
+﻿from datetime import date, datetime
+
+from pydantic import BaseModel, Field
 
 
 class ScanUpsertRequest(BaseModel):
@@ -17,12 +19,45 @@ class ScanUpsertRequest(BaseModel):
     initial_qty: int = 0
 
 
+class CatalogImportError(BaseModel):
+    row: int
+    code: str | None
+    error: str
+
+
+class CatalogImportResponse(BaseModel):
+    rows: int
+    created: int
+    failed: int
+    errors: list[CatalogImportError]
+    errors_truncated: bool
+
+
 class StockIncreaseRequest(BaseModel):
     code: str
     qty: int = Field(gt=0)
     reason: str | None = None
 
 
+class StockIncreaseBatchRequest(BaseModel):
+    items: list[StockIncreaseRequest] = Field(min_length=1, max_length=1000)
+
+
+class StockIncreaseResult(BaseModel):
+    code: str
+    qty: int
+    ok: bool
+    variant_id: str | None = None
+    updated_stock: int | None = None
+    error: str | None = None
+
+
+class StockIncreaseBatchResponse(BaseModel):
+    applied: int
+    failed: int
+    results: list[StockIncreaseResult]
+
+
 class InventoryByCodeResponse(BaseModel):
     code: str
     variant_id: str
@@ -39,6 +74,9 @@ class LowStockItem(BaseModel):
     variant_name: str | None
     qty_on_hand: int
     primary_code: str | None
+    reorder_point: int
+    reorder_qty: int | None
+    days_of_cover: float | None
 
 
 class InventoryListItem(BaseModel):
@@ -53,6 +91,12 @@ class InventoryListItem(BaseModel):
     purchase_price: float
     qty_on_hand: int
     primary_code: str | None
+    reorder_point: int
+    reorder_qty: int | None
+
+
+class CatalogSearchItem(InventoryListItem):
+    score: float
 
 
 class InventoryUpdateRequest(BaseModel):
@@ -67,3 +111,33 @@ class InventoryUpdateRequest(BaseModel):
     location: str | None = None
     purchase_price: float | None = None
     sale_price: float | None = None
+    reorder_point: int | None = Field(default=None, ge=0)
+    reorder_qty: int | None = Field(default=None, gt=0)
+
+
+class InventoryChanges(BaseModel):
+    items: list[InventoryListItem]
+    removed: list[str]
+    cursor: str
+    has_more: bool
+
+
+class StockMovementEntry(BaseModel):
+    id: str
+    created_at: datetime
+    movement_type: str
+    qty_delta: int
+    variant_id: str
+    product_name: str
+    variant_name: str | None
+    batch_id: str
+    reason: str | None
+    reference_sale_id: str | None
+    performed_by: str
+
+
+class StockHistoryBucket(BaseModel):
+    bucket_start: date
+    movements: int
+    net_qty: int
+    by_type: dict[str, int]
@@ -1,4 +1,6 @@
-﻿from pydantic import BaseModel, Field
+﻿from datetime import date
+
+from pydantic import BaseModel, Field
 
 
 class SaleItemInput(BaseModel):
@@ -25,3 +27,27 @@ class DashboardSummary(BaseModel):
     gross_sales: float
     cost_of_goods_sold: float
     profit: float
+
+
+class SalesTotals(BaseModel):
+    units: int
+    revenue: float
+    cost: float
+    margin: float
+    margin_pct: float | None
+
+
+class SalesPeriodReport(SalesTotals):
+    period_start: date
+    tickets: int
+
+
+class TopSellerReport(SalesTotals):
+    variant_id: str
+    product_name: str
+    variant_name: str | None
+    category: str | None
+
+
+class CategoryMarginReport(SalesTotals):
+    category: str | None
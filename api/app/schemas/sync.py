@@ -0,0 +1,59 @@
+﻿from typing import Annotated, Any, Literal
+
+from pydantic import AwareDatetime, BaseModel, Field
+
+from app.schemas.inventory import InventoryUpdateRequest, ScanUpsertRequest, StockIncreaseRequest
+from app.schemas.sales import CheckoutRequest
+
+SyncOperationType = Literal["scan_increase", "scan_upsert", "checkout", "item_update"]
+
+
+class SyncOperationBase(BaseModel):
+    client_id: str = Field(min_length=1, max_length=255)
+    client_timestamp: AwareDatetime
+
+
+class SyncScanIncrease(SyncOperationBase):
+    type: Literal["scan_increase"]
+    payload: StockIncreaseRequest
+
+
+class SyncScanUpsert(SyncOperationBase):
+    type: Literal["scan_upsert"]
+    payload: ScanUpsertRequest
+
+
+class SyncCheckout(SyncOperationBase):
+    type: Literal["checkout"]
+    payload: CheckoutRequest
+
+
+class SyncItemUpdate(SyncOperationBase):
+    type: Literal["item_update"]
+    variant_id: str
+    payload: InventoryUpdateRequest
+
+
+SyncOperation = Annotated[
+    SyncScanIncrease | SyncScanUpsert | SyncCheckout | SyncItemUpdate,
+    Field(discriminator="type"),
+]
+
+
+class SyncReplayRequest(BaseModel):
+    operations: list[SyncOperation] = Field(min_length=1, max_length=500)
+
+
+class SyncOperationResult(BaseModel):
+    client_id: str
+    type: SyncOperationType
+    ok: bool
+    status_code: int
+    result: dict[str, Any] | None = None
+    error: str | None = None
+
+
+class SyncReplayResponse(BaseModel):
+    applied: int
+    failed: int
+    results: list[SyncOperationResult]
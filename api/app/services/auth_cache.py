@@ -0,0 +1,33 @@
+from typing import Any
+
+from app.core.cache import TTLCache
+from app.core.config import settings
+
+# Decoded JWT claims keyed by the raw token, and active user rows keyed by id.
+token_cache = TTLCache(
+    settings.auth_cache_max_entries,
+    settings.auth_cache_ttl_seconds,
+    settings.auth_cache_enabled,
+)
+# Off until the user_events listener is connected (see set_user_events_listening).
+user_cache = TTLCache(
+    settings.auth_cache_max_entries,
+    settings.auth_cache_ttl_seconds,
+    False,
+)
+
+
+def evict_users(user_ids: list[str]) -> None:
+    user_cache.invalidate(*user_ids)
+
+
+def set_user_events_listening(listening: bool) -> None:
+    # Only the user_events listener evicts deactivated users, so cached users
+    # are served only while it is connected. Whatever was sent while it was
+    # not is unknown: start over empty either way.
+    user_cache.enabled = listening and settings.auth_cache_enabled
+    user_cache.clear()
+
+
+def auth_cache_stats() -> dict[str, Any]:
+    return {"tokens": token_cache.stats(), "users": user_cache.stats()}
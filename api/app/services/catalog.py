@@ -0,0 +1,356 @@
+import re
+from typing import Any
+
+from sqlalchemy.orm import Session
+
+from app.db.queries import named_query
+
+CATALOG_COLUMNS = """
+  variant_id,
+  product_id,
+  product_name,
+  brand,
+  category,
+  description,
+  photo_url,
+  variant_name,
+  color,
+  size,
+  location,
+  purchase_price,
+  sale_price,
+  qty_on_hand,
+  primary_code,
+  reorder_point,
+  reorder_qty
+"""
+
+# Matches taken from each index before ranking. Broad queries (one or two
+# letters) can match most of the catalog; past this they need refining.
+SEARCH_CANDIDATES = 500
+# Two apart, so the trigram similarity (0..1) added to the tier only orders
+# results within their tier.
+SEARCH_TIERS = {"code": 6, "code_prefix": 4, "words": 2, "fuzzy": 0}
+
+
+def refresh_catalog_items(db: Session, variant_ids: list[str]) -> list[str]:
+    # Re-derives product and barcode fields for every variant of the touched
+    # products. qty_on_hand is only seeded on insert; afterwards it is moved by
+    # adjust_catalog_stock so concurrent stock writes are never overwritten.
+    rows = db.execute(
+        named_query("catalog_items.refresh",
+            f"""
+            WITH scope AS (
+              SELECT pv.id, pv.is_active AND p.is_active AS is_active
+              FROM product_variants pv
+              JOIN products p ON p.id = pv.product_id
+              WHERE pv.product_id IN (
+                SELECT product_id
+                FROM product_variants
+                WHERE id = ANY(CAST(:variant_ids AS uuid[]))
+              )
+            ),
+            removed AS (
+              DELETE FROM catalog_items ci
+              USING scope s
+              WHERE ci.variant_id = s.id
+                AND s.is_active = FALSE
+            ),
+            upserted AS (
+              INSERT INTO catalog_items ({CATALOG_COLUMNS})
+              SELECT {CATALOG_COLUMNS}
+              FROM v_catalog_items_source
+              WHERE variant_id IN (SELECT id FROM scope WHERE is_active = TRUE)
+              ON CONFLICT (variant_id) DO UPDATE SET
+                product_id = EXCLUDED.product_id,
+                product_name = EXCLUDED.product_name,
+                brand = EXCLUDED.brand,
+                category = EXCLUDED.category,
+                description = EXCLUDED.description,
+                photo_url = EXCLUDED.photo_url,
+                variant_name = EXCLUDED.variant_name,
+                color = EXCLUDED.color,
+                size = EXCLUDED.size,
+                location = EXCLUDED.location,
+                purchase_price = EXCLUDED.purchase_price,
+                sale_price = EXCLUDED.sale_price,
+                primary_code = EXCLUDED.primary_code,
+                reorder_point = EXCLUDED.reorder_point,
+                reorder_qty = EXCLUDED.reorder_qty,
+                updated_at = now()
+            )
+            SELECT id::text AS variant_id
+            FROM scope
+            """
+        ),
+        {"variant_ids": variant_ids},
+    ).scalars().all()
+    return list(rows)
+
+
+def adjust_catalog_stock(db: Session, deltas: dict[str, int]) -> dict[str, int]:
+    if not deltas:
+        return {}
+
+    rows = db.execute(
+        named_query("catalog_items.adjust_stock",
+            """
+            UPDATE catalog_items ci
+            SET qty_on_hand = ci.qty_on_hand + d.qty_delta,
+                updated_at = now()
+            FROM unnest(CAST(:variant_ids AS uuid[]), CAST(:qty_deltas AS int[])) AS d(variant_id, qty_delta)
+            WHERE ci.variant_id = d.variant_id
+            RETURNING ci.variant_id::text AS variant_id, ci.qty_on_hand
+            """
+        ),
+        {"variant_ids": list(deltas), "qty_deltas": list(deltas.values())},
+    ).mappings().all()
+    return {row["variant_id"]: row["qty_on_hand"] for row in rows}
+
+
+def rebuild_catalog_items(db: Session) -> int:
+    # The exclusive lock waits for in-flight stock writers and holds new ones
+    # back until the rebuilt rows are committed.
+    db.execute(named_query("catalog_items.lock", "LOCK TABLE catalog_items IN EXCLUSIVE MODE"))
+    db.execute(named_query("catalog_items.clear", "DELETE FROM catalog_items"))
+    inserted = db.execute(
+        named_query("catalog_items.rebuild",
+            f"""
+            INSERT INTO catalog_items ({CATALOG_COLUMNS})
+            SELECT {CATALOG_COLUMNS}
+            FROM v_catalog_items_source
+            """
+        )
+    )
+    return inserted.rowcount
+
+
+def check_catalog_items(db: Session) -> list[dict[str, Any]]:
+    rows = db.execute(
+        named_query("catalog_items.check",
+            """
+            SELECT
+              COALESCE(ci.variant_id, src.variant_id)::text AS variant_id,
+              CASE
+                WHEN ci.variant_id IS NULL THEN 'missing'
+                WHEN src.variant_id IS NULL THEN 'stale'
+                WHEN ci.qty_on_hand <> COALESCE(vs.qty_on_hand, 0) THEN 'qty_mismatch'
+                ELSE 'field_mismatch'
+              END AS problem,
+              ci.qty_on_hand AS read_model_qty,
+              COALESCE(vs.qty_on_hand, 0) AS stock_view_qty
+            FROM catalog_items ci
+            FULL JOIN v_catalog_items_source src ON src.variant_id = ci.variant_id
+            LEFT JOIN (
+              SELECT variant_id, SUM(qty_on_hand)::int AS qty_on_hand
+              FROM v_variant_stock
+              GROUP BY variant_id
+            ) vs ON vs.variant_id = COALESCE(ci.variant_id, src.variant_id)
+            WHERE ci.variant_id IS NULL
+               OR src.variant_id IS NULL
+               OR ci.qty_on_hand <> COALESCE(vs.qty_on_hand, 0)
+               OR (
+                 ci.product_id, ci.product_name, ci.brand, ci.category, ci.description, ci.photo_url,
+                 ci.variant_name, ci.color, ci.size, ci.location, ci.purchase_price, ci.sale_price,
+                 ci.primary_code
+               ) IS DISTINCT FROM (
+                 src.product_id, src.product_name, src.brand, src.category, src.description, src.photo_url,
+                 src.variant_name, src.color, src.size, src.location, src.purchase_price, src.sale_price,
+                 src.primary_code
+               )
+            ORDER BY 1
+            """
+        )
+    ).mappings().all()
+    return [dict(row) for row in rows]
+
+
+def list_catalog_changes(
+    db: Session,
+    since_xid: str,
+    after_xid: str,
+    after_variant_id: str,
+    limit: int,
+) -> tuple[list[dict[str, Any]], str]:
+    # Rows are stamped with the writing transaction's xid8. Returning every
+    # row at or above the caller's snapshot xmin re-sends changes that were
+    # still in flight at the previous sync instead of skipping them.
+    rows = db.execute(
+        named_query("catalog_items.changes",
+            """
+            WITH snap AS (
+              SELECT pg_snapshot_xmin(pg_current_snapshot()) AS xmin
+            ),
+            changes AS (
+              SELECT change_xid, variant_id, FALSE AS removed
+              FROM catalog_items
+              WHERE change_xid >= CAST(:since_xid AS xid8)
+                AND (change_xid, variant_id) > (CAST(:after_xid AS xid8), CAST(:after_variant_id AS uuid))
+              UNION ALL
+              SELECT change_xid, variant_id, TRUE AS removed
+              FROM catalog_item_removals
+              WHERE change_xid >= CAST(:since_xid AS xid8)
+                AND (change_xid, variant_id) > (CAST(:after_xid AS xid8), CAST(:after_variant_id AS uuid))
+              ORDER BY change_xid, variant_id
+              LIMIT :limit
+            )
+            SELECT
+              snap.xmin::text AS snapshot_xmin,
+              c.change_xid::text AS change_xid,
+              c.variant_id::text AS variant_id,
+              c.removed,
+              ci.product_name,
+              ci.variant_name,
+              ci.category,
+              ci.brand,
+              ci.location,
+              ci.photo_url,
+              ci.sale_price,
+              ci.purchase_price,
+              ci.qty_on_hand,
+              ci.primary_code,
+              ci.reorder_point,
+              ci.reorder_qty
+            FROM snap
+            LEFT JOIN changes c ON TRUE
+            LEFT JOIN catalog_items ci ON ci.variant_id = c.variant_id AND c.removed = FALSE
+            ORDER BY c.change_xid, c.variant_id
+            """
+        ),
+        {
+            "since_xid": since_xid,
+            "after_xid": after_xid,
+            "after_variant_id": after_variant_id,
+            "limit": limit,
+        },
+    ).mappings().all()
+
+    snapshot_xmin = rows[0]["snapshot_xmin"]
+    return [dict(row) for row in rows if row["variant_id"] is not None], snapshot_xmin
+
+
+def _search_words(query: str) -> str | None:
+    # Every word must match the start of a word in the item: "cam roj" finds
+    # "Camisa roja". \w keeps tsquery operators out of the input.
+    words = re.findall(r"\w+", query.lower())
+    return " & ".join(f"{word}:*" for word in words) or None
+
+
+def search_catalog_items(
+    db: Session,
+    query: str,
+    *,
+    limit: int,
+    cursor: list[Any] | None = None,
+) -> list[dict[str, Any]]:
+    # Candidates come from three indexes: barcode prefix (pattern_ops btree),
+    # word prefix (tsvector GIN) and trigram word similarity (pg_trgm GiST),
+    # which tolerates typos. Only those few hundred rows are scored; the
+    # score is the best tier plus the trigram similarity to the item text.
+    query = query.strip()
+    words = _search_words(query)
+    params: dict[str, Any] = {
+        "query": query.lower(),
+        "code": query,
+        # Upper bound of the byte-wise prefix range; no character sorts above it.
+        "code_end": query + "\U0010ffff",
+        "words": words,
+        "candidates": SEARCH_CANDIDATES,
+        "limit": limit,
+    }
+    # Each arm keeps its own best :candidates matches, so a capped arm drops
+    # its weakest ones, never arbitrary ones. The pattern operators (what
+    # LIKE 'abc%' is rewritten to) keep the prefix range usable by
+    # idx_barcode_variants_code_prefix in a generic plan, and walking it in
+    # its own (byte-wise) order puts the exact code first.
+    arms = [
+        f"""
+        (SELECT
+           variant_id,
+           CASE WHEN barcode_code = :code THEN {SEARCH_TIERS["code"]} ELSE {SEARCH_TIERS["code_prefix"]} END AS tier
+         FROM barcode_variants
+         WHERE barcode_code ~>=~ :code
+           AND barcode_code ~<~ :code_end
+         ORDER BY barcode_code USING ~<~
+         LIMIT :candidates)
+        """
+    ]
+    shape = ["code"]
+    if words is not None:
+        arms.append(
+            f"""
+            (SELECT variant_id, {SEARCH_TIERS["words"]} AS tier
+             FROM catalog_items
+             WHERE to_tsvector('simple', search_text) @@ to_tsquery('simple', :words)
+             ORDER BY ts_rank(to_tsvector('simple', search_text), to_tsquery('simple', :words)) DESC, variant_id
+             LIMIT :candidates)
+            """
+        )
+        shape.append("words")
+    # Trigrams need three characters; shorter queries would scan the index.
+    # search_text <->> :query is 1 - word_similarity(:query, search_text), and
+    # idx_catalog_items_search_trgm_gist walks it nearest first, so even a
+    # common fragment reads only :candidates rows. There is no tie-breaker:
+    # one would force a sort of every match.
+    if len(query) >= 3:
+        arms.append(
+            f"""
+            (SELECT variant_id, {SEARCH_TIERS["fuzzy"]} AS tier
+             FROM catalog_items
+             WHERE :query <% search_text
+             ORDER BY search_text <->> :query
+             LIMIT :candidates)
+            """
+        )
+        shape.append("fuzzy")
+
+    after = ""
+    if cursor is not None:
+        params["after_score"], params["after_variant_id"] = cursor
+        after = """
+            WHERE score < CAST(:after_score AS numeric)
+               OR (score = CAST(:after_score AS numeric) AND variant_id > CAST(:after_variant_id AS uuid))
+        """
+        shape.append("after")
+
+    rows = db.execute(
+        named_query(f"catalog.search.{'_'.join(shape)}",
+            f"""
+            WITH candidates AS (
+              {" UNION ALL ".join(arms)}
+            ),
+            scored AS (
+              SELECT
+                ci.*,
+                ROUND(CAST(best.tier + word_similarity(:query, ci.search_text) AS numeric), 4) AS score
+              FROM (
+                SELECT variant_id, MAX(tier) AS tier
+                FROM candidates
+                GROUP BY variant_id
+              ) best
+              JOIN catalog_items ci ON ci.variant_id = best.variant_id
+            )
+            SELECT
+              variant_id::text AS variant_id,
+              product_name,
+              variant_name,
+              category,
+              brand,
+              location,
+              photo_url,
+              sale_price,
+              purchase_price,
+              qty_on_hand,
+              primary_code,
+              reorder_point,
+              reorder_qty,
+              score
+            FROM scored
+            {after}
+            ORDER BY score DESC, variant_id
+            LIMIT :limit
+            """
+        ),
+        params,
+    ).mappings().all()
+    return [dict(row) for row in rows]
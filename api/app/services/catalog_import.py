@@ -0,0 +1,319 @@
+import csv
+import io
+import json
+import uuid
+from collections.abc import Iterator
+from typing import Any, BinaryIO
+
+from pydantic import ValidationError
+from sqlalchemy.orm import Session
+
+from app.db.queries import named_query
+from app.schemas.inventory import ScanUpsertRequest
+from app.services.catalog import CATALOG_COLUMNS
+
+IMPORT_FORMATS = ("csv", "jsonl")
+MAX_REPORTED_ERRORS = 1000
+
+STAGING_COLUMNS = (
+    "row_no",
+    "code",
+    "product_name",
+    "brand",
+    "category",
+    "description",
+    "photo_url",
+    "variant_name",
+    "color",
+    "size",
+    "location",
+    "purchase_price",
+    "sale_price",
+    "initial_qty",
+    "product_id",
+    "variant_id",
+)
+
+# Column widths from db/schema.sql; ScanUpsertRequest only bounds code and
+# product_name, and one oversized value would abort the whole COPY batch.
+VARCHAR_LIMITS = {
+    "brand": 150,
+    "category": 150,
+    "variant_name": 250,
+    "color": 80,
+    "size": 80,
+    "location": 200,
+}
+
+
+def _read_rows(stream: BinaryIO, fmt: str) -> Iterator[tuple[int, dict[str, Any] | None, str | None]]:
+    lines = io.TextIOWrapper(stream, encoding="utf-8-sig", newline="")
+    if fmt == "csv":
+        for row_no, row in enumerate(csv.DictReader(lines), start=1):
+            yield row_no, {key: value for key, value in row.items() if key and value not in (None, "")}, None
+        return
+
+    for row_no, line in enumerate(lines, start=1):
+        if not line.strip():
+            continue
+        try:
+            row = json.loads(line)
+        except json.JSONDecodeError as exc:
+            yield row_no, None, f"Invalid JSON: {exc.msg}"
+            continue
+        if not isinstance(row, dict):
+            yield row_no, None, "Expected a JSON object"
+            continue
+        yield row_no, row, None
+
+
+def _validation_message(exc: ValidationError) -> str:
+    return "; ".join(
+        f"{'.'.join(str(part) for part in error['loc'])}: {error['msg']}" for error in exc.errors()
+    )
+
+
+def import_catalog(
+    db: Session,
+    stream: BinaryIO,
+    fmt: str,
+    user_id: str,
+    warehouse_id: str,
+) -> tuple[dict[str, Any], list[str]]:
+    # Rows are validated while streaming and copied into a temp staging table;
+    # everything after that is a handful of set-based statements, so the cost
+    # no longer grows with one round trip per product.
+    errors: list[dict[str, Any]] = []
+    error_count = 0
+    total = 0
+
+    def reject(row_no: int, code: str | None, message: str) -> None:
+        nonlocal error_count
+        error_count += 1
+        if len(errors) < MAX_REPORTED_ERRORS:
+            errors.append({"row": row_no, "code": code, "error": message})
+
+    db.execute(
+        named_query("catalog_import.create_staging",
+            """
+            CREATE TEMP TABLE catalog_import_staging (
+              row_no         INT PRIMARY KEY,
+              code           TEXT NOT NULL,
+              product_name   TEXT NOT NULL,
+              brand          TEXT,
+              category       TEXT,
+              description    TEXT,
+              photo_url      TEXT,
+              variant_name   TEXT,
+              color          TEXT,
+              size           TEXT,
+              location       TEXT,
+              purchase_price NUMERIC NOT NULL,
+              sale_price     NUMERIC NOT NULL,
+              initial_qty    INT NOT NULL,
+              product_id     UUID NOT NULL,
+              variant_id     UUID NOT NULL,
+              error          TEXT
+            ) ON COMMIT DROP
+            """
+        )
+    )
+
+    raw = db.connection().connection
+    with raw.cursor() as cursor:
+        with cursor.copy(f"COPY catalog_import_staging ({', '.join(STAGING_COLUMNS)}) FROM STDIN") as copy:
+            for row_no, row, parse_error in _read_rows(stream, fmt):
+                total += 1
+                if parse_error:
+                    reject(row_no, None, parse_error)
+                    continue
+                try:
+                    item = ScanUpsertRequest.model_validate(row)
+                except ValidationError as exc:
+                    reject(row_no, row.get("code"), _validation_message(exc))
+                    continue
+                copy.write_row(
+                    (
+                        row_no,
+                        item.code,
+                        item.product_name,
+                        item.brand,
+                        item.category,
+                        item.description,
+                        item.photo_url,
+                        item.variant_name,
+                        item.color,
+                        item.size,
+                        item.location,
+                        item.purchase_price,
+                        item.sale_price,
+                        item.initial_qty,
+                        uuid.uuid4(),
+                        uuid.uuid4(),
+                    )
+                )
+
+    db.execute(named_query("catalog_import.analyze_staging", "ANALYZE catalog_import_staging"))
+
+    length_checks = "\n".join(
+        f"WHEN length({column}) > {limit} THEN '{column}: at most {limit} characters'"
+        for column, limit in VARCHAR_LIMITS.items()
+    )
+    rejected = db.execute(
+        named_query("catalog_import.flag_errors",
+            f"""
+            WITH checked AS (
+              SELECT
+                s.row_no,
+                CASE
+                  WHEN row_number() OVER (PARTITION BY s.code ORDER BY s.row_no) > 1
+                    THEN 'Duplicate code in file'
+                  WHEN EXISTS (
+                    SELECT 1
+                    FROM barcode_variants bv
+                    JOIN catalog_items ci ON ci.variant_id = bv.variant_id
+                    WHERE bv.barcode_code = s.code
+                  ) THEN 'Code already exists'
+                  WHEN s.initial_qty < 0 THEN 'initial_qty: must be zero or more'
+                  WHEN s.purchase_price < 0 OR s.sale_price < 0 THEN 'Prices must be zero or more'
+                  WHEN s.purchase_price >= 1e10 OR s.sale_price >= 1e10 THEN 'Price out of range'
+                  {length_checks}
+                END AS error
+              FROM catalog_import_staging s
+            )
+            UPDATE catalog_import_staging s
+            SET error = c.error
+            FROM checked c
+            WHERE s.row_no = c.row_no
+              AND c.error IS NOT NULL
+            RETURNING s.row_no, s.code, s.error
+            """
+        )
+    ).mappings().all()
+    for row in sorted(rejected, key=lambda row: row["row_no"]):
+        reject(row["row_no"], row["code"], row["error"])
+
+    variant_ids = db.execute(
+        named_query("catalog_import.insert_rows",
+            f"""
+            WITH accepted AS (
+              SELECT *
+              FROM catalog_import_staging
+              WHERE error IS NULL
+            ),
+            inserted_products AS (
+              INSERT INTO products (id, name, brand, category, description, photo_url)
+              SELECT product_id, product_name, brand, category, description, photo_url
+              FROM accepted
+            ),
+            inserted_variants AS (
+              INSERT INTO product_variants (
+                id,
+                product_id,
+                variant_name,
+                color,
+                size,
+                location,
+                purchase_price,
+                sale_price
+              )
+              SELECT variant_id, product_id, variant_name, color, size, location, purchase_price, sale_price
+              FROM accepted
+              RETURNING id, reorder_point, reorder_qty
+            ),
+            inserted_barcodes AS (
+              INSERT INTO barcodes (code)
+              SELECT code FROM accepted
+              ON CONFLICT (code) DO NOTHING
+            ),
+            inserted_links AS (
+              INSERT INTO barcode_variants (barcode_code, variant_id, is_primary)
+              SELECT code, variant_id, TRUE
+              FROM accepted
+            ),
+            inserted_batches AS (
+              INSERT INTO inventory_batches (warehouse_id, variant_id, batch_code, expires_at)
+              SELECT CAST(:warehouse_id AS uuid), variant_id, 'DEFAULT', NULL
+              FROM accepted
+              RETURNING id, variant_id
+            ),
+            inserted_balances AS (
+              INSERT INTO stock_balances (warehouse_id, batch_id, qty_on_hand)
+              SELECT CAST(:warehouse_id AS uuid), b.id, a.initial_qty
+              FROM accepted a
+              JOIN inserted_batches b ON b.variant_id = a.variant_id
+            ),
+            inserted_movements AS (
+              INSERT INTO stock_movements (
+                warehouse_id,
+                batch_id,
+                variant_id,
+                movement_type,
+                qty_delta,
+                reason,
+                performed_by_user_id
+              )
+              SELECT
+                CAST(:warehouse_id AS uuid),
+                b.id,
+                a.variant_id,
+                CAST('INCREASE_SCAN' AS stock_movement_type),
+                a.initial_qty,
+                'Initial stock on catalog import',
+                CAST(:user_id AS uuid)
+              FROM accepted a
+              JOIN inserted_batches b ON b.variant_id = a.variant_id
+              WHERE a.initial_qty > 0
+            ),
+            -- Same values v_catalog_items_source derives for a new variant with
+            -- one barcode and one batch, without the per-row lateral lookups.
+            inserted_catalog AS (
+              INSERT INTO catalog_items ({CATALOG_COLUMNS})
+              SELECT
+                a.variant_id,
+                a.product_id,
+                a.product_name,
+                a.brand,
+                a.category,
+                a.description,
+                a.photo_url,
+                COALESCE(a.variant_name, CONCAT_WS(' / ', a.color, a.size)),
+                a.color,
+                a.size,
+                a.location,
+                a.purchase_price,
+                a.sale_price,
+                a.initial_qty,
+                a.code,
+                v.reorder_point,
+                v.reorder_qty
+              FROM accepted a
+              JOIN inserted_variants v ON v.id = a.variant_id
+              RETURNING variant_id
+            ),
+            -- dashboard_totals last, after catalog_items (see services/dashboard.py).
+            updated_totals AS (
+              UPDATE dashboard_totals
+              SET invested_amount = invested_amount + stock.amount,
+                  updated_at = now()
+              FROM (
+                SELECT COALESCE(SUM(initial_qty * ROUND(purchase_price, 2)), 0) AS amount
+                FROM accepted
+              ) stock
+              WHERE dashboard_totals.id = 1
+            )
+            SELECT variant_id::text FROM inserted_catalog
+            """
+        ),
+        {"warehouse_id": warehouse_id, "user_id": user_id},
+    ).scalars().all()
+
+    errors.sort(key=lambda error: error["row"])
+    summary = {
+        "rows": total,
+        "created": len(variant_ids),
+        "failed": error_count,
+        "errors": errors,
+        "errors_truncated": error_count > len(errors),
+    }
+    return summary, list(variant_ids)
@@ -0,0 +1,143 @@
+from decimal import Decimal
+from typing import Any
+
+from sqlalchemy.orm import Session
+
+from app.db.queries import named_query
+
+
+def get_dashboard_totals(db: Session) -> dict[str, Any]:
+    row = db.execute(
+        named_query("dashboard.totals",
+            """
+            SELECT
+              invested_amount,
+              gross_sales,
+              cost_of_goods_sold,
+              (gross_sales - cost_of_goods_sold) AS profit
+            FROM dashboard_totals
+            WHERE id = 1
+            """
+        )
+    ).mappings().first()
+    return dict(row)
+
+
+def adjust_invested_for_stock(db: Session, deltas: dict[str, int]) -> None:
+    if not deltas:
+        return
+
+    db.execute(
+        named_query("dashboard.adjust_invested",
+            """
+            UPDATE dashboard_totals
+            SET invested_amount = invested_amount + stock.amount,
+                updated_at = now()
+            FROM (
+              SELECT COALESCE(SUM(d.qty_delta * pv.purchase_price), 0) AS amount
+              FROM unnest(CAST(:variant_ids AS uuid[]), CAST(:qty_deltas AS int[])) AS d(variant_id, qty_delta)
+              JOIN product_variants pv ON pv.id = d.variant_id
+              JOIN products p ON p.id = pv.product_id
+              -- Same scope as v_dashboard_totals_source: stock of inactive
+              -- variants is not invested.
+              WHERE pv.is_active = TRUE
+                AND p.is_active = TRUE
+            ) stock
+            WHERE dashboard_totals.id = 1
+            """
+        ),
+        {"variant_ids": list(deltas), "qty_deltas": list(deltas.values())},
+    )
+
+
+# dashboard_totals is a single hot row: every writer updates it last, after
+# catalog_items, so stock writes and edits always take their locks in the
+# same order.
+
+
+def reprice_dashboard_totals(
+    db: Session,
+    variant_id: str,
+    previous_price: float | Decimal,
+    purchase_price: float | Decimal,
+) -> None:
+    # Runs after catalog_items is refreshed. COGS follows the current purchase
+    # price, as v_dashboard_totals_source does.
+    db.execute(
+        named_query("dashboard.reprice",
+            """
+            UPDATE dashboard_totals
+            SET invested_amount = invested_amount + ci.qty_on_hand * price.delta,
+                cost_of_goods_sold = cost_of_goods_sold + sold.qty * price.delta,
+                updated_at = now()
+            FROM catalog_items ci
+            CROSS JOIN (
+              SELECT CAST(:purchase_price AS numeric(12,2)) - CAST(:previous_price AS numeric(12,2)) AS delta
+            ) price
+            CROSS JOIN LATERAL (
+              SELECT COALESCE(SUM(si.qty), 0) AS qty
+              FROM sale_items si
+              JOIN sales s ON s.id = si.sale_id
+              WHERE si.variant_id = ci.variant_id
+                AND s.status = 'CONFIRMED'
+            ) sold
+            WHERE dashboard_totals.id = 1
+              AND ci.variant_id = CAST(:variant_id AS uuid)
+              AND price.delta <> 0
+            """
+        ),
+        {"variant_id": variant_id, "previous_price": previous_price, "purchase_price": purchase_price},
+    )
+
+
+def remove_invested_for_variant(db: Session, amount: Decimal) -> None:
+    # amount is the removed variant's stock value, read while its
+    # catalog_items row was locked.
+    db.execute(
+        named_query("dashboard.remove_invested",
+            """
+            UPDATE dashboard_totals
+            SET invested_amount = invested_amount - CAST(:amount AS numeric),
+                updated_at = now()
+            WHERE id = 1
+            """
+        ),
+        {"amount": amount},
+    )
+
+
+def recompute_dashboard_totals(db: Session) -> dict[str, Any]:
+    row = db.execute(
+        named_query("dashboard.recompute",
+            """
+            SELECT
+              invested_amount,
+              gross_sales,
+              cost_of_goods_sold,
+              (gross_sales - cost_of_goods_sold) AS profit
+            FROM v_dashboard_totals_source
+            """
+        )
+    ).mappings().first()
+    return dict(row)
+
+
+def rebuild_dashboard_totals(db: Session) -> dict[str, Any]:
+    # Locking the row first makes in-flight writers finish (or wait) so the
+    # recomputed snapshot and later deltas line up.
+    db.execute(named_query("dashboard.lock_totals", "SELECT id FROM dashboard_totals WHERE id = 1 FOR UPDATE"))
+    db.execute(
+        named_query("dashboard.rebuild",
+            """
+            INSERT INTO dashboard_totals (id, invested_amount, gross_sales, cost_of_goods_sold, updated_at)
+            SELECT 1, invested_amount, gross_sales, cost_of_goods_sold, now()
+            FROM v_dashboard_totals_source
+            ON CONFLICT (id) DO UPDATE SET
+              invested_amount = EXCLUDED.invested_amount,
+              gross_sales = EXCLUDED.gross_sales,
+              cost_of_goods_sold = EXCLUDED.cost_of_goods_sold,
+              updated_at = EXCLUDED.updated_at
+            """
+        )
+    )
+    return get_dashboard_totals(db)
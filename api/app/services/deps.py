@@ -1,35 +1,68 @@
-﻿from fastapi import Depends, HTTPException, status
+﻿import time
+from typing import Any
+
+from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
-from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 
 from app.core.security import decode_access_token
-from app.db.session import get_db
+from app.db.queries import named_query
+from app.db.session import get_async_db, get_db
+from app.services.auth_cache import token_cache, user_cache
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/auth/login")
 
+USER_QUERY = named_query("auth.user_by_id",
+    """
+    SELECT id::text AS id, username, full_name, is_active
+    FROM users
+    WHERE id = CAST(:user_id AS uuid)
+    """
+)
 
-def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)):
-    try:
-        payload = decode_access_token(token)
-        user_id = payload.get("sub")
-        if not user_id:
-            raise ValueError("Missing subject")
-    except ValueError:
+
+def _token_subject(token: str) -> str:
+    payload = token_cache.get(token)
+    if payload is None:
+        try:
+            payload = decode_access_token(token)
+            if not payload.get("sub"):
+                raise ValueError("Missing subject")
+        except ValueError:
+            raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid authentication token")
+        token_cache.set(token, payload)
+    elif payload.get("exp", 0) <= time.time():
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid authentication token")
+    return payload["sub"]
 
-    user = db.execute(
-        text(
-            """
-            SELECT id::text AS id, username, full_name, is_active
-            FROM users
-            WHERE id = CAST(:user_id AS uuid)
-            """
-        ),
-        {"user_id": user_id},
-    ).mappings().first()
 
+def _cache_active_user(user_id: str, user: Any, generation: int) -> dict[str, Any]:
     if not user or not user["is_active"]:
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Inactive or missing user")
 
+    user = dict(user)
+    user_cache.set(user_id, user, generation)
     return user
+
+
+def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)):
+    user_id = _token_subject(token)
+    generation = user_cache.generation()
+    user = user_cache.get(user_id)
+    if user is not None:
+        return user
+
+    user = db.execute(USER_QUERY, {"user_id": user_id}).mappings().first()
+    return _cache_active_user(user_id, user, generation)
+
+
+async def get_current_user_async(token: str = Depends(oauth2_scheme), db: AsyncSession = Depends(get_async_db)):
+    user_id = _token_subject(token)
+    generation = user_cache.generation()
+    user = user_cache.get(user_id)
+    if user is not None:
+        return user
+
+    user = (await db.execute(USER_QUERY, {"user_id": user_id})).mappings().first()
+    return _cache_active_user(user_id, user, generation)
@@ -0,0 +1,215 @@
+import asyncio
+import json
+import logging
+import threading
+import time
+from typing import Any
+
+import psycopg
+from sqlalchemy.engine import make_url
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.db.queries import named_query
+from app.db.session import SessionLocal
+from app.services.auth_cache import evict_users, set_user_events_listening
+from app.services.dashboard import get_dashboard_totals
+
+logger = logging.getLogger(__name__)
+
+EVENTS_CHANNEL = "inventory_events"
+USER_EVENTS_CHANNEL = "user_events"
+# pg_notify payloads are capped at 8000 bytes; past this many ids the
+# listener just sends a full low-stock snapshot.
+MAX_NOTIFY_VARIANTS = 150
+LISTEN_RETRY_MIN_SECONDS = 1
+LISTEN_RETRY_MAX_SECONDS = 60
+
+
+def notify_inventory_change(db: Session, variant_ids: list[str]) -> None:
+    # Delivered by Postgres only when the surrounding transaction commits.
+    unique_ids = sorted(set(variant_ids))
+    payload = {"variant_ids": unique_ids if len(unique_ids) <= MAX_NOTIFY_VARIANTS else None}
+    db.execute(
+        named_query("events.notify", "SELECT pg_notify(:channel, :payload)"),
+        {"channel": EVENTS_CHANNEL, "payload": json.dumps(payload)},
+    )
+
+
+def serialize_summary(totals: dict[str, Any]) -> dict[str, float]:
+    return {key: float(value) for key, value in totals.items()}
+
+
+def serialize_low_stock(row: dict[str, Any]) -> dict[str, Any]:
+    return {
+        "variant_id": row["variant_id"],
+        "product_name": row["product_name"],
+        "variant_name": row["variant_name"],
+        "qty_on_hand": int(row["qty_on_hand"]),
+        "primary_code": row["primary_code"],
+        "reorder_point": row["reorder_point"],
+        "reorder_qty": row["reorder_qty"],
+    }
+
+
+def build_snapshot_event(db: Session) -> dict[str, Any]:
+    rows = db.execute(
+        named_query("events.low_stock_snapshot",
+            """
+            SELECT
+              variant_id::text AS variant_id,
+              product_name,
+              variant_name,
+              qty_on_hand,
+              primary_code,
+              reorder_point,
+              reorder_qty
+            FROM catalog_items
+            WHERE qty_on_hand <= reorder_point
+            ORDER BY qty_on_hand ASC, product_name ASC
+            """
+        )
+    ).mappings().all()
+    return {
+        "event": "snapshot",
+        "summary": serialize_summary(get_dashboard_totals(db)),
+        "low_stock": [serialize_low_stock(row) for row in rows],
+    }
+
+
+def build_update_event(db: Session, variant_ids: set[str]) -> dict[str, Any]:
+    rows = db.execute(
+        named_query("events.low_stock_update",
+            """
+            SELECT
+              variant_id::text AS variant_id,
+              product_name,
+              variant_name,
+              qty_on_hand,
+              primary_code,
+              reorder_point,
+              reorder_qty
+            FROM catalog_items
+            WHERE variant_id = ANY(CAST(:variant_ids AS uuid[]))
+              AND qty_on_hand <= reorder_point
+            """
+        ),
+        {"variant_ids": sorted(variant_ids)},
+    ).mappings().all()
+    low = [serialize_low_stock(row) for row in rows]
+    low_ids = {row["variant_id"] for row in low}
+    return {
+        "event": "update",
+        "summary": serialize_summary(get_dashboard_totals(db)),
+        "low_stock_upsert": low,
+        "low_stock_remove": sorted(variant_ids - low_ids),
+    }
+
+
+class EventBroker:
+    def __init__(self, database_url: str, debounce_seconds: float = 0.25):
+        url = make_url(database_url).set(drivername="postgresql")
+        self._conninfo = url.render_as_string(hide_password=False)
+        self._debounce_seconds = debounce_seconds
+        self._subscribers: set[asyncio.Queue] = set()
+        self._loop: asyncio.AbstractEventLoop | None = None
+        self._stop = threading.Event()
+        self._thread: threading.Thread | None = None
+
+    def start(self, loop: asyncio.AbstractEventLoop) -> None:
+        self._loop = loop
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._listen_forever, name="inventory-events", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread:
+            self._thread.join(timeout=5)
+
+    def subscribe(self) -> asyncio.Queue:
+        queue: asyncio.Queue = asyncio.Queue(maxsize=100)
+        self._subscribers.add(queue)
+        return queue
+
+    def unsubscribe(self, queue: asyncio.Queue) -> None:
+        self._subscribers.discard(queue)
+
+    @property
+    def subscriber_count(self) -> int:
+        return len(self._subscribers)
+
+    def _fan_out(self, event: dict[str, Any]) -> None:
+        for queue in list(self._subscribers):
+            if queue.full():
+                # A client this far behind gets a fresh snapshot instead.
+                while not queue.empty():
+                    queue.get_nowait()
+                queue.put_nowait({"event": "resync"})
+            else:
+                queue.put_nowait(event)
+
+    def _publish(self, event: dict[str, Any]) -> None:
+        if self._loop and not self._loop.is_closed():
+            self._loop.call_soon_threadsafe(self._fan_out, event)
+
+    def _listen_forever(self) -> None:
+        delay = LISTEN_RETRY_MIN_SECONDS
+        reconnecting = False
+        while not self._stop.is_set():
+            listening_since = None
+            try:
+                with psycopg.connect(self._conninfo, autocommit=True) as conn:
+                    conn.execute(f"LISTEN {EVENTS_CHANNEL}")
+                    conn.execute(f"LISTEN {USER_EVENTS_CHANNEL}")
+                    listening_since = time.monotonic()
+                    set_user_events_listening(True)
+                    if reconnecting:
+                        # Notifications sent while disconnected are lost.
+                        self._publish({"event": "resync"})
+                    self._listen(conn)
+            except Exception:
+                set_user_events_listening(False)
+                # Not only psycopg errors: a bad payload or a failed snapshot
+                # query must not end the thread and silently stop the stream.
+                if listening_since is not None and time.monotonic() - listening_since > LISTEN_RETRY_MAX_SECONDS:
+                    delay = LISTEN_RETRY_MIN_SECONDS
+                logger.exception("Inventory event listener failed; reconnecting in %ss", delay)
+                reconnecting = True
+                self._stop.wait(delay)
+                delay = min(delay * 2, LISTEN_RETRY_MAX_SECONDS)
+        set_user_events_listening(False)
+
+    def _listen(self, conn: psycopg.Connection) -> None:
+        while not self._stop.is_set():
+            notifies = list(conn.notifies(timeout=1.0, stop_after=1))
+            if not notifies:
+                continue
+            # Coalesce a burst (e.g. a receiving session) into one event.
+            notifies.extend(conn.notifies(timeout=self._debounce_seconds))
+
+            user_ids = [notify.payload for notify in notifies if notify.channel == USER_EVENTS_CHANNEL]
+            if user_ids:
+                evict_users(user_ids)
+
+            notifies = [notify for notify in notifies if notify.channel == EVENTS_CHANNEL]
+            if not notifies or not self._subscribers:
+                continue
+
+            variant_ids: set[str] | None = set()
+            for notify in notifies:
+                ids = json.loads(notify.payload or "{}").get("variant_ids")
+                if ids is None or variant_ids is None:
+                    variant_ids = None
+                else:
+                    variant_ids.update(ids)
+
+            with SessionLocal() as db:
+                if variant_ids is None:
+                    event = build_snapshot_event(db)
+                else:
+                    event = build_update_event(db, variant_ids)
+            self._publish(event)
+
+
+broker = EventBroker(settings.events_database_url or settings.database_url)
@@ -0,0 +1,129 @@
+import csv
+import io
+import json
+from collections.abc import Iterator
+from datetime import datetime
+from typing import Any, Literal
+
+from app.db.queries import named_query
+from app.db.session import SessionLocal
+from app.services.stock_history import movement_conditions
+
+ExportFormat = Literal["csv", "ndjson"]
+MovementType = Literal["INCREASE_SCAN", "DECREASE_SALE", "ADJUSTMENT", "INTERNAL_USE", "DAMAGE", "WASTE"]
+
+EXPORT_MEDIA_TYPES = {"csv": "text/csv; charset=utf-8", "ndjson": "application/x-ndjson"}
+EXPORT_FETCH_ROWS = 2000
+EXPORT_CHUNK_BYTES = 64 * 1024
+
+INVENTORY_EXPORT_COLUMNS = (
+    "variant_id",
+    "product_id",
+    "primary_code",
+    "product_name",
+    "variant_name",
+    "brand",
+    "category",
+    "color",
+    "size",
+    "location",
+    "purchase_price",
+    "sale_price",
+    "qty_on_hand",
+    "updated_at",
+)
+
+MOVEMENT_EXPORT_COLUMNS = (
+    "movement_id",
+    "created_at",
+    "movement_type",
+    "qty_delta",
+    "variant_id",
+    "product_name",
+    "variant_name",
+    "warehouse_id",
+    "batch_id",
+    "reason",
+    "reference_sale_id",
+    "performed_by",
+)
+
+
+def _stream_rows(name: str, sql: str, params: dict[str, Any]) -> Iterator[dict[str, Any]]:
+    # yield_per switches to a server-side cursor, so only one fetch batch is
+    # held in memory. The session is owned by the generator because the
+    # response body is produced after the endpoint has returned.
+    with SessionLocal() as db:
+        result = db.execute(named_query(name, sql).execution_options(yield_per=EXPORT_FETCH_ROWS), params)
+        for row in result.mappings():
+            yield row
+
+
+def _encode(rows: Iterator[dict[str, Any]], columns: tuple[str, ...], fmt: ExportFormat) -> Iterator[bytes]:
+    buffer = io.StringIO()
+    writer = csv.writer(buffer) if fmt == "csv" else None
+    if writer:
+        writer.writerow(columns)
+
+    for row in rows:
+        if writer:
+            writer.writerow([row[column] for column in columns])
+        else:
+            buffer.write(json.dumps({column: row[column] for column in columns}, default=str))
+            buffer.write("\n")
+        if buffer.tell() >= EXPORT_CHUNK_BYTES:
+            yield buffer.getvalue().encode("utf-8")
+            buffer.seek(0)
+            buffer.truncate()
+
+    if buffer.tell():
+        yield buffer.getvalue().encode("utf-8")
+
+
+def export_inventory(fmt: ExportFormat) -> Iterator[bytes]:
+    rows = _stream_rows(
+        "export.inventory",
+        f"""
+        SELECT {", ".join(INVENTORY_EXPORT_COLUMNS)}
+        FROM catalog_items
+        ORDER BY product_name, variant_name, variant_id
+        """,
+        {},
+    )
+    return _encode(rows, INVENTORY_EXPORT_COLUMNS, fmt)
+
+
+def export_stock_movements(
+    fmt: ExportFormat,
+    created_from: datetime | None,
+    created_to: datetime | None,
+    movement_types: list[str] | None,
+) -> Iterator[bytes]:
+    conditions, params, shape = movement_conditions(None, created_from, created_to, movement_types)
+    where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+    rows = _stream_rows(
+        f"export.stock_movements.{shape}",
+        f"""
+        SELECT
+          sm.id AS movement_id,
+          sm.created_at,
+          sm.movement_type,
+          sm.qty_delta,
+          sm.variant_id,
+          p.name AS product_name,
+          COALESCE(pv.variant_name, CONCAT_WS(' / ', pv.color, pv.size)) AS variant_name,
+          sm.warehouse_id,
+          sm.batch_id,
+          sm.reason,
+          sm.reference_sale_id,
+          u.username AS performed_by
+        FROM stock_movements sm
+        JOIN product_variants pv ON pv.id = sm.variant_id
+        JOIN products p ON p.id = pv.product_id
+        JOIN users u ON u.id = sm.performed_by_user_id
+        {where}
+        ORDER BY sm.created_at, sm.id
+        """,
+        params,
+    )
+    return _encode(rows, MOVEMENT_EXPORT_COLUMNS, fmt)
@@ -0,0 +1,121 @@
+import asyncio
+import hashlib
+import json
+import logging
+from typing import Any
+
+from fastapi import HTTPException
+from fastapi.encoders import jsonable_encoder
+from psycopg.errors import LockNotAvailable
+from pydantic import BaseModel
+from sqlalchemy.exc import OperationalError, SQLAlchemyError
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.db.queries import named_query
+from app.db.session import SessionLocal
+
+logger = logging.getLogger(__name__)
+
+
+def _request_hash(endpoint: str, payload: BaseModel) -> str:
+    return hashlib.sha256(f"{endpoint}\n{payload.model_dump_json()}".encode()).hexdigest()
+
+
+def claim_idempotency_key(
+    db: Session,
+    user_id: str,
+    key: str,
+    endpoint: str,
+    payload: BaseModel,
+) -> Any | None:
+    # Must be the first statement of the request's transaction. The key row is
+    # inserted up front and committed together with the request's writes, so
+    # a concurrent duplicate blocks on it until that transaction ends: after a
+    # commit it gets the stored response (ON CONFLICT DO UPDATE sees the latest
+    # committed row, one primary key probe), after a rollback its own insert
+    # goes through and it runs the request itself. Expired rows are taken over.
+    request_hash = _request_hash(endpoint, payload)
+    try:
+        row = db.execute(
+            named_query("idempotency.claim",
+                """
+                INSERT INTO idempotency_keys AS ik (user_id, idempotency_key, request_hash, expires_at)
+                VALUES (
+                  CAST(:user_id AS uuid),
+                  :key,
+                  :request_hash,
+                  now() + make_interval(secs => :ttl_seconds)
+                )
+                ON CONFLICT (user_id, idempotency_key) DO UPDATE
+                SET request_hash = CASE WHEN ik.expires_at > now() THEN ik.request_hash ELSE EXCLUDED.request_hash END,
+                    response = CASE WHEN ik.expires_at > now() THEN ik.response END,
+                    created_at = CASE WHEN ik.expires_at > now() THEN ik.created_at ELSE now() END,
+                    expires_at = CASE WHEN ik.expires_at > now() THEN ik.expires_at ELSE EXCLUDED.expires_at END
+                RETURNING request_hash, response
+                """
+            ),
+            {
+                "user_id": user_id,
+                "key": key,
+                "request_hash": request_hash,
+                "ttl_seconds": settings.idempotency_ttl_hours * 3600,
+            },
+        ).mappings().one()
+    except OperationalError as exc:
+        db.rollback()
+        if isinstance(exc.orig, LockNotAvailable):
+            raise HTTPException(
+                status_code=409,
+                detail="A request with this Idempotency-Key is still in progress",
+                headers={"Retry-After": "1"},
+            )
+        raise
+
+    if row["response"] is None:
+        return None
+
+    # Nothing was written besides the no-op update; release the row lock now.
+    db.rollback()
+    if row["request_hash"] != request_hash:
+        raise HTTPException(status_code=422, detail="Idempotency-Key was already used for a different request")
+    return row["response"]
+
+
+def store_idempotent_response(db: Session, user_id: str, key: str, response: Any) -> None:
+    # Runs right before the request's commit, in the same transaction.
+    db.execute(
+        named_query("idempotency.store",
+            """
+            UPDATE idempotency_keys
+            SET response = CAST(:response AS jsonb)
+            WHERE user_id = CAST(:user_id AS uuid)
+              AND idempotency_key = :key
+            """
+        ),
+        {"user_id": user_id, "key": key, "response": json.dumps(jsonable_encoder(response))},
+    )
+
+
+def purge_idempotency_keys(db: Session) -> int:
+    return db.execute(
+        named_query("idempotency.purge", "DELETE FROM idempotency_keys WHERE expires_at <= now()")
+    ).rowcount
+
+
+def keep_idempotency_keys() -> None:
+    try:
+        with SessionLocal() as db:
+            purged = purge_idempotency_keys(db)
+            db.commit()
+    except SQLAlchemyError:
+        logger.warning("Could not purge expired idempotency keys")
+        return
+    if purged:
+        logger.info("Purged %s expired idempotency keys", purged)
+
+
+async def maintain_idempotency_keys() -> None:
+    while True:
+        await asyncio.to_thread(keep_idempotency_keys)
+        await asyncio.sleep(settings.idempotency_cleanup_minutes * 60)
@@ -0,0 +1,51 @@
+﻿from typing import Any
+
+from app.core.cache import TTLCache
+from app.core.config import settings
+
+# code -> variant_id, variant_id -> product fields, variant_id -> qty_on_hand,
+# (warehouse_id, variant_id) -> default batch id.
+# Stock gets its own short TTL so other API processes converge quickly.
+code_cache = TTLCache(
+    settings.lookup_cache_max_entries,
+    settings.lookup_cache_ttl_seconds,
+    settings.lookup_cache_enabled,
+)
+variant_cache = TTLCache(
+    settings.lookup_cache_max_entries,
+    settings.lookup_cache_ttl_seconds,
+    settings.lookup_cache_enabled,
+)
+stock_cache = TTLCache(
+    settings.lookup_cache_max_entries,
+    settings.lookup_cache_stock_ttl_seconds,
+    settings.lookup_cache_enabled,
+)
+
+batch_cache = TTLCache(
+    settings.lookup_cache_max_entries,
+    settings.lookup_cache_ttl_seconds,
+    settings.lookup_cache_enabled,
+)
+
+
+def invalidate_codes(codes: list[str]) -> None:
+    code_cache.invalidate(*codes)
+
+
+def invalidate_variants(variant_ids: list[str]) -> None:
+    variant_cache.invalidate(*variant_ids)
+    stock_cache.invalidate(*variant_ids)
+
+
+def invalidate_stock(variant_ids: list[str]) -> None:
+    stock_cache.invalidate(*variant_ids)
+
+
+def lookup_cache_stats() -> dict[str, Any]:
+    return {
+        "codes": code_cache.stats(),
+        "variants": variant_cache.stats(),
+        "stock": stock_cache.stats(),
+        "batches": batch_cache.stats(),
+    }
@@ -0,0 +1,81 @@
+import asyncio
+import logging
+from datetime import date
+from typing import Any
+
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.db.queries import named_query
+from app.db.session import SessionLocal
+
+logger = logging.getLogger(__name__)
+
+ARCHIVE_SCHEMA = "archive"
+
+# Monthly partitions are named stock_movements_YYYY_MM by
+# ensure_stock_movement_partitions() in db/schema.sql.
+PARTITIONS_SQL = """
+    SELECT
+      c.relname AS name,
+      to_date(substring(c.relname FROM 'stock_movements_(\\d{4}_\\d{2})$'), 'YYYY_MM') AS month,
+      GREATEST(c.reltuples, 0)::bigint AS estimated_rows,
+      pg_total_relation_size(c.oid) AS total_bytes
+    FROM pg_inherits i
+    JOIN pg_class c ON c.oid = i.inhrelid
+    WHERE i.inhparent = 'stock_movements'::regclass
+    ORDER BY month NULLS LAST
+"""
+
+
+def ensure_movement_partitions(db: Session, months_ahead: int) -> int:
+    return db.execute(
+        named_query("ledger.ensure_partitions", "SELECT ensure_stock_movement_partitions(now(), :months_ahead)"),
+        {"months_ahead": months_ahead},
+    ).scalar_one()
+
+
+def keep_movement_partitions() -> None:
+    try:
+        with SessionLocal() as db:
+            created = ensure_movement_partitions(db, settings.movement_partitions_ahead)
+            db.commit()
+    except SQLAlchemyError:
+        logger.warning("Could not create stock_movements partitions; new rows go to the default partition")
+        return
+    if created:
+        logger.info("Created %s stock_movements partitions", created)
+
+
+async def maintain_movement_partitions() -> None:
+    # Runs for the life of the API process; a month is created long before
+    # its first row, so one pass a day is plenty.
+    while True:
+        await asyncio.to_thread(keep_movement_partitions)
+        await asyncio.sleep(settings.movement_partitions_check_hours * 3600)
+
+
+def list_movement_partitions(db: Session) -> list[dict[str, Any]]:
+    rows = db.execute(named_query("ledger.list_partitions", PARTITIONS_SQL)).mappings().all()
+    return [dict(row) for row in rows]
+
+
+def archive_movement_partitions(db: Session, before: date, drop: bool) -> list[str]:
+    # Detaches every monthly partition that ends on or before `before` (a
+    # month start). Detached tables move to the archive schema, where they
+    # can be dumped and dropped, or are dropped right away with drop=True.
+    archived = [
+        partition["name"]
+        for partition in list_movement_partitions(db)
+        if partition["month"] is not None and partition["month"] < before
+    ]
+    if archived and not drop:
+        db.execute(named_query("ledger.create_archive_schema", f"CREATE SCHEMA IF NOT EXISTS {ARCHIVE_SCHEMA}"))
+    for name in archived:
+        db.execute(named_query("ledger.detach_partition", f'ALTER TABLE stock_movements DETACH PARTITION "{name}"'))
+        if drop:
+            db.execute(named_query("ledger.drop_partition", f'DROP TABLE "{name}"'))
+        else:
+            db.execute(named_query("ledger.archive_partition", f'ALTER TABLE "{name}" SET SCHEMA {ARCHIVE_SCHEMA}'))
+    return archived
@@ -0,0 +1,26 @@
+import base64
+import json
+from typing import Any
+
+from fastapi import HTTPException
+
+
+def encode_cursor(key: str, values: list[Any]) -> str:
+    raw = json.dumps([key, values], default=str, separators=(",", ":"))
+    return base64.urlsafe_b64encode(raw.encode("utf-8")).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor: str, key: str, size: int) -> list[Any]:
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        cursor_key, values = json.loads(base64.urlsafe_b64decode(padded.encode("ascii")))
+    except (ValueError, TypeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+    if cursor_key != key or not isinstance(values, list) or len(values) != size:
+        raise HTTPException(status_code=400, detail="Cursor does not match the requested sort")
+    # Values are only checked for being scalars here; the query casts them to
+    # the sort column types, and callers map a failed cast to 400 too.
+    if not all(value is None or isinstance(value, (str, int, float)) for value in values):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    return values
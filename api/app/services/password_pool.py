@@ -0,0 +1,76 @@
+import asyncio
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any
+
+from app.core.config import settings
+from app.core.metrics import Histogram
+from app.core.security import verify_password
+
+
+class PasswordPoolSaturated(Exception):
+    pass
+
+
+class PasswordVerifierPool:
+    # bcrypt releases the GIL while hashing, so a small thread pool runs
+    # checks in parallel without touching the request threadpool.
+    def __init__(self, workers: int, queue_limit: int):
+        self.workers = workers
+        self.queue_limit = queue_limit
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="password-verify")
+        self._lock = threading.Lock()
+        self._pending = 0
+        self._active = 0
+        self.completed = 0
+        self.rejected = 0
+        self.wait_ms = Histogram()
+        self.verify_ms = Histogram()
+        self.login_ms = Histogram()
+
+    async def verify(self, plain_password: str, hashed_password: str) -> bool:
+        with self._lock:
+            if self._pending >= self.workers + self.queue_limit:
+                self.rejected += 1
+                raise PasswordPoolSaturated()
+            self._pending += 1
+
+        future = self._executor.submit(self._verify, plain_password, hashed_password, time.perf_counter())
+        future.add_done_callback(self._release)
+        return await asyncio.wrap_future(future)
+
+    def _verify(self, plain_password: str, hashed_password: str, submitted_at: float) -> bool:
+        started = time.perf_counter()
+        self.wait_ms.observe((started - submitted_at) * 1000)
+        with self._lock:
+            self._active += 1
+        try:
+            return verify_password(plain_password, hashed_password)
+        finally:
+            self.verify_ms.observe((time.perf_counter() - started) * 1000)
+            with self._lock:
+                self._active -= 1
+
+    def _release(self, _: Future) -> None:
+        with self._lock:
+            self._pending -= 1
+            self.completed += 1
+
+    def stats(self) -> dict[str, Any]:
+        with self._lock:
+            pending, active = self._pending, self._active
+        return {
+            "workers": self.workers,
+            "queue_limit": self.queue_limit,
+            "active": active,
+            "queued": pending - active,
+            "completed": self.completed,
+            "rejected": self.rejected,
+            "wait_ms": self.wait_ms.stats(),
+            "verify_ms": self.verify_ms.stats(),
+            "login_ms": self.login_ms.stats(),
+        }
+
+
+password_pool = PasswordVerifierPool(settings.login_hash_workers, settings.login_hash_queue_limit)
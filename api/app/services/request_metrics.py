@@ -0,0 +1,132 @@
+import threading
+import time
+from typing import Any
+
+from app.core.metrics import Histogram
+from app.db.queries import query_stats, track_db_time
+
+LATENCY_BUCKETS_SECONDS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+UNMATCHED_ROUTE = "unmatched"
+PROMETHEUS_MEDIA_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+class RouteMetrics:
+    def __init__(self):
+        self.responses: dict[int, int] = {}
+        self.duration = Histogram(LATENCY_BUCKETS_SECONDS)
+        self.db_time = Histogram(LATENCY_BUCKETS_SECONDS)
+        self.db_queries = 0
+
+
+_lock = threading.Lock()
+_routes: dict[tuple[str, str], RouteMetrics] = {}
+
+
+def _observe(method: str, route: str, status_code: int, seconds: float, db_seconds: float, db_queries: int) -> None:
+    with _lock:
+        metrics = _routes.get((method, route))
+        if metrics is None:
+            metrics = _routes[(method, route)] = RouteMetrics()
+        metrics.responses[status_code] = metrics.responses.get(status_code, 0) + 1
+        metrics.db_queries += db_queries
+    metrics.duration.observe(seconds)
+    metrics.db_time.observe(db_seconds)
+
+
+class RequestMetricsMiddleware:
+    # Plain ASGI rather than BaseHTTPMiddleware so streamed bodies (exports,
+    # SSE) are timed until the last chunk and no extra task is spawned.
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        status_code = 500
+
+        async def send_with_status(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        started = time.perf_counter()
+        with track_db_time() as db_time:
+            try:
+                await self.app(scope, receive, send_with_status)
+            finally:
+                # The router stores the matched route in the scope; label by its
+                # path template so ids in URLs do not create new series.
+                route = getattr(scope.get("route"), "path", UNMATCHED_ROUTE)
+                _observe(
+                    scope["method"],
+                    route,
+                    status_code,
+                    time.perf_counter() - started,
+                    db_time.seconds,
+                    db_time.queries,
+                )
+
+
+def _labels(**labels: Any) -> str:
+    def escape(value: Any) -> str:
+        return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+    return ",".join(f'{name}="{escape(value)}"' for name, value in labels.items())
+
+
+def _histogram_lines(name: str, histogram: Histogram, labels: str) -> list[str]:
+    buckets, count, total, _ = histogram.snapshot()
+    lines = [f'{name}_bucket{{{labels},le="{bound}"}} {bucket_count}' for bound, bucket_count in buckets.items()]
+    lines.append(f"{name}_sum{{{labels}}} {total:.6f}")
+    lines.append(f"{name}_count{{{labels}}} {count}")
+    return lines
+
+
+def render_metrics() -> str:
+    with _lock:
+        routes = sorted(_routes.items())
+        responses = {key: dict(metrics.responses) for key, metrics in routes}
+
+    lines = [
+        "# HELP http_requests_total HTTP responses by route and status code.",
+        "# TYPE http_requests_total counter",
+    ]
+    for (method, route), _ in routes:
+        for status_code, count in sorted(responses[(method, route)].items()):
+            lines.append(f"http_requests_total{{{_labels(method=method, route=route, status=status_code)}}} {count}")
+
+    lines += [
+        "# HELP http_request_duration_seconds Time from request start to the last response byte.",
+        "# TYPE http_request_duration_seconds histogram",
+    ]
+    for (method, route), metrics in routes:
+        lines += _histogram_lines("http_request_duration_seconds", metrics.duration, _labels(method=method, route=route))
+
+    lines += [
+        "# HELP http_request_db_seconds Time spent executing SQL per request.",
+        "# TYPE http_request_db_seconds histogram",
+    ]
+    for (method, route), metrics in routes:
+        lines += _histogram_lines("http_request_db_seconds", metrics.db_time, _labels(method=method, route=route))
+
+    lines += [
+        "# HELP http_request_db_queries_total SQL statements executed while serving the route.",
+        "# TYPE http_request_db_queries_total counter",
+    ]
+    for (method, route), metrics in routes:
+        lines.append(f"http_request_db_queries_total{{{_labels(method=method, route=route)}}} {metrics.db_queries}")
+
+    queries = sorted(query_stats(), key=lambda row: row["name"])
+    for name, help_text, value in (
+        ("db_query_calls_total", "Executions per named query.", lambda row: row["calls"]),
+        ("db_query_errors_total", "Failed executions per named query.", lambda row: row["errors"]),
+        ("db_query_seconds_total", "Execution time per named query.", lambda row: row["total_ms"] / 1000),
+    ):
+        lines += [f"# HELP {name} {help_text}", f"# TYPE {name} counter"]
+        for row in queries:
+            lines.append(f"{name}{{{_labels(query=row['name'])}}} {value(row)}")
+
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,349 @@
+from datetime import date
+from typing import Any, Literal
+
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.db.queries import named_query
+
+ReportInterval = Literal["day", "week", "month"]
+TopSellersOrder = Literal["units", "revenue", "margin"]
+
+ROLLUP_TABLES = ("sales_daily", "sales_daily_categories", "sales_daily_variants")
+
+# One row per (sale date, variant) straight from the ledger. Items sold before
+# sale_items.unit_cost existed are costed at the current purchase price, and
+# their category is the product's current one.
+ROLLUP_SOURCE_SQL = """
+    SELECT
+      (s.created_at AT TIME ZONE CAST(:tz AS text))::date AS sale_date,
+      si.variant_id,
+      COALESCE(p.category, '') AS category,
+      SUM(si.qty)::bigint AS units,
+      SUM(si.line_total) AS revenue,
+      SUM(si.qty * COALESCE(si.unit_cost, pv.purchase_price)) AS cost
+    FROM sales s
+    JOIN sale_items si ON si.sale_id = s.id
+    JOIN product_variants pv ON pv.id = si.variant_id
+    JOIN products p ON p.id = pv.product_id
+    WHERE s.status = 'CONFIRMED'
+      {since}
+    GROUP BY 1, si.variant_id, p.category
+"""
+
+SALE_DAYS_SQL = """
+    SELECT
+      (s.created_at AT TIME ZONE CAST(:tz AS text))::date AS sale_date,
+      COUNT(*)::int AS tickets
+    FROM sales s
+    WHERE s.status = 'CONFIRMED'
+      {since}
+    GROUP BY 1
+"""
+
+# CTE steps appended to sales.allocate_checkout. They read the `lines` CTE and
+# :sale_tz; rows are upserted in key order so concurrent checkouts lock the
+# rollup rows in the same order.
+CHECKOUT_ROLLUP_CTES = """
+    sold AS (
+      SELECT
+        (now() AT TIME ZONE CAST(:sale_tz AS text))::date AS sale_date,
+        l.variant_id,
+        COALESCE(p.category, '') AS category,
+        SUM(l.qty)::bigint AS units,
+        SUM(l.line_total) AS revenue,
+        SUM(l.qty * pv.purchase_price) AS cost
+      FROM lines l
+      JOIN product_variants pv ON pv.id = l.variant_id
+      JOIN products p ON p.id = pv.product_id
+      GROUP BY l.variant_id, p.category
+    ),
+    rolled_day AS (
+      INSERT INTO sales_daily AS r (sale_date, tickets, units, revenue, cost)
+      SELECT MIN(sale_date), 1, SUM(units), SUM(revenue), SUM(cost)
+      FROM sold
+      ON CONFLICT (sale_date) DO UPDATE SET
+        tickets = r.tickets + EXCLUDED.tickets,
+        units = r.units + EXCLUDED.units,
+        revenue = r.revenue + EXCLUDED.revenue,
+        cost = r.cost + EXCLUDED.cost,
+        updated_at = now()
+    ),
+    rolled_categories AS (
+      INSERT INTO sales_daily_categories AS r (sale_date, category, units, revenue, cost)
+      SELECT MIN(sale_date), category, SUM(units), SUM(revenue), SUM(cost)
+      FROM sold
+      GROUP BY category
+      ORDER BY category
+      ON CONFLICT (sale_date, category) DO UPDATE SET
+        units = r.units + EXCLUDED.units,
+        revenue = r.revenue + EXCLUDED.revenue,
+        cost = r.cost + EXCLUDED.cost
+    ),
+    rolled_variants AS (
+      INSERT INTO sales_daily_variants AS r (sale_date, variant_id, category, units, revenue, cost)
+      SELECT sale_date, variant_id, category, units, revenue, cost
+      FROM sold
+      ORDER BY variant_id
+      ON CONFLICT (sale_date, variant_id, category) DO UPDATE SET
+        units = r.units + EXCLUDED.units,
+        revenue = r.revenue + EXCLUDED.revenue,
+        cost = r.cost + EXCLUDED.cost
+    )
+"""
+
+
+def rebuild_sales_rollups(db: Session, since: date | None = None) -> dict[str, int]:
+    # The lock waits for in-flight checkouts (which hold a row lock on their
+    # rollup rows) and blocks new ones until commit, so the recomputed days
+    # and later increments line up.
+    db.execute(
+        named_query(
+            "sales_rollups.lock",
+            f"LOCK TABLE {', '.join(ROLLUP_TABLES)} IN EXCLUSIVE MODE",
+        )
+    )
+    params: dict[str, Any] = {"tz": settings.sales_report_timezone}
+    shape = "all"
+    since_sql = ""
+    if since is not None:
+        # Compared on the local sale date so a partial rebuild removes and
+        # recreates exactly the same days.
+        since_sql = "AND (s.created_at AT TIME ZONE CAST(:tz AS text))::date >= :since"
+        params["since"] = since
+        shape = "since"
+
+    for table in ROLLUP_TABLES:
+        if since is None:
+            db.execute(named_query(f"sales_rollups.clear.{table}", f"DELETE FROM {table}"))
+        else:
+            db.execute(
+                named_query(f"sales_rollups.clear_since.{table}", f"DELETE FROM {table} WHERE sale_date >= :since"),
+                {"since": since},
+            )
+
+    db.execute(
+        named_query(f"sales_rollups.rebuild.{shape}",
+            f"""
+            WITH source AS (
+              {ROLLUP_SOURCE_SQL.format(since=since_sql)}
+            ),
+            days AS (
+              INSERT INTO sales_daily (sale_date, tickets, units, revenue, cost)
+              SELECT d.sale_date, d.tickets, v.units, v.revenue, v.cost
+              FROM ({SALE_DAYS_SQL.format(since=since_sql)}) d
+              JOIN (
+                SELECT sale_date, SUM(units) AS units, SUM(revenue) AS revenue, SUM(cost) AS cost
+                FROM source
+                GROUP BY sale_date
+              ) v ON v.sale_date = d.sale_date
+            ),
+            categories AS (
+              INSERT INTO sales_daily_categories (sale_date, category, units, revenue, cost)
+              SELECT sale_date, category, SUM(units), SUM(revenue), SUM(cost)
+              FROM source
+              GROUP BY sale_date, category
+            )
+            INSERT INTO sales_daily_variants (sale_date, variant_id, category, units, revenue, cost)
+            SELECT sale_date, variant_id, category, units, revenue, cost
+            FROM source
+            """
+        ),
+        params,
+    )
+    counts = db.execute(
+        named_query("sales_rollups.counts",
+            """
+            SELECT
+              (SELECT COUNT(*) FROM sales_daily)::int AS days,
+              (SELECT COUNT(*) FROM sales_daily_categories)::int AS category_rows,
+              (SELECT COUNT(*) FROM sales_daily_variants)::int AS variant_rows
+            """
+        )
+    ).mappings().one()
+    return dict(counts)
+
+
+def check_sales_rollups(db: Session) -> list[dict[str, Any]]:
+    # Days and variants (summed over their categories) are compared against
+    # the ledger. The ledger only knows each product's current category, so
+    # category rows are checked against the variant rollups instead.
+    rows = db.execute(
+        named_query("sales_rollups.check",
+            f"""
+            WITH source AS (
+              {ROLLUP_SOURCE_SQL.format(since="")}
+            ),
+            source_days AS (
+              {SALE_DAYS_SQL.format(since="")}
+            ),
+            day_problems AS (
+              SELECT
+                COALESCE(d.sale_date, sd.sale_date) AS sale_date,
+                NULL::text AS key,
+                'day' AS level,
+                d.tickets AS stored_tickets,
+                sd.tickets AS ledger_tickets,
+                d.units AS stored_units,
+                v.units AS ledger_units,
+                d.revenue AS stored_revenue,
+                v.revenue AS ledger_revenue,
+                d.cost AS stored_cost,
+                v.cost AS ledger_cost
+              FROM sales_daily d
+              FULL JOIN source_days sd ON sd.sale_date = d.sale_date
+              LEFT JOIN (
+                SELECT sale_date, SUM(units) AS units, SUM(revenue) AS revenue, SUM(cost) AS cost
+                FROM source
+                GROUP BY sale_date
+              ) v ON v.sale_date = COALESCE(d.sale_date, sd.sale_date)
+              WHERE (d.tickets, d.units, d.revenue, d.cost)
+                IS DISTINCT FROM (sd.tickets, COALESCE(v.units, 0), COALESCE(v.revenue, 0), COALESCE(v.cost, 0))
+            ),
+            variant_problems AS (
+              SELECT
+                COALESCE(r.sale_date, src.sale_date) AS sale_date,
+                COALESCE(r.variant_id, src.variant_id)::text AS key,
+                'variant' AS level,
+                NULL::int AS stored_tickets,
+                NULL::int AS ledger_tickets,
+                r.units AS stored_units,
+                src.units AS ledger_units,
+                r.revenue AS stored_revenue,
+                src.revenue AS ledger_revenue,
+                r.cost AS stored_cost,
+                src.cost AS ledger_cost
+              FROM (
+                SELECT sale_date, variant_id, SUM(units) AS units, SUM(revenue) AS revenue, SUM(cost) AS cost
+                FROM sales_daily_variants
+                GROUP BY sale_date, variant_id
+              ) r
+              FULL JOIN source src ON src.sale_date = r.sale_date AND src.variant_id = r.variant_id
+              WHERE (r.units, r.revenue, r.cost) IS DISTINCT FROM (src.units, src.revenue, src.cost)
+            ),
+            category_problems AS (
+              SELECT
+                COALESCE(c.sale_date, v.sale_date) AS sale_date,
+                COALESCE(c.category, v.category)::text AS key,
+                'category' AS level,
+                NULL::int AS stored_tickets,
+                NULL::int AS ledger_tickets,
+                c.units AS stored_units,
+                v.units AS ledger_units,
+                c.revenue AS stored_revenue,
+                v.revenue AS ledger_revenue,
+                c.cost AS stored_cost,
+                v.cost AS ledger_cost
+              FROM sales_daily_categories c
+              FULL JOIN (
+                SELECT sale_date, category, SUM(units) AS units, SUM(revenue) AS revenue, SUM(cost) AS cost
+                FROM sales_daily_variants
+                GROUP BY sale_date, category
+              ) v ON v.sale_date = c.sale_date AND v.category = c.category
+              WHERE (c.units, c.revenue, c.cost) IS DISTINCT FROM (v.units, v.revenue, v.cost)
+            )
+            SELECT * FROM day_problems
+            UNION ALL
+            SELECT * FROM variant_problems
+            UNION ALL
+            SELECT * FROM category_problems
+            ORDER BY sale_date, level, key
+            """
+        ),
+        {"tz": settings.sales_report_timezone},
+    ).mappings().all()
+    return [dict(row) for row in rows]
+
+
+def sales_by_period(db: Session, interval: ReportInterval, date_from: date, date_to: date) -> list[dict[str, Any]]:
+    rows = db.execute(
+        named_query(f"reports.sales.{interval}",
+            f"""
+            SELECT
+              date_trunc('{interval}', sale_date::timestamp)::date AS period_start,
+              SUM(tickets)::int AS tickets,
+              SUM(units)::bigint AS units,
+              SUM(revenue) AS revenue,
+              SUM(cost) AS cost
+            FROM sales_daily
+            WHERE sale_date >= :date_from
+              AND sale_date < :date_to
+            GROUP BY 1
+            ORDER BY 1
+            """
+        ),
+        {"date_from": date_from, "date_to": date_to},
+    ).mappings().all()
+    return [_with_margin(row) for row in rows]
+
+
+def top_sellers(
+    db: Session,
+    date_from: date,
+    date_to: date,
+    order_by: TopSellersOrder,
+    limit: int,
+) -> list[dict[str, Any]]:
+    order = {"units": "units", "revenue": "revenue", "margin": "revenue - cost"}[order_by]
+    rows = db.execute(
+        named_query(f"reports.top_sellers.{order_by}",
+            f"""
+            WITH ranked AS (
+              SELECT
+                variant_id,
+                SUM(units)::bigint AS units,
+                SUM(revenue) AS revenue,
+                SUM(cost) AS cost,
+                SUM({order}) AS rank_value
+              FROM sales_daily_variants
+              WHERE sale_date >= :date_from
+                AND sale_date < :date_to
+              GROUP BY variant_id
+              ORDER BY rank_value DESC, variant_id
+              LIMIT :limit
+            )
+            SELECT
+              r.variant_id::text AS variant_id,
+              p.name AS product_name,
+              COALESCE(pv.variant_name, CONCAT_WS(' / ', pv.color, pv.size)) AS variant_name,
+              p.category,
+              r.units,
+              r.revenue,
+              r.cost
+            FROM ranked r
+            JOIN product_variants pv ON pv.id = r.variant_id
+            JOIN products p ON p.id = pv.product_id
+            ORDER BY r.rank_value DESC, r.variant_id
+            """
+        ),
+        {"date_from": date_from, "date_to": date_to, "limit": limit},
+    ).mappings().all()
+    return [_with_margin(row) for row in rows]
+
+
+def category_margins(db: Session, date_from: date, date_to: date) -> list[dict[str, Any]]:
+    rows = db.execute(
+        named_query("reports.category_margin",
+            """
+            SELECT
+              NULLIF(category, '') AS category,
+              SUM(units)::bigint AS units,
+              SUM(revenue) AS revenue,
+              SUM(cost) AS cost
+            FROM sales_daily_categories
+            WHERE sale_date >= :date_from
+              AND sale_date < :date_to
+            GROUP BY category
+            ORDER BY SUM(revenue) - SUM(cost) DESC, category
+            """
+        ),
+        {"date_from": date_from, "date_to": date_to},
+    ).mappings().all()
+    return [_with_margin(row) for row in rows]
+
+
+def _with_margin(row: Any) -> dict[str, Any]:
+    item = dict(row)
+    item["margin"] = item["revenue"] - item["cost"]
+    item["margin_pct"] = round(item["margin"] / item["revenue"] * 100, 2) if item["revenue"] else None
+    return item
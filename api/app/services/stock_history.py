@@ -0,0 +1,143 @@
+from datetime import date, datetime
+from typing import Any, Literal
+
+from sqlalchemy.orm import Session
+
+from app.db.queries import named_query
+
+HistoryInterval = Literal["day", "week"]
+
+
+def movement_conditions(
+    variant_id: str | None,
+    created_from: datetime | None,
+    created_to: datetime | None,
+    movement_types: list[str] | None,
+) -> tuple[list[str], dict[str, Any], str]:
+    # Only the filters actually given end up in the SQL, so each combination
+    # is its own statement with its own (prepared) plan instead of one plan
+    # full of "IS NULL OR" branches that cannot use the indexes.
+    conditions: list[str] = []
+    params: dict[str, Any] = {}
+    shape: list[str] = []
+    if variant_id is not None:
+        conditions.append("sm.variant_id = CAST(:variant_id AS uuid)")
+        params["variant_id"] = variant_id
+        shape.append("variant")
+    if created_from is not None:
+        conditions.append("sm.created_at >= :created_from")
+        params["created_from"] = created_from
+        shape.append("from")
+    if created_to is not None:
+        conditions.append("sm.created_at < :created_to")
+        params["created_to"] = created_to
+        shape.append("to")
+    if movement_types:
+        conditions.append("sm.movement_type::text = ANY(CAST(:movement_types AS text[]))")
+        params["movement_types"] = movement_types
+        shape.append("type")
+    return conditions, params, "_".join(shape) or "all"
+
+
+def list_stock_movements(
+    db: Session,
+    *,
+    limit: int,
+    cursor: list[Any] | None = None,
+    variant_id: str | None = None,
+    created_from: datetime | None = None,
+    created_to: datetime | None = None,
+    movement_types: list[str] | None = None,
+) -> list[dict[str, Any]]:
+    conditions, params, shape = movement_conditions(variant_id, created_from, created_to, movement_types)
+    params["limit"] = limit
+    if cursor is not None:
+        conditions.append(
+            "(sm.created_at, sm.id) < (CAST(:after_created_at AS timestamptz), CAST(:after_id AS uuid))"
+        )
+        params["after_created_at"], params["after_id"] = cursor
+        shape += "_after"
+
+    # Newest first, walking (variant_id, created_at, id) or (created_at, id)
+    # backwards; a page never reads more than `limit` index entries.
+    where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+    rows = db.execute(
+        named_query(f"history.movements.{shape}",
+            f"""
+            SELECT
+              sm.id::text AS id,
+              sm.created_at,
+              sm.movement_type::text AS movement_type,
+              sm.qty_delta,
+              sm.variant_id::text AS variant_id,
+              p.name AS product_name,
+              COALESCE(pv.variant_name, CONCAT_WS(' / ', pv.color, pv.size)) AS variant_name,
+              sm.batch_id::text AS batch_id,
+              sm.reason,
+              sm.reference_sale_id::text AS reference_sale_id,
+              u.username AS performed_by
+            FROM stock_movements sm
+            JOIN product_variants pv ON pv.id = sm.variant_id
+            JOIN products p ON p.id = pv.product_id
+            JOIN users u ON u.id = sm.performed_by_user_id
+            {where}
+            ORDER BY sm.created_at DESC, sm.id DESC
+            LIMIT :limit
+            """
+        ),
+        params,
+    ).mappings().all()
+    return [dict(row) for row in rows]
+
+
+def bucket_stock_movements(
+    db: Session,
+    *,
+    interval: HistoryInterval,
+    tz: str,
+    variant_id: str | None = None,
+    created_from: datetime | None = None,
+    created_to: datetime | None = None,
+    movement_types: list[str] | None = None,
+) -> list[dict[str, Any]]:
+    conditions, params, shape = movement_conditions(variant_id, created_from, created_to, movement_types)
+    params["tz"] = tz
+
+    # Only created_at, movement_type and qty_delta are read; for one variant
+    # idx_stock_movements_variant_history includes all three, so this is an
+    # index-only scan over the requested range.
+    where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+    rows = db.execute(
+        named_query(f"history.buckets.{interval}.{shape}",
+            f"""
+            SELECT
+              date_trunc('{interval}', sm.created_at AT TIME ZONE CAST(:tz AS text))::date AS bucket_start,
+              sm.movement_type::text AS movement_type,
+              COUNT(*) AS movements,
+              SUM(sm.qty_delta)::bigint AS qty
+            FROM stock_movements sm
+            {where}
+            GROUP BY 1, sm.movement_type
+            ORDER BY 1, 2
+            """
+        ),
+        params,
+    ).mappings().all()
+
+    buckets: dict[date, dict[str, Any]] = {}
+    for row in rows:
+        bucket = buckets.setdefault(
+            row["bucket_start"],
+            {"bucket_start": row["bucket_start"], "movements": 0, "net_qty": 0, "by_type": {}},
+        )
+        bucket["movements"] += row["movements"]
+        bucket["net_qty"] += row["qty"]
+        bucket["by_type"][row["movement_type"]] = row["qty"]
+    return list(buckets.values())
+
+
+def variant_exists(db: Session, variant_id: str) -> bool:
+    return db.execute(
+        named_query("history.variant_exists", "SELECT 1 FROM product_variants WHERE id = CAST(:variant_id AS uuid)"),
+        {"variant_id": variant_id},
+    ).first() is not None
@@ -0,0 +1,101 @@
+import logging
+
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.db.queries import named_query
+from app.db.session import SessionLocal
+from app.services.lookup_cache import batch_cache
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BATCH_CODE = "DEFAULT"
+
+_default_warehouse_id: str | None = None
+
+
+def _select_default_warehouse(db: Session) -> str | None:
+    return db.execute(
+        named_query("warehouse.default", "SELECT id::text AS id FROM warehouses ORDER BY created_at ASC LIMIT 1")
+    ).scalar()
+
+
+def load_default_warehouse() -> None:
+    global _default_warehouse_id
+    try:
+        with SessionLocal() as db:
+            _default_warehouse_id = _select_default_warehouse(db)
+    except SQLAlchemyError:
+        logger.warning("Could not preload the default warehouse; it will be resolved on first use")
+
+
+def ensure_default_warehouse(db: Session) -> str:
+    global _default_warehouse_id
+    if _default_warehouse_id:
+        return _default_warehouse_id
+
+    warehouse_id = _select_default_warehouse(db)
+    if warehouse_id:
+        _default_warehouse_id = warehouse_id
+        return warehouse_id
+
+    # First write on an empty database. The advisory lock keeps concurrent
+    # first writers from each creating a warehouse; the id is not memoized
+    # until a later call reads it back, in case this transaction rolls back.
+    db.execute(named_query("warehouse.lock_default", "SELECT pg_advisory_xact_lock(hashtext('default_warehouse'))"))
+    return db.execute(
+        named_query("warehouse.create_default",
+            """
+            WITH existing AS (
+              SELECT id FROM warehouses ORDER BY created_at ASC LIMIT 1
+            ),
+            created AS (
+              INSERT INTO warehouses (name)
+              SELECT :name
+              WHERE NOT EXISTS (SELECT 1 FROM existing)
+              RETURNING id
+            )
+            SELECT id::text FROM existing
+            UNION ALL
+            SELECT id::text FROM created
+            """
+        ),
+        {"name": settings.default_warehouse_name},
+    ).scalar_one()
+
+
+def ensure_default_batch(db: Session, warehouse_id: str, variant_id: str) -> str:
+    key = (warehouse_id, variant_id)
+    generation = batch_cache.generation()
+    batch_id = batch_cache.get(key)
+    if batch_id:
+        return batch_id
+
+    # DO UPDATE (not DO NOTHING) so RETURNING also yields a row another
+    # transaction committed while this one waited on the conflict. It touches
+    # a non-key column only: that takes a FOR NO KEY UPDATE lock, which does
+    # not block the FK checks (KEY SHARE) of concurrent stock movements on the
+    # same batch. Writing batch_code would, and could deadlock with them.
+    row = db.execute(
+        named_query("batch.ensure_default",
+            """
+            INSERT INTO inventory_batches (warehouse_id, variant_id, batch_code, expires_at)
+            VALUES (CAST(:warehouse_id AS uuid), CAST(:variant_id AS uuid), :batch_code, NULL)
+            ON CONFLICT (warehouse_id, variant_id, batch_code) WHERE expires_at IS NULL
+            DO UPDATE SET created_at = inventory_batches.created_at
+            RETURNING id::text AS id, xmax = 0 AS created
+            """
+        ),
+        {"warehouse_id": warehouse_id, "variant_id": variant_id, "batch_code": DEFAULT_BATCH_CODE},
+    ).mappings().one()
+
+    if not row["created"]:
+        batch_cache.set(key, row["id"], generation)
+    return row["id"]
+
+
+def clear_warehouse_cache() -> None:
+    global _default_warehouse_id
+    _default_warehouse_id = None
+    batch_cache.clear()
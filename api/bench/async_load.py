@@ -0,0 +1,120 @@
+"""Single-worker load test for the async hot endpoints.
+
+Starts `uvicorn app.main:app` with one worker against a scratch database
+(schema from db/schema.sql already applied), seeds barcoded variants with
+plenty of stock, then drives each hot endpoint at increasing concurrency and
+reports throughput and latency.
+
+    cd api
+    python -m bench.async_load --concurrency 1 16 64 256 --seconds 10
+"""
+
+import argparse
+import asyncio
+import os
+import subprocess
+import sys
+import time
+import uuid
+
+import httpx
+
+from app.core.security import create_access_token
+from bench.checkout_roundtrips import seed
+
+VARIANTS = 50
+
+
+def endpoints(prefix: str) -> dict[str, tuple[str, str, dict | None]]:
+    return {
+        "by-code": ("GET", f"/inventory/by-code/{prefix}-1", None),
+        "dashboard": ("GET", "/dashboard/summary", None),
+        "scan-increase": ("POST", "/inventory/scan-increase", {"code": f"{prefix}-2", "qty": 1}),
+        "checkout": ("POST", "/sales/checkout", {"items": [{"code": f"{prefix}-3", "qty": 1}]}),
+    }
+
+
+async def drive(
+    client: httpx.AsyncClient,
+    request: tuple[str, str, dict | None],
+    concurrency: int,
+    seconds: float,
+) -> tuple[list[float], int]:
+    method, path, body = request
+    timings: list[float] = []
+    errors = 0
+    deadline = time.perf_counter() + seconds
+
+    async def worker() -> None:
+        nonlocal errors
+        while time.perf_counter() < deadline:
+            started = time.perf_counter()
+            response = await client.request(method, path, json=body)
+            timings.append((time.perf_counter() - started) * 1000)
+            errors += response.status_code >= 400
+
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return timings, errors
+
+
+async def run(args: argparse.Namespace, base_url: str, token: str, prefix: str) -> None:
+    limits = httpx.Limits(max_connections=max(args.concurrency), max_keepalive_connections=max(args.concurrency))
+    headers = {"Authorization": f"Bearer {token}"}
+    async with httpx.AsyncClient(base_url=base_url, headers=headers, limits=limits, timeout=60) as client:
+        print(f"{'endpoint':<14} {'conc':>5} {'requests':>9} {'req/s':>8} {'p50 ms':>8} {'p99 ms':>8} {'errors':>7}")
+        for name, request in endpoints(prefix).items():
+            if args.endpoints and name not in args.endpoints:
+                continue
+            for concurrency in args.concurrency:
+                timings, errors = await drive(client, request, concurrency, args.seconds)
+                timings.sort()
+                p50 = timings[len(timings) // 2]
+                p99 = timings[max(int(len(timings) * 0.99) - 1, 0)]
+                print(
+                    f"{name:<14} {concurrency:>5} {len(timings):>9} {len(timings) / args.seconds:>8.0f} "
+                    f"{p50:>8.1f} {p99:>8.1f} {errors:>7}"
+                )
+
+
+def wait_until_ready(base_url: str, server: subprocess.Popen) -> None:
+    for _ in range(100):
+        if server.poll() is not None:
+            raise SystemExit("uvicorn exited during startup")
+        try:
+            httpx.get(f"{base_url}/health").raise_for_status()
+            return
+        except httpx.HTTPError:
+            time.sleep(0.1)
+    raise SystemExit("uvicorn did not become ready")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 16, 64, 256])
+    parser.add_argument("--seconds", type=float, default=10)
+    parser.add_argument("--port", type=int, default=8766)
+    parser.add_argument("--endpoints", nargs="*", help="subset of: by-code dashboard scan-increase checkout")
+    parser.add_argument("--disable-caches", action="store_true", help="turn off the lookup and auth caches")
+    args = parser.parse_args()
+
+    prefix = uuid.uuid4().hex[:8]
+    token = create_access_token(seed(prefix, VARIANTS))
+
+    env = dict(os.environ)
+    if args.disable_caches:
+        env.update(LOOKUP_CACHE_ENABLED="false", AUTH_CACHE_ENABLED="false")
+    base_url = f"http://127.0.0.1:{args.port}"
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app.main:app", "--port", str(args.port), "--log-level", "warning"],
+        env=env,
+    )
+    try:
+        wait_until_ready(base_url, server)
+        asyncio.run(run(args, base_url, token, prefix))
+    finally:
+        server.terminate()
+        server.wait()
+
+
+if __name__ == "__main__":
+    main()
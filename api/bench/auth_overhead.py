@@ -0,0 +1,89 @@
+"""Per-request authentication overhead benchmark.
+
+Creates a throwaway user, then calls an authenticated no-op endpoint with the
+auth cache disabled and enabled, reporting SQL statements and wall time per
+request. Run against a scratch database (schema from db/schema.sql applied).
+
+    cd api
+    python -m bench.auth_overhead --requests 2000
+"""
+
+import argparse
+import statistics
+import time
+import uuid
+
+from fastapi import Depends
+from fastapi.testclient import TestClient
+from sqlalchemy import event, text
+
+from app.core.security import create_access_token
+from app.db.session import SessionLocal, engine
+from app.main import app
+from app.services.auth_cache import token_cache, user_cache
+from app.services.deps import get_current_user
+
+statement_count = 0
+
+
+@event.listens_for(engine, "before_cursor_execute")
+def _count_statement(conn, cursor, statement, parameters, context, executemany):
+    global statement_count
+    statement_count += 1
+
+
+@app.get("/bench/auth-noop")
+def _auth_noop(_: dict = Depends(get_current_user)):
+    return {}
+
+
+def seed() -> str:
+    with SessionLocal() as db:
+        user_id = db.execute(
+            text(
+                """
+                INSERT INTO users (username, password_hash, full_name)
+                VALUES (:username, 'x', 'Benchmark')
+                RETURNING id::text
+                """
+            ),
+            {"username": f"bench-auth-{uuid.uuid4().hex[:8]}"},
+        ).scalar_one()
+        db.commit()
+    return user_id
+
+
+def run(client: TestClient, headers: dict[str, str], requests: int) -> tuple[float, float, float]:
+    global statement_count
+
+    timings: list[float] = []
+    statement_count = 0
+    for _ in range(requests):
+        started = time.perf_counter()
+        response = client.get("/bench/auth-noop", headers=headers)
+        timings.append((time.perf_counter() - started) * 1_000_000)
+        response.raise_for_status()
+    timings.sort()
+    return statement_count / requests, statistics.median(timings), timings[int(len(timings) * 0.99) - 1]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=2000)
+    args = parser.parse_args()
+
+    headers = {"Authorization": f"Bearer {create_access_token(seed())}"}
+
+    print(f"{'auth cache':>10} {'stmts/req':>10} {'p50 us':>9} {'p99 us':>9}")
+    with TestClient(app) as client:
+        for enabled in (False, True):
+            token_cache.enabled = user_cache.enabled = enabled
+            token_cache.clear()
+            user_cache.clear()
+            client.get("/bench/auth-noop", headers=headers).raise_for_status()
+            statements, p50, p99 = run(client, headers, args.requests)
+            print(f"{'on' if enabled else 'off':>10} {statements:>10.2f} {p50:>9.0f} {p99:>9.0f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,125 @@
+"""Catalog search latency benchmark.
+
+Seeds a scratch database (schema from db/schema.sql already applied) with
+--variants variants whose names repeat a few common words, then times
+/catalog/search for each kind of query: exact code, code prefix, word
+prefix, a typo only the trigram arm matches and a three-letter fragment that
+most of the catalog contains. --explain prints the plan of the slowest kind.
+
+    cd api
+    python -m bench.catalog_search --variants 100000 --repeat 20 --explain
+"""
+
+import argparse
+import statistics
+import time
+import uuid
+
+from fastapi.testclient import TestClient
+from sqlalchemy import text
+
+from app.db.session import SessionLocal
+from app.main import app
+from app.services.catalog import rebuild_catalog_items
+from app.services.deps import get_current_user
+
+ITEMS = ["blusa", "vestido", "pantalon", "camisa", "falda", "chaqueta", "short", "sueter"]
+BRANDS = ["Amapola", "Bonita", "Coral", "Dalia", "Estrella"]
+COLORS = ["rojo", "negro", "blanco", "azul", "verde", "rosado"]
+
+
+def seed(prefix: str, variants: int) -> None:
+    with SessionLocal() as db:
+        db.execute(
+            text(
+                """
+                WITH products_created AS (
+                  INSERT INTO products (name, brand, category)
+                  SELECT
+                    (CAST(:items AS text[]))[1 + g % 8] || ' ' || (CAST(:colors AS text[]))[1 + g % 6] || ' ' || g,
+                    (CAST(:brands AS text[]))[1 + g % 5],
+                    :prefix
+                  FROM generate_series(1, :variants) AS g
+                  RETURNING id, split_part(name, ' ', 3) AS n
+                ),
+                variants_created AS (
+                  INSERT INTO product_variants (product_id, purchase_price, sale_price)
+                  SELECT id, 2, 5 FROM products_created
+                  RETURNING id, product_id
+                ),
+                codes AS (
+                  INSERT INTO barcodes (code)
+                  SELECT :prefix || '-' || n FROM products_created
+                  RETURNING code
+                )
+                INSERT INTO barcode_variants (barcode_code, variant_id, is_primary)
+                SELECT :prefix || '-' || p.n, v.id, TRUE
+                FROM variants_created v
+                JOIN products_created p ON p.id = v.product_id
+                """
+            ),
+            {"prefix": prefix, "variants": variants, "items": ITEMS, "brands": BRANDS, "colors": COLORS},
+        )
+        rebuild_catalog_items(db)
+        db.commit()
+        db.execute(text("ANALYZE catalog_items"))
+        db.execute(text("ANALYZE barcode_variants"))
+        db.commit()
+
+
+def explain(query: str) -> None:
+    # The fuzzy arm on its own, as search_catalog_items sends it.
+    with SessionLocal() as db:
+        plan = db.execute(
+            text(
+                """
+                EXPLAIN (ANALYZE, BUFFERS)
+                SELECT variant_id
+                FROM catalog_items
+                WHERE :query <% search_text
+                ORDER BY search_text <->> :query
+                LIMIT 500
+                """
+            ),
+            {"query": query},
+        ).scalars()
+        print("\n".join(plan))
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--variants", type=int, default=100_000)
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--explain", action="store_true")
+    args = parser.parse_args()
+
+    prefix = uuid.uuid4().hex[:8]
+    seed(prefix, args.variants)
+    app.dependency_overrides[get_current_user] = lambda: {"id": None}
+
+    queries = {
+        "code": f"{prefix}-{args.variants // 2}",
+        "code-prefix": f"{prefix}-12",
+        "words": "vestido azul",
+        "typo": "chaqeta negor",
+        "fragment": "bla",
+    }
+    print(f"{'query':>12} {'results':>8} {'p50 ms':>9} {'p95 ms':>9}")
+    with TestClient(app) as client:
+        for name, query in queries.items():
+            timings: list[float] = []
+            for _ in range(args.repeat):
+                started = time.perf_counter()
+                response = client.get("/catalog/search", params={"q": query, "limit": 20})
+                timings.append((time.perf_counter() - started) * 1000)
+                response.raise_for_status()
+            p95 = statistics.quantiles(timings, n=20)[-1] if len(timings) > 1 else timings[0]
+            print(f"{name:>12} {len(response.json()):>8} {statistics.median(timings):>9.1f} {p95:>9.1f}")
+
+    app.dependency_overrides.clear()
+    if args.explain:
+        explain(queries["fragment"])
+
+
+if __name__ == "__main__":
+    main()
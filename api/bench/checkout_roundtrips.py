@@ -0,0 +1,134 @@
+"""Checkout round-trip benchmark.
+
+Seeds a scratch database (schema from db/schema.sql already applied) with
+barcoded variants, then posts carts of increasing size to /sales/checkout and
+reports how many SQL statements and how much wall time each checkout needs.
+
+    cd api
+    python -m bench.checkout_roundtrips --sizes 1 5 10 20 50 --repeat 5
+"""
+
+import argparse
+import statistics
+import time
+import uuid
+
+from fastapi.testclient import TestClient
+from sqlalchemy import event, text
+
+from app.db.session import SessionLocal, async_engine, engine
+from app.main import app
+from app.services.catalog import rebuild_catalog_items
+from app.services.dashboard import rebuild_dashboard_totals
+from app.services.deps import get_current_user, get_current_user_async
+
+statement_count = 0
+
+
+@event.listens_for(engine, "before_cursor_execute")
+@event.listens_for(async_engine.sync_engine, "before_cursor_execute")
+def _count_statement(conn, cursor, statement, parameters, context, executemany):
+    global statement_count
+    statement_count += 1
+
+
+def seed(prefix: str, variants: int) -> str:
+    with SessionLocal() as db:
+        user_id = db.execute(
+            text(
+                """
+                INSERT INTO users (username, password_hash, full_name)
+                VALUES (:username, 'x', 'Benchmark')
+                RETURNING id::text
+                """
+            ),
+            {"username": f"bench-{prefix}"},
+        ).scalar_one()
+        db.execute(
+            text(
+                """
+                WITH products_created AS (
+                  INSERT INTO products (name, category)
+                  SELECT :prefix || '-' || g, 'bench'
+                  FROM generate_series(1, :variants) AS g
+                  RETURNING id, name
+                ),
+                variants_created AS (
+                  INSERT INTO product_variants (product_id, purchase_price, sale_price)
+                  SELECT id, 2, 5 FROM products_created
+                  RETURNING id, product_id
+                ),
+                codes AS (
+                  INSERT INTO barcodes (code)
+                  SELECT p.name FROM products_created p
+                  RETURNING code
+                )
+                INSERT INTO barcode_variants (barcode_code, variant_id, is_primary)
+                SELECT p.name, v.id, TRUE
+                FROM variants_created v
+                JOIN products_created p ON p.id = v.product_id
+                """
+            ),
+            {"prefix": prefix, "variants": variants},
+        )
+        warehouse_id = db.execute(
+            text("SELECT id::text FROM warehouses ORDER BY created_at ASC LIMIT 1")
+        ).scalar() or db.execute(
+            text("INSERT INTO warehouses (name) VALUES ('Main Warehouse') RETURNING id::text")
+        ).scalar_one()
+        db.execute(
+            text(
+                """
+                WITH batches AS (
+                  INSERT INTO inventory_batches (warehouse_id, variant_id, batch_code)
+                  SELECT CAST(:warehouse_id AS uuid), pv.id, 'DEFAULT'
+                  FROM product_variants pv
+                  JOIN products p ON p.id = pv.product_id
+                  WHERE p.name LIKE :prefix || '-%'
+                  RETURNING id
+                )
+                INSERT INTO stock_balances (warehouse_id, batch_id, qty_on_hand)
+                SELECT CAST(:warehouse_id AS uuid), id, 1000000 FROM batches
+                """
+            ),
+            {"warehouse_id": warehouse_id, "prefix": prefix},
+        )
+        rebuild_catalog_items(db)
+        rebuild_dashboard_totals(db)
+        db.commit()
+    return user_id
+
+
+def main() -> None:
+    global statement_count
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1, 5, 10, 20, 50])
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    prefix = uuid.uuid4().hex[:8]
+    user_id = seed(prefix, max(args.sizes))
+    app.dependency_overrides[get_current_user] = lambda: {"id": user_id}
+    app.dependency_overrides[get_current_user_async] = lambda: {"id": user_id}
+
+    print(f"{'lines':>6} {'statements':>11} {'p50 ms':>9} {'max ms':>9}")
+    with TestClient(app) as client:
+        for size in args.sizes:
+            cart = {"items": [{"code": f"{prefix}-{i}", "qty": 1} for i in range(1, size + 1)]}
+            timings: list[float] = []
+            statements: list[int] = []
+            for _ in range(args.repeat):
+                statement_count = 0
+                started = time.perf_counter()
+                response = client.post("/sales/checkout", json=cart)
+                timings.append((time.perf_counter() - started) * 1000)
+                statements.append(statement_count)
+                response.raise_for_status()
+            print(f"{size:>6} {max(statements):>11} {statistics.median(timings):>9.1f} {max(timings):>9.1f}")
+
+    app.dependency_overrides.clear()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,512 @@
+"""Load test that replays the mobile app's traffic mix.
+
+Creates a scratch database from db/schema.sql (or seeds the DATABASE_URL
+database with --existing), loads a catalog of --variants barcoded variants and
+--sales historic sales, starts `uvicorn app.main:app` against it and runs
+--users concurrent clients for --seconds. Each client loops over the calls in
+mobile/src/api/client.js, picked by weight: getByCode scan bursts,
+scanIncrease, checkout with 1-30 line carts, getInventoryItems pages and
+dashboard polling.
+
+Prints throughput and p50/p95/p99 per endpoint and, with --output, writes
+them as JSON; --compare prints the change against an earlier results file.
+
+    cd api
+    python -m bench.mobile_mix --variants 50000 --sales 20000 --users 32 --seconds 60 --output run.json
+    python -m bench.mobile_mix --variants 50000 --sales 20000 --users 32 --seconds 60 --compare run.json
+"""
+
+import argparse
+import asyncio
+import json
+import math
+import os
+import random
+import subprocess
+import sys
+import time
+import uuid
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any
+
+import httpx
+import psycopg
+from sqlalchemy import create_engine, text
+from sqlalchemy.engine import make_url
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.core.security import create_access_token
+from app.services.catalog import rebuild_catalog_items
+from app.services.dashboard import rebuild_dashboard_totals
+from app.services.sales_reports import rebuild_sales_rollups
+from bench.async_load import wait_until_ready
+
+SCHEMA_PATH = Path(__file__).resolve().parents[1] / "db" / "schema.sql"
+
+DEFAULT_MIX = {"by-code": 40, "scan-increase": 15, "checkout": 20, "inventory-items": 10, "dashboard": 15}
+# Lines per cart and how often the app sends each size.
+CART_SIZES = ((1, 35), (2, 20), (3, 15), (5, 15), (10, 10), (30, 5))
+BY_CODE_BURST = (3, 10)
+INVENTORY_SORTS = ("name", "qty", "price", "updated")
+INVENTORY_PAGE_SIZE = 500
+
+
+def create_database(database_url: str) -> None:
+    url = make_url(database_url)
+    admin_url = url.set(drivername="postgresql", database="postgres").render_as_string(hide_password=False)
+    with psycopg.connect(admin_url, autocommit=True) as conn:
+        conn.execute(f'DROP DATABASE IF EXISTS "{url.database}"')
+        conn.execute(f'CREATE DATABASE "{url.database}"')
+
+    schema = SCHEMA_PATH.read_text(encoding="utf-8-sig")
+    target_url = url.set(drivername="postgresql").render_as_string(hide_password=False)
+    with psycopg.connect(target_url, autocommit=True) as conn:
+        conn.execute(schema)
+
+
+def seed(database_url: str, prefix: str, variants: int, sales: int, history_days: int, seed_value: int) -> str:
+    engine = create_engine(database_url)
+    try:
+        with Session(engine) as db:
+            db.execute(text("SELECT setseed(:seed)"), {"seed": (seed_value % 1000) / 1000})
+            user_id = db.execute(
+                text(
+                    """
+                    INSERT INTO users (username, password_hash, full_name)
+                    VALUES (:username, 'x', 'Benchmark')
+                    RETURNING id::text
+                    """
+                ),
+                {"username": f"bench-{prefix}"},
+            ).scalar_one()
+            warehouse_id = db.execute(
+                text("SELECT id::text FROM warehouses ORDER BY created_at ASC LIMIT 1")
+            ).scalar() or db.execute(
+                text("INSERT INTO warehouses (name) VALUES (:name) RETURNING id::text"),
+                {"name": settings.default_warehouse_name},
+            ).scalar_one()
+
+            # Three variants (sizes) per product, spread over a few categories,
+            # brands and shelves so the list filters and sorts have work to do.
+            db.execute(
+                text(
+                    """
+                    CREATE TEMP TABLE seed_variants ON COMMIT DROP AS
+                    SELECT
+                      g,
+                      (g - 1) / 3 AS product_no,
+                      uuid_generate_v4() AS variant_id,
+                      uuid_generate_v4() AS batch_id,
+                      round((2 + random() * 60)::numeric, 2) AS purchase_price
+                    FROM generate_series(1, :variants) AS g
+                    """
+                ),
+                {"variants": variants},
+            )
+            db.execute(
+                text(
+                    """
+                    CREATE TEMP TABLE seed_products ON COMMIT DROP AS
+                    SELECT product_no, uuid_generate_v4() AS product_id
+                    FROM seed_variants
+                    GROUP BY product_no
+                    """
+                )
+            )
+            db.execute(
+                text(
+                    """
+                    WITH products_created AS (
+                      INSERT INTO products (id, name, brand, category)
+                      SELECT
+                        product_id,
+                        :prefix || ' product ' || product_no,
+                        'Brand ' || (product_no % 40),
+                        'Category ' || (product_no % 12)
+                      FROM seed_products
+                    ),
+                    variants_created AS (
+                      INSERT INTO product_variants (
+                        id, product_id, variant_name, size, location, purchase_price, sale_price
+                      )
+                      SELECT
+                        v.variant_id,
+                        p.product_id,
+                        (ARRAY['S', 'M', 'L'])[(v.g - 1) % 3 + 1],
+                        (ARRAY['S', 'M', 'L'])[(v.g - 1) % 3 + 1],
+                        'Shelf ' || (v.product_no % 60),
+                        v.purchase_price,
+                        round(v.purchase_price * 2.2, 2)
+                      FROM seed_variants v
+                      JOIN seed_products p ON p.product_no = v.product_no
+                    ),
+                    codes AS (
+                      INSERT INTO barcodes (code)
+                      SELECT :prefix || '-' || g FROM seed_variants
+                    ),
+                    links AS (
+                      INSERT INTO barcode_variants (barcode_code, variant_id, is_primary)
+                      SELECT :prefix || '-' || g, variant_id, TRUE FROM seed_variants
+                    ),
+                    batches AS (
+                      INSERT INTO inventory_batches (id, warehouse_id, variant_id, batch_code)
+                      SELECT batch_id, CAST(:warehouse_id AS uuid), variant_id, 'DEFAULT'
+                      FROM seed_variants
+                    )
+                    INSERT INTO stock_balances (warehouse_id, batch_id, qty_on_hand)
+                    SELECT CAST(:warehouse_id AS uuid), batch_id, 1000000
+                    FROM seed_variants
+                    """
+                ),
+                {"prefix": prefix, "warehouse_id": warehouse_id},
+            )
+
+            # Sales skew towards the first codes (random()^3), the same shape
+            # the load phase uses for scans.
+            db.execute(
+                text(
+                    """
+                    CREATE TEMP TABLE seed_sale_items ON COMMIT DROP AS
+                    SELECT
+                      s.sale_id,
+                      s.created_at,
+                      v.variant_id,
+                      v.batch_id,
+                      v.g,
+                      pick.qty,
+                      v.purchase_price AS unit_cost,
+                      round(v.purchase_price * 2.2, 2) AS unit_price
+                    FROM (
+                      SELECT
+                        uuid_generate_v4() AS sale_id,
+                        now() - random() * make_interval(days => :history_days) AS created_at,
+                        1 + floor(random() * random() * 8)::int AS lines
+                      FROM generate_series(1, :sales)
+                    ) s
+                    CROSS JOIN LATERAL (
+                      SELECT
+                        1 + floor(:variants * random() ^ 3)::int AS g,
+                        1 + floor(random() * 2)::int AS qty
+                      FROM generate_series(1, s.lines)
+                    ) pick
+                    JOIN seed_variants v ON v.g = pick.g
+                    """
+                ),
+                {"sales": sales, "history_days": history_days, "variants": variants},
+            )
+            db.execute(
+                text(
+                    """
+                    WITH sales_created AS (
+                      INSERT INTO sales (id, warehouse_id, subtotal, total, created_by_user_id, created_at)
+                      SELECT
+                        sale_id,
+                        CAST(:warehouse_id AS uuid),
+                        SUM(qty * unit_price),
+                        SUM(qty * unit_price),
+                        CAST(:user_id AS uuid),
+                        MIN(created_at)
+                      FROM seed_sale_items
+                      GROUP BY sale_id
+                    ),
+                    items_created AS (
+                      INSERT INTO sale_items (
+                        sale_id,
+                        variant_id,
+                        barcode_code,
+                        qty,
+                        unit_price,
+                        line_total,
+                        unit_cost,
+                        created_at
+                      )
+                      SELECT sale_id, variant_id, :prefix || '-' || g, qty, unit_price, qty * unit_price, unit_cost, created_at
+                      FROM seed_sale_items
+                    )
+                    INSERT INTO stock_movements (
+                      warehouse_id,
+                      batch_id,
+                      variant_id,
+                      movement_type,
+                      qty_delta,
+                      reason,
+                      reference_sale_id,
+                      performed_by_user_id,
+                      created_at
+                    )
+                    SELECT
+                      CAST(:warehouse_id AS uuid),
+                      batch_id,
+                      variant_id,
+                      'DECREASE_SALE',
+                      -qty,
+                      'Sale checkout',
+                      sale_id,
+                      CAST(:user_id AS uuid),
+                      created_at
+                    FROM seed_sale_items
+                    """
+                ),
+                {"warehouse_id": warehouse_id, "user_id": user_id, "prefix": prefix},
+            )
+            rebuild_catalog_items(db)
+            rebuild_dashboard_totals(db)
+            rebuild_sales_rollups(db)
+            db.commit()
+
+        with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+            conn.execute(text("ANALYZE"))
+    finally:
+        engine.dispose()
+    return user_id
+
+
+def percentile(timings: list[float], fraction: float) -> float:
+    # Nearest-rank on an already sorted list.
+    return timings[max(math.ceil(len(timings) * fraction) - 1, 0)]
+
+
+def summarize(timings: list[float], errors: int, seconds: float) -> dict[str, Any]:
+    timings = sorted(timings)
+    if not timings:
+        return {"requests": 0, "errors": errors, "rps": 0.0}
+    return {
+        "requests": len(timings),
+        "errors": errors,
+        "rps": round(len(timings) / seconds, 1),
+        "mean_ms": round(sum(timings) / len(timings), 2),
+        "p50_ms": round(percentile(timings, 0.50), 2),
+        "p95_ms": round(percentile(timings, 0.95), 2),
+        "p99_ms": round(percentile(timings, 0.99), 2),
+        "max_ms": round(timings[-1], 2),
+    }
+
+
+class Recorder:
+    def __init__(self, measure_from: float):
+        self.measure_from = measure_from
+        self.timings: dict[str, list[float]] = {}
+        self.errors: dict[str, int] = {}
+
+    async def call(self, client: httpx.AsyncClient, endpoint: str, method: str, path: str, **kwargs) -> httpx.Response:
+        started = time.perf_counter()
+        response = await client.request(method, path, **kwargs)
+        if started >= self.measure_from:
+            self.timings.setdefault(endpoint, []).append((time.perf_counter() - started) * 1000)
+            self.errors[endpoint] = self.errors.get(endpoint, 0) + (response.status_code >= 400)
+        return response
+
+
+class MobileClient:
+    def __init__(self, client: httpx.AsyncClient, recorder: Recorder, prefix: str, variants: int, rng: random.Random):
+        self.client = client
+        self.recorder = recorder
+        self.prefix = prefix
+        self.variants = variants
+        self.rng = rng
+
+    def code(self) -> str:
+        return f"{self.prefix}-{1 + int(self.variants * self.rng.random() ** 3)}"
+
+    async def by_code(self) -> None:
+        for _ in range(self.rng.randint(*BY_CODE_BURST)):
+            await self.recorder.call(self.client, "GET /inventory/by-code/{code}", "GET", f"/inventory/by-code/{self.code()}")
+
+    async def scan_increase(self) -> None:
+        body = {"code": self.code(), "qty": self.rng.randint(1, 5)}
+        await self.recorder.call(self.client, "POST /inventory/scan-increase", "POST", "/inventory/scan-increase", json=body)
+
+    async def checkout(self) -> None:
+        sizes, weights = zip(*CART_SIZES)
+        lines = min(self.rng.choices(sizes, weights)[0], self.variants)
+        codes: set[str] = set()
+        while len(codes) < lines:
+            codes.add(self.code())
+        body = {"items": [{"code": code, "qty": self.rng.randint(1, 2)} for code in codes]}
+        await self.recorder.call(self.client, "POST /sales/checkout", "POST", "/sales/checkout", json=body)
+
+    async def inventory_items(self) -> None:
+        # getInventoryItems walks every page; a bounded number of pages keeps
+        # one call from dominating the run on big catalogs.
+        params: dict[str, Any] = {"limit": INVENTORY_PAGE_SIZE, "sort": self.rng.choice(INVENTORY_SORTS)}
+        for _ in range(self.rng.randint(1, 3)):
+            response = await self.recorder.call(self.client, "GET /inventory/items", "GET", "/inventory/items", params=params)
+            params["cursor"] = response.headers.get("X-Next-Cursor")
+            if not params["cursor"]:
+                break
+
+    async def dashboard(self) -> None:
+        await self.recorder.call(self.client, "GET /dashboard/summary", "GET", "/dashboard/summary")
+
+
+async def run_load(args: argparse.Namespace, base_url: str, token: str, prefix: str) -> tuple[dict[str, Any], float]:
+    mix = parse_mix(args.mix)
+    limits = httpx.Limits(max_connections=args.users, max_keepalive_connections=args.users)
+    headers = {"Authorization": f"Bearer {token}"}
+    started = time.perf_counter()
+    measure_from = started + args.warmup
+    deadline = measure_from + args.seconds
+    recorder = Recorder(measure_from)
+
+    async with httpx.AsyncClient(base_url=base_url, headers=headers, limits=limits, timeout=60) as client:
+
+        async def user(number: int) -> None:
+            mobile = MobileClient(client, recorder, prefix, args.variants, random.Random(args.seed * 1000 + number))
+            actions = {
+                "by-code": mobile.by_code,
+                "scan-increase": mobile.scan_increase,
+                "checkout": mobile.checkout,
+                "inventory-items": mobile.inventory_items,
+                "dashboard": mobile.dashboard,
+            }
+            names, weights = zip(*mix.items())
+            while time.perf_counter() < deadline:
+                await actions[mobile.rng.choices(names, weights)[0]]()
+                if args.think_ms:
+                    await asyncio.sleep(mobile.rng.expovariate(1000 / args.think_ms))
+
+        await asyncio.gather(*(user(number) for number in range(args.users)))
+
+    measured = time.perf_counter() - measure_from
+    endpoints = {
+        endpoint: summarize(timings, recorder.errors[endpoint], measured)
+        for endpoint, timings in sorted(recorder.timings.items())
+    }
+    total = summarize(
+        [timing for timings in recorder.timings.values() for timing in timings],
+        sum(recorder.errors.values()),
+        measured,
+    )
+    return {"endpoints": endpoints, "total": total}, measured
+
+
+def parse_mix(value: str | None) -> dict[str, int]:
+    if not value:
+        return dict(DEFAULT_MIX)
+    mix: dict[str, int] = {}
+    for part in value.split(","):
+        name, _, weight = part.partition("=")
+        if name not in DEFAULT_MIX or not weight.isdigit():
+            raise SystemExit(f"--mix expects name=weight pairs from: {', '.join(DEFAULT_MIX)}")
+        mix[name] = int(weight)
+    if not any(mix.values()):
+        raise SystemExit("--mix needs at least one non-zero weight")
+    return mix
+
+
+def git_commit() -> str | None:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def print_report(results: dict[str, Any], baseline: dict[str, Any] | None) -> None:
+    rows = [*results["endpoints"].items(), ("total", results["total"])]
+    print(
+        f"{'endpoint':<32} {'requests':>9} {'req/s':>8} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'errors':>7}"
+    )
+    for endpoint, stats in rows:
+        if not stats["requests"]:
+            continue
+        print(
+            f"{endpoint:<32} {stats['requests']:>9} {stats['rps']:>8.1f} {stats['p50_ms']:>8.1f} "
+            f"{stats['p95_ms']:>8.1f} {stats['p99_ms']:>8.1f} {stats['errors']:>7}"
+        )
+
+    if baseline is None:
+        return
+    print(f"\nchange vs {baseline.get('git_commit') or 'baseline'} ({baseline['started_at']})")
+    print(f"{'endpoint':<32} {'req/s':>8} {'p50':>8} {'p95':>8} {'p99':>8}")
+    previous = {**baseline["endpoints"], "total": baseline["total"]}
+    for endpoint, stats in rows:
+        before = previous.get(endpoint)
+        if not before or not before["requests"] or not stats["requests"]:
+            continue
+        changes = [
+            (stats[key] - before[key]) / before[key] * 100 if before[key] else 0.0
+            for key in ("rps", "p50_ms", "p95_ms", "p99_ms")
+        ]
+        print(f"{endpoint:<32} " + " ".join(f"{change:>+7.1f}%" for change in changes))
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--variants", type=int, default=10000, help="catalog size (1000-500000)")
+    parser.add_argument("--sales", type=int, default=5000, help="historic sales to seed")
+    parser.add_argument("--history-days", type=int, default=90)
+    parser.add_argument("--database", default="magirls_bench", help="scratch database, dropped and recreated")
+    parser.add_argument("--existing", action="store_true", help="seed the DATABASE_URL database instead")
+    parser.add_argument("--users", type=int, default=16, help="concurrent app clients")
+    parser.add_argument("--seconds", type=float, default=30, help="measured duration")
+    parser.add_argument("--warmup", type=float, default=5, help="seconds run before measuring")
+    parser.add_argument("--think-ms", type=float, default=0, help="mean pause between a client's calls")
+    parser.add_argument("--mix", help=f"weights, e.g. {','.join(f'{k}={v}' for k, v in DEFAULT_MIX.items())}")
+    parser.add_argument("--seed", type=int, default=1, help="random seed for data and traffic")
+    parser.add_argument("--workers", type=int, default=1)
+    parser.add_argument("--port", type=int, default=8767)
+    parser.add_argument("--output", type=Path, help="write results as JSON")
+    parser.add_argument("--compare", type=Path, help="earlier results file to diff against")
+    args = parser.parse_args()
+
+    if not 1000 <= args.variants <= 500000:
+        parser.error("--variants must be between 1000 and 500000")
+    baseline = json.loads(args.compare.read_text()) if args.compare else None
+
+    database_url = settings.database_url
+    if not args.existing:
+        database_url = make_url(database_url).set(database=args.database).render_as_string(hide_password=False)
+        create_database(database_url)
+
+    prefix = uuid.uuid4().hex[:8]
+    seeding_started = time.perf_counter()
+    user_id = seed(database_url, prefix, args.variants, args.sales, args.history_days, args.seed)
+    seed_seconds = time.perf_counter() - seeding_started
+    print(f"seeded {args.variants} variants and {args.sales} sales in {seed_seconds:.1f}s")
+
+    env = {**os.environ, "DATABASE_URL": database_url}
+    base_url = f"http://127.0.0.1:{args.port}"
+    server = subprocess.Popen(
+        [
+            sys.executable, "-m", "uvicorn", "app.main:app",
+            "--port", str(args.port), "--workers", str(args.workers), "--log-level", "warning",
+        ],
+        env=env,
+    )
+    started_at = datetime.now(timezone.utc)
+    try:
+        wait_until_ready(base_url, server)
+        results, measured = asyncio.run(run_load(args, base_url, create_access_token(user_id), prefix))
+    finally:
+        server.terminate()
+        server.wait()
+
+    results = {
+        "started_at": started_at.isoformat(),
+        "git_commit": git_commit(),
+        "config": {
+            "variants": args.variants,
+            "sales": args.sales,
+            "users": args.users,
+            "seconds": round(measured, 2),
+            "warmup": args.warmup,
+            "think_ms": args.think_ms,
+            "mix": parse_mix(args.mix),
+            "seed": args.seed,
+            "workers": args.workers,
+        },
+        "seed_seconds": round(seed_seconds, 2),
+        **results,
+    }
+    print_report(results, baseline)
+    if args.output:
+        args.output.write_text(json.dumps(results, indent=2) + "\n")
+        print(f"\nresults written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,6 +1,7 @@
 ﻿-- Ma' Girls (Phase I) - PostgreSQL schema (DDL)
 -- Includes: enums, tables, constraints, indexes, helpful triggers
 CREATE EXTENSION IF NOT EXISTS "uuid-ossp";
+CREATE EXTENSION IF NOT EXISTS pg_trgm;
 
 DO $$ BEGIN
   CREATE TYPE stock_movement_type AS ENUM (
@@ -43,6 +44,19 @@ CREATE TABLE IF NOT EXISTS users (
   last_login_at    TIMESTAMPTZ
 );
 
+CREATE OR REPLACE FUNCTION notify_user_change()
+RETURNS TRIGGER AS $$
+BEGIN
+  PERFORM pg_notify('user_events', COALESCE(NEW.id, OLD.id)::text);
+  RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS trg_users_notify_change ON users;
+CREATE TRIGGER trg_users_notify_change
+AFTER UPDATE OF username, full_name, is_active OR DELETE ON users
+FOR EACH ROW EXECUTE FUNCTION notify_user_change();
+
 CREATE TABLE IF NOT EXISTS devices (
   id               UUID PRIMARY KEY DEFAULT uuid_generate_v4(),
   device_name      VARCHAR(200),
@@ -105,6 +119,18 @@ BEFORE UPDATE ON product_variants
 FOR EACH ROW EXECUTE FUNCTION set_updated_at();
 
 CREATE INDEX IF NOT EXISTS idx_variants_product_id ON product_variants(product_id);
+
+-- Reorder point: the variant is low on stock once qty_on_hand <= reorder_point.
+-- reorder_qty is the suggested quantity to order, if set.
+ALTER TABLE product_variants ADD COLUMN IF NOT EXISTS reorder_point INT NOT NULL DEFAULT 1;
+ALTER TABLE product_variants ADD COLUMN IF NOT EXISTS reorder_qty INT;
+
+DO $$ BEGIN
+  ALTER TABLE product_variants
+    ADD CONSTRAINT ck_variants_reorder CHECK (reorder_point >= 0 AND (reorder_qty IS NULL OR reorder_qty > 0));
+EXCEPTION
+  WHEN duplicate_object THEN NULL;
+END $$;
 CREATE INDEX IF NOT EXISTS idx_variants_color ON product_variants(color);
 CREATE INDEX IF NOT EXISTS idx_variants_size ON product_variants(size);
 
@@ -123,6 +149,8 @@ CREATE TABLE IF NOT EXISTS barcode_variants (
 
 CREATE INDEX IF NOT EXISTS idx_barcode_variants_barcode ON barcode_variants(barcode_code);
 CREATE INDEX IF NOT EXISTS idx_barcode_variants_variant ON barcode_variants(variant_id);
+-- Barcode prefix search (LIKE 'abc%') regardless of the database collation.
+CREATE INDEX IF NOT EXISTS idx_barcode_variants_code_prefix ON barcode_variants(barcode_code varchar_pattern_ops);
 
 CREATE TABLE IF NOT EXISTS warehouses (
   id         UUID PRIMARY KEY DEFAULT uuid_generate_v4(),
@@ -140,6 +168,11 @@ CREATE TABLE IF NOT EXISTS inventory_batches (
   CONSTRAINT uq_batch_unique UNIQUE (warehouse_id, variant_id, batch_code, expires_at)
 );
 
+-- uq_batch_unique never conflicts while expires_at is NULL, so the default
+-- (non-expiring) batch per warehouse and variant gets its own arbiter index.
+CREATE UNIQUE INDEX IF NOT EXISTS uq_batch_no_expiry
+  ON inventory_batches(warehouse_id, variant_id, batch_code)
+  WHERE expires_at IS NULL;
 CREATE INDEX IF NOT EXISTS idx_batches_variant_id ON inventory_batches(variant_id);
 CREATE INDEX IF NOT EXISTS idx_batches_expires_at ON inventory_batches(expires_at);
 
@@ -154,8 +187,29 @@ CREATE TABLE IF NOT EXISTS stock_balances (
 
 CREATE INDEX IF NOT EXISTS idx_stock_balances_batch ON stock_balances(batch_id);
 
+-- The ledger is append-only and partitioned by month (UTC) on created_at.
+-- Databases created before partitioning keep their rows: the old table is
+-- renamed here and copied into the partitioned one further down.
+DO $$
+DECLARE
+  fk RECORD;
+BEGIN
+  IF EXISTS (SELECT 1 FROM pg_class WHERE oid = to_regclass('stock_movements') AND relkind = 'r') THEN
+    ALTER TABLE stock_movements RENAME TO stock_movements_unpartitioned;
+    ALTER INDEX stock_movements_pkey RENAME TO stock_movements_unpartitioned_pkey;
+    DROP INDEX IF EXISTS idx_stock_movements_variant_time, idx_stock_movements_batch_time, idx_stock_movements_type;
+    -- Frees the constraint names for the partitioned table.
+    FOR fk IN
+      SELECT conname FROM pg_constraint
+      WHERE conrelid = 'stock_movements_unpartitioned'::regclass AND contype = 'f'
+    LOOP
+      EXECUTE format('ALTER TABLE stock_movements_unpartitioned DROP CONSTRAINT %I', fk.conname);
+    END LOOP;
+  END IF;
+END $$;
+
 CREATE TABLE IF NOT EXISTS stock_movements (
-  id                   UUID PRIMARY KEY DEFAULT uuid_generate_v4(),
+  id                   UUID NOT NULL DEFAULT uuid_generate_v4(),
   warehouse_id         UUID NOT NULL REFERENCES warehouses(id) ON DELETE CASCADE,
   batch_id             UUID NOT NULL REFERENCES inventory_batches(id) ON DELETE RESTRICT,
   variant_id           UUID NOT NULL REFERENCES product_variants(id) ON DELETE RESTRICT,
@@ -165,12 +219,104 @@ CREATE TABLE IF NOT EXISTS stock_movements (
   reference_sale_id    UUID,
   performed_by_user_id UUID NOT NULL REFERENCES users(id),
   device_id            UUID REFERENCES devices(id),
-  created_at           TIMESTAMPTZ NOT NULL DEFAULT now()
-);
-
-CREATE INDEX IF NOT EXISTS idx_stock_movements_variant_time ON stock_movements(variant_id, created_at);
+  created_at           TIMESTAMPTZ NOT NULL DEFAULT now(),
+  -- created_at first: inserts go to the right edge of the key instead of a
+  -- random leaf, and store-wide history pages walk (created_at, id) off it.
+  PRIMARY KEY (created_at, id)
+) PARTITION BY RANGE (created_at);
+
+-- Catches rows for months without a partition yet; the function below moves
+-- them out when it creates the month.
+CREATE TABLE IF NOT EXISTS stock_movements_default PARTITION OF stock_movements DEFAULT;
+
+-- Per-variant history: keyset pages walk (variant_id, created_at, id) and the
+-- day/week buckets read only the included columns (index-only scans).
+CREATE INDEX IF NOT EXISTS idx_stock_movements_variant_history
+  ON stock_movements(variant_id, created_at, id) INCLUDE (movement_type, qty_delta);
+DROP INDEX IF EXISTS idx_stock_movements_variant_time;
 CREATE INDEX IF NOT EXISTS idx_stock_movements_batch_time ON stock_movements(batch_id, created_at);
-CREATE INDEX IF NOT EXISTS idx_stock_movements_type ON stock_movements(movement_type);
+-- Store-wide history pages are ordered by (created_at, id), which BRIN cannot
+-- provide: the primary key does, so no extra B-tree is paid on every insert.
+DROP INDEX IF EXISTS idx_stock_movements_time;
+DO $$
+BEGIN
+  IF (
+    SELECT a.attname FROM pg_constraint c
+    JOIN pg_attribute a ON a.attrelid = c.conrelid AND a.attnum = c.conkey[1]
+    WHERE c.conrelid = 'stock_movements'::regclass AND c.contype = 'p'
+  ) = 'id' THEN
+    ALTER TABLE stock_movements
+      DROP CONSTRAINT stock_movements_pkey,
+      ADD PRIMARY KEY (created_at, id);
+  END IF;
+END $$;
+-- Rows arrive in created_at order, so a BRIN index covers time-range scans
+-- (exports, month-long filters) at a fraction of a B-tree's size.
+CREATE INDEX IF NOT EXISTS idx_stock_movements_created_brin ON stock_movements USING BRIN (created_at);
+DROP INDEX IF EXISTS idx_stock_movements_type;
+
+-- Creates the monthly partitions from p_from's month (or the oldest row left
+-- in the default partition) through p_months_ahead months after the current
+-- one and returns how many were added.
+CREATE OR REPLACE FUNCTION ensure_stock_movement_partitions(p_from TIMESTAMPTZ, p_months_ahead INT)
+RETURNS INT AS $$
+DECLARE
+  month_start DATE;
+  last_month  DATE := (date_trunc('month', now() AT TIME ZONE 'UTC') + make_interval(months => p_months_ahead))::date;
+  lower_bound TIMESTAMPTZ;
+  upper_bound TIMESTAMPTZ;
+  partition   TEXT;
+  created     INT := 0;
+BEGIN
+  PERFORM pg_advisory_xact_lock(hashtext('stock_movement_partitions'));
+  SELECT date_trunc('month', LEAST(p_from, now(), min(created_at)) AT TIME ZONE 'UTC')::date
+  INTO month_start
+  FROM stock_movements_default;
+  WHILE month_start <= last_month LOOP
+    partition := format('stock_movements_%s', to_char(month_start, 'YYYY_MM'));
+    lower_bound := month_start::timestamp AT TIME ZONE 'UTC';
+    upper_bound := (month_start + INTERVAL '1 month')::timestamp AT TIME ZONE 'UTC';
+    IF to_regclass(partition) IS NULL THEN
+      -- Built detached and attached afterwards, so rows already sitting in
+      -- the default partition for this month can be moved in first.
+      EXECUTE format('CREATE TABLE %I (LIKE stock_movements INCLUDING DEFAULTS)', partition);
+      EXECUTE format(
+        'WITH moved AS (DELETE FROM stock_movements_default WHERE created_at >= %L AND created_at < %L RETURNING *) '
+        'INSERT INTO %I SELECT * FROM moved',
+        lower_bound, upper_bound, partition
+      );
+      EXECUTE format(
+        'ALTER TABLE stock_movements ATTACH PARTITION %I FOR VALUES FROM (%L) TO (%L)',
+        partition, lower_bound, upper_bound
+      );
+      created := created + 1;
+    END IF;
+    month_start := (month_start + INTERVAL '1 month')::date;
+  END LOOP;
+  RETURN created;
+END;
+$$ LANGUAGE plpgsql;
+
+DO $$
+DECLARE
+  oldest TIMESTAMPTZ;
+BEGIN
+  IF to_regclass('stock_movements_unpartitioned') IS NOT NULL THEN
+    EXECUTE 'SELECT min(created_at) FROM stock_movements_unpartitioned' INTO oldest;
+    PERFORM ensure_stock_movement_partitions(COALESCE(oldest, now()), 3);
+    INSERT INTO stock_movements (
+      id, warehouse_id, batch_id, variant_id, movement_type, qty_delta,
+      reason, reference_sale_id, performed_by_user_id, device_id, created_at
+    )
+    SELECT
+      id, warehouse_id, batch_id, variant_id, movement_type, qty_delta,
+      reason, reference_sale_id, performed_by_user_id, device_id, created_at
+    FROM stock_movements_unpartitioned;
+    DROP TABLE stock_movements_unpartitioned;
+  ELSE
+    PERFORM ensure_stock_movement_partitions(now(), 3);
+  END IF;
+END $$;
 
 CREATE TABLE IF NOT EXISTS customers (
   id         UUID PRIMARY KEY DEFAULT uuid_generate_v4(),
@@ -211,6 +357,61 @@ CREATE TABLE IF NOT EXISTS sale_items (
 CREATE INDEX IF NOT EXISTS idx_sale_items_sale_id ON sale_items(sale_id);
 CREATE INDEX IF NOT EXISTS idx_sale_items_variant_id ON sale_items(variant_id);
 
+-- Purchase price at the time of the sale. Rows from before this column
+-- existed stay NULL and are costed at the current purchase price.
+ALTER TABLE sale_items ADD COLUMN IF NOT EXISTS unit_cost NUMERIC(12,2);
+
+-- Daily sales rollups, keyed by the sale date in SALES_REPORT_TIMEZONE.
+-- Checkout adds to them in the same statement that writes the sale; the
+-- reporting endpoints read only these tables. Category is the product
+-- category at sale time, '' when the product has none.
+CREATE TABLE IF NOT EXISTS sales_daily (
+  sale_date  DATE PRIMARY KEY,
+  tickets    INT NOT NULL DEFAULT 0,
+  units      BIGINT NOT NULL DEFAULT 0,
+  revenue    NUMERIC NOT NULL DEFAULT 0,
+  cost       NUMERIC NOT NULL DEFAULT 0,
+  updated_at TIMESTAMPTZ NOT NULL DEFAULT now()
+);
+
+CREATE TABLE IF NOT EXISTS sales_daily_categories (
+  sale_date  DATE NOT NULL,
+  category   VARCHAR(150) NOT NULL,
+  units      BIGINT NOT NULL DEFAULT 0,
+  revenue    NUMERIC NOT NULL DEFAULT 0,
+  cost       NUMERIC NOT NULL DEFAULT 0,
+  PRIMARY KEY (sale_date, category)
+);
+
+-- category is part of the key: a product recategorized during the day gets a
+-- second row for the later sales, so each category's variant rows still add
+-- up to its sales_daily_categories row.
+CREATE TABLE IF NOT EXISTS sales_daily_variants (
+  sale_date  DATE NOT NULL,
+  variant_id UUID NOT NULL REFERENCES product_variants(id) ON DELETE RESTRICT,
+  category   VARCHAR(150) NOT NULL,
+  units      BIGINT NOT NULL DEFAULT 0,
+  revenue    NUMERIC NOT NULL DEFAULT 0,
+  cost       NUMERIC NOT NULL DEFAULT 0,
+  PRIMARY KEY (sale_date, variant_id, category)
+);
+
+DO $$
+BEGIN
+  IF (
+    SELECT cardinality(conkey) FROM pg_constraint
+    WHERE conrelid = 'sales_daily_variants'::regclass AND contype = 'p'
+  ) = 2 THEN
+    ALTER TABLE sales_daily_variants
+      DROP CONSTRAINT sales_daily_variants_pkey,
+      ADD PRIMARY KEY (sale_date, variant_id, category);
+  END IF;
+END $$;
+
+-- Recent sales of one variant (days of cover on low-stock alerts).
+CREATE INDEX IF NOT EXISTS idx_sales_daily_variants_variant
+  ON sales_daily_variants(variant_id, sale_date) INCLUDE (units);
+
 DO $$ BEGIN
   ALTER TABLE stock_movements
     ADD CONSTRAINT fk_stock_movements_reference_sale
@@ -242,3 +443,197 @@ SELECT
 FROM stock_balances b
 JOIN inventory_batches ib ON ib.id = b.batch_id
 GROUP BY b.warehouse_id, ib.variant_id;
+
+CREATE TABLE IF NOT EXISTS catalog_items (
+  variant_id     UUID PRIMARY KEY REFERENCES product_variants(id) ON DELETE CASCADE,
+  product_id     UUID NOT NULL REFERENCES products(id) ON DELETE CASCADE,
+  product_name   VARCHAR(250) NOT NULL,
+  brand          VARCHAR(150),
+  category       VARCHAR(150),
+  description    TEXT,
+  photo_url      TEXT,
+  variant_name   TEXT,
+  color          VARCHAR(80),
+  size           VARCHAR(80),
+  location       VARCHAR(200),
+  purchase_price NUMERIC(12,2) NOT NULL DEFAULT 0,
+  sale_price     NUMERIC(12,2) NOT NULL DEFAULT 0,
+  qty_on_hand    INTEGER NOT NULL DEFAULT 0,
+  primary_code   VARCHAR(200),
+  change_xid     XID8 NOT NULL DEFAULT pg_current_xact_id(),
+  updated_at     TIMESTAMPTZ NOT NULL DEFAULT now()
+);
+
+CREATE INDEX IF NOT EXISTS idx_catalog_items_product_id ON catalog_items(product_id);
+CREATE INDEX IF NOT EXISTS idx_catalog_items_name ON catalog_items(product_name, variant_name, variant_id);
+CREATE INDEX IF NOT EXISTS idx_catalog_items_qty ON catalog_items(qty_on_hand, product_name, variant_name, variant_id);
+CREATE INDEX IF NOT EXISTS idx_catalog_items_price ON catalog_items(sale_price, variant_id);
+CREATE INDEX IF NOT EXISTS idx_catalog_items_updated ON catalog_items(updated_at, variant_id);
+CREATE INDEX IF NOT EXISTS idx_catalog_items_category ON catalog_items(category, product_name, variant_name, variant_id);
+CREATE INDEX IF NOT EXISTS idx_catalog_items_brand ON catalog_items(brand, product_name, variant_name, variant_id);
+CREATE INDEX IF NOT EXISTS idx_catalog_items_location ON catalog_items(location, product_name, variant_name, variant_id);
+CREATE INDEX IF NOT EXISTS idx_catalog_items_change ON catalog_items(change_xid, variant_id);
+
+ALTER TABLE catalog_items ADD COLUMN IF NOT EXISTS reorder_point INT NOT NULL DEFAULT 1;
+ALTER TABLE catalog_items ADD COLUMN IF NOT EXISTS reorder_qty INT;
+
+-- The low-stock set. Every stock write already updates catalog_items, so
+-- membership follows qty_on_hand and reorder_point without extra work, and
+-- the alerts endpoint reads only this (small) index in its default order.
+CREATE INDEX IF NOT EXISTS idx_catalog_items_low_stock
+  ON catalog_items(qty_on_hand, product_name, variant_name, variant_id)
+  WHERE qty_on_hand <= reorder_point;
+
+-- Text searched by GET /catalog/search, indexed twice: as a tsvector for
+-- word-prefix matches and by trigrams for typo-tolerant matches.
+ALTER TABLE catalog_items ADD COLUMN IF NOT EXISTS search_text TEXT GENERATED ALWAYS AS (
+  lower(
+    product_name || ' ' || COALESCE(brand, '') || ' ' || COALESCE(category, '') || ' '
+    || COALESCE(variant_name, '') || ' ' || COALESCE(color, '') || ' ' || COALESCE(size, '')
+  )
+) STORED;
+
+CREATE INDEX IF NOT EXISTS idx_catalog_items_search_words ON catalog_items USING GIN (to_tsvector('simple', search_text));
+-- GiST, not GIN: it returns trigram matches nearest first (KNN on <->>), so
+-- the fuzzy arm of a search reads only as many rows as it keeps.
+DROP INDEX IF EXISTS idx_catalog_items_search_trgm;
+CREATE INDEX IF NOT EXISTS idx_catalog_items_search_trgm_gist ON catalog_items USING GIST (search_text gist_trgm_ops);
+
+CREATE TABLE IF NOT EXISTS catalog_item_removals (
+  variant_id UUID PRIMARY KEY REFERENCES product_variants(id) ON DELETE CASCADE,
+  change_xid XID8 NOT NULL DEFAULT pg_current_xact_id(),
+  removed_at TIMESTAMPTZ NOT NULL DEFAULT now()
+);
+
+CREATE INDEX IF NOT EXISTS idx_catalog_item_removals_change ON catalog_item_removals(change_xid, variant_id);
+
+CREATE OR REPLACE FUNCTION stamp_catalog_item_change()
+RETURNS TRIGGER AS $$
+BEGIN
+  NEW.change_xid = pg_current_xact_id();
+  NEW.updated_at = now();
+  RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS trg_catalog_items_change ON catalog_items;
+CREATE TRIGGER trg_catalog_items_change
+BEFORE INSERT OR UPDATE ON catalog_items
+FOR EACH ROW EXECUTE FUNCTION stamp_catalog_item_change();
+
+CREATE OR REPLACE FUNCTION track_catalog_item_removal()
+RETURNS TRIGGER AS $$
+BEGIN
+  IF TG_OP = 'DELETE' THEN
+    INSERT INTO catalog_item_removals (variant_id, change_xid, removed_at)
+    VALUES (OLD.variant_id, pg_current_xact_id(), now())
+    ON CONFLICT (variant_id)
+    DO UPDATE SET change_xid = EXCLUDED.change_xid,
+                  removed_at = EXCLUDED.removed_at;
+    RETURN OLD;
+  END IF;
+
+  DELETE FROM catalog_item_removals WHERE variant_id = NEW.variant_id;
+  RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS trg_catalog_items_removal ON catalog_items;
+CREATE TRIGGER trg_catalog_items_removal
+AFTER INSERT OR DELETE ON catalog_items
+FOR EACH ROW EXECUTE FUNCTION track_catalog_item_removal();
+
+CREATE OR REPLACE VIEW v_catalog_items_source AS
+SELECT
+  pv.id AS variant_id,
+  p.id AS product_id,
+  p.name AS product_name,
+  p.brand,
+  p.category,
+  p.description,
+  p.photo_url,
+  COALESCE(pv.variant_name, CONCAT_WS(' / ', pv.color, pv.size)) AS variant_name,
+  pv.color,
+  pv.size,
+  pv.location,
+  pv.purchase_price,
+  pv.sale_price,
+  COALESCE(stock.qty_on_hand, 0) AS qty_on_hand,
+  code.barcode_code AS primary_code,
+  pv.reorder_point,
+  pv.reorder_qty
+FROM product_variants pv
+JOIN products p ON p.id = pv.product_id
+LEFT JOIN LATERAL (
+  SELECT SUM(sb.qty_on_hand)::INT AS qty_on_hand
+  FROM inventory_batches ib
+  JOIN stock_balances sb ON sb.batch_id = ib.id
+  WHERE ib.variant_id = pv.id
+) stock ON TRUE
+LEFT JOIN LATERAL (
+  SELECT bv.barcode_code
+  FROM barcode_variants bv
+  WHERE bv.variant_id = pv.id
+  ORDER BY bv.is_primary DESC, bv.created_at ASC
+  LIMIT 1
+) code ON TRUE
+WHERE p.is_active = TRUE
+  AND pv.is_active = TRUE;
+
+CREATE OR REPLACE VIEW v_dashboard_totals_source AS
+WITH invested AS (
+  SELECT COALESCE(SUM(vs.qty_on_hand * pv.purchase_price), 0) AS amount
+  FROM v_variant_stock vs
+  JOIN product_variants pv ON pv.id = vs.variant_id
+  JOIN products p ON p.id = pv.product_id
+  WHERE pv.is_active = TRUE
+    AND p.is_active = TRUE
+    AND vs.qty_on_hand > 0
+),
+sales_gross AS (
+  SELECT COALESCE(SUM(total), 0) AS amount
+  FROM sales
+  WHERE status = 'CONFIRMED'
+),
+cogs AS (
+  SELECT COALESCE(SUM(si.qty * pv.purchase_price), 0) AS amount
+  FROM sale_items si
+  JOIN sales s ON s.id = si.sale_id
+  JOIN product_variants pv ON pv.id = si.variant_id
+  WHERE s.status = 'CONFIRMED'
+)
+SELECT
+  invested.amount AS invested_amount,
+  sales_gross.amount AS gross_sales,
+  cogs.amount AS cost_of_goods_sold
+FROM invested, sales_gross, cogs;
+
+CREATE TABLE IF NOT EXISTS dashboard_totals (
+  id                 SMALLINT PRIMARY KEY DEFAULT 1,
+  invested_amount    NUMERIC NOT NULL DEFAULT 0,
+  gross_sales        NUMERIC NOT NULL DEFAULT 0,
+  cost_of_goods_sold NUMERIC NOT NULL DEFAULT 0,
+  updated_at         TIMESTAMPTZ NOT NULL DEFAULT now(),
+  CONSTRAINT ck_dashboard_totals_single_row CHECK (id = 1)
+);
+
+INSERT INTO dashboard_totals (id, invested_amount, gross_sales, cost_of_goods_sold)
+SELECT 1, invested_amount, gross_sales, cost_of_goods_sold
+FROM v_dashboard_totals_source
+ON CONFLICT (id) DO NOTHING;
+
+-- Stored responses of POST requests sent with an Idempotency-Key header, per
+-- user. The row is written in the same transaction as the request itself, so
+-- a response is stored exactly when its effects are committed. Expired rows
+-- are purged by the API (IDEMPOTENCY_CLEANUP_MINUTES).
+CREATE TABLE IF NOT EXISTS idempotency_keys (
+  user_id         UUID NOT NULL REFERENCES users(id) ON DELETE CASCADE,
+  idempotency_key VARCHAR(255) NOT NULL,
+  request_hash    TEXT NOT NULL,
+  response        JSONB,
+  created_at      TIMESTAMPTZ NOT NULL DEFAULT now(),
+  expires_at      TIMESTAMPTZ NOT NULL,
+  PRIMARY KEY (user_id, idempotency_key)
+);
+
+CREATE INDEX IF NOT EXISTS idx_idempotency_keys_expires ON idempotency_keys(expires_at);
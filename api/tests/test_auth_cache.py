@@ -0,0 +1,38 @@
+import time
+
+from sqlalchemy import text
+
+from app.services.auth_cache import user_cache
+from app.services.events import broker
+
+
+def wait_for(condition, timeout=5):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "timed out"
+        time.sleep(0.05)
+
+
+def test_deactivated_user_is_evicted_without_the_event_stream(client, auth, db, user):
+    # conftest sets EVENTS_ENABLED=false; the user_events listener still runs.
+    wait_for(lambda: user_cache.enabled)
+    assert client.get("/dashboard/summary", headers=auth).status_code == 200
+    assert user_cache.get(user["id"]) is not None
+
+    db.execute(text("UPDATE users SET is_active = FALSE WHERE id = CAST(:id AS uuid)"), {"id": user["id"]})
+    db.commit()
+    wait_for(lambda: user_cache.get(user["id"]) is None)
+
+    assert client.get("/dashboard/summary", headers=auth).status_code == 401
+
+
+def test_user_cache_is_bypassed_while_the_listener_is_down(client, auth, db, user):
+    wait_for(lambda: user_cache.enabled)
+    broker.stop()
+    assert not user_cache.enabled
+
+    assert client.get("/dashboard/summary", headers=auth).status_code == 200
+    db.execute(text("UPDATE users SET is_active = FALSE WHERE id = CAST(:id AS uuid)"), {"id": user["id"]})
+    db.commit()
+
+    assert client.get("/dashboard/summary", headers=auth).status_code == 401
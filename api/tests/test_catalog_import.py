@@ -0,0 +1,51 @@
+import pytest
+from sqlalchemy import text
+
+from app.services.dashboard import get_dashboard_totals
+
+
+def post_import(client, auth, body):
+    return client.post("/catalog/import", headers=auth, files={"file": ("items.csv", body, "text/csv")})
+
+
+def assert_nothing_imported(db):
+    db.rollback()
+    assert db.execute(text("SELECT count(*) FROM products")).scalar_one() == 0
+    assert get_dashboard_totals(db)["invested_amount"] == 0
+
+
+def test_rows_failing_validation_are_reported_per_row(client, auth, db):
+    body = "code,product_name,sale_price,initial_qty\nA,Ok,5,1\nA,Twice,5,1\nB,Pricey,1e300,1\nC,Negative,5,-1\n"
+
+    response = post_import(client, auth, body)
+
+    assert response.status_code == 200, response.text
+    assert (response.json()["created"], [e["row"] for e in response.json()["errors"]]) == (1, [2, 3, 4])
+
+
+def test_value_out_of_range_for_the_staging_copy_is_a_400(client, auth, db):
+    response = post_import(client, auth, "code,product_name,initial_qty\nA,Ok,1\nB,Huge,99999999999\n")
+
+    assert response.status_code == 400
+    assert response.json()["detail"].startswith("Import rejected: ")
+    assert_nothing_imported(db)
+
+
+@pytest.fixture
+def location_check(db):
+    # Stands in for any constraint the final insert can hit that the per-row
+    # checks do not know about.
+    db.execute(text("ALTER TABLE product_variants ADD CONSTRAINT ck_test_location CHECK (location <> 'Nowhere')"))
+    db.commit()
+    yield
+    db.rollback()
+    db.execute(text("ALTER TABLE product_variants DROP CONSTRAINT ck_test_location"))
+    db.commit()
+
+
+def test_constraint_violated_by_the_insert_is_a_400(client, auth, db, location_check):
+    response = post_import(client, auth, "code,product_name,location,initial_qty\nA,Ok,A1,2\nB,Lost,Nowhere,1\n")
+
+    assert response.status_code == 400
+    assert response.json() == {"detail": "Import rejected: violates ck_test_location"}
+    assert_nothing_imported(db)
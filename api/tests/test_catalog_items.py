@@ -0,0 +1,70 @@
+from app.services.catalog import check_catalog_items, rebuild_catalog_items
+
+
+def assert_read_model_in_sync(db):
+    db.rollback()
+    assert check_catalog_items(db) == []
+
+
+def list_items(client, auth):
+    response = client.get("/inventory/items", headers=auth, params={"limit": 500})
+    assert response.status_code == 200, response.text
+    return response.json()
+
+
+def test_read_model_follows_every_write(client, auth, db, add_product):
+    a = add_product("A", qty=10, category="Tops", brand="Acme", location="A1")
+    b = add_product("B", qty=4)
+    add_product("C")
+    assert_read_model_in_sync(db)
+
+    assert client.post("/inventory/scan-increase", headers=auth, json={"code": "A", "qty": 5}).status_code == 200
+    response = client.post(
+        "/inventory/scan-increase/batch",
+        headers=auth,
+        json={"items": [{"code": "B", "qty": 2}, {"code": "C", "qty": 1}]},
+    )
+    assert response.status_code == 200, response.text
+    assert_read_model_in_sync(db)
+
+    response = client.post(
+        "/sales/checkout", headers=auth, json={"items": [{"code": "A", "qty": 3}, {"code": "B", "qty": 1}]}
+    )
+    assert response.status_code == 200, response.text
+    assert_read_model_in_sync(db)
+
+    response = client.patch(
+        f"/inventory/items/{a['variant_id']}",
+        headers=auth,
+        json={"product_name": "Renamed", "color": "Red", "location": "B2", "sale_price": 7},
+    )
+    assert response.status_code == 200, response.text
+    assert_read_model_in_sync(db)
+
+    assert client.delete(f"/inventory/items/{b['variant_id']}", headers=auth).status_code == 200
+    assert_read_model_in_sync(db)
+
+    csv_file = "code,product_name,purchase_price,sale_price,initial_qty\nD,Imported,1.25,3,8\nA,Ignored,1,1,2\n"
+    response = client.post("/catalog/import", headers=auth, files={"file": ("items.csv", csv_file, "text/csv")})
+    assert response.status_code == 200, response.text
+    assert_read_model_in_sync(db)
+
+    items = {item["primary_code"]: item for item in list_items(client, auth)}
+    assert set(items) == {"A", "C", "D"}
+    assert (items["A"]["product_name"], items["A"]["location"], items["A"]["sale_price"]) == ("Renamed", "B2", 7)
+    assert items["D"]["qty_on_hand"] == 8
+
+
+def test_rebuild_reproduces_the_incremental_read_model(client, auth, db, add_product):
+    a = add_product("A", qty=10, category="Tops")
+    add_product("B", qty=3)
+    client.post("/sales/checkout", headers=auth, json={"items": [{"code": "A", "qty": 4}]})
+    client.patch(f"/inventory/items/{a['variant_id']}", headers=auth, json={"brand": "Acme"})
+    before = list_items(client, auth)
+
+    db.rollback()
+    rebuild_catalog_items(db)
+    db.commit()
+
+    assert list_items(client, auth) == before
+    assert_read_model_in_sync(db)
@@ -0,0 +1,92 @@
+from sqlalchemy import text
+
+from app.services.catalog import adjust_catalog_stock
+
+
+def stock_of(client, auth, code):
+    return client.get(f"/inventory/by-code/{code}", headers=auth).json()["qty_on_hand"]
+
+
+def add_batch(db, variant_id, batch_code, qty):
+    db.execute(
+        text(
+            """
+            WITH batch AS (
+              INSERT INTO inventory_batches (warehouse_id, variant_id, batch_code, created_at)
+              SELECT id, CAST(:variant_id AS uuid), :batch_code, now() + interval '1 minute'
+              FROM warehouses
+              RETURNING id, warehouse_id
+            )
+            INSERT INTO stock_balances (warehouse_id, batch_id, qty_on_hand)
+            SELECT warehouse_id, id, :qty FROM batch
+            """
+        ),
+        {"variant_id": variant_id, "batch_code": batch_code, "qty": qty},
+    )
+    adjust_catalog_stock(db, {variant_id: qty})
+    db.commit()
+
+
+def test_cart_lines_are_recorded_in_order_and_repeated_codes_add_up(client, auth, db, add_product):
+    add_product("A", qty=10, sale_price=5)
+    add_product("B", qty=10, sale_price=9)
+
+    response = client.post(
+        "/sales/checkout",
+        headers=auth,
+        json={"items": [{"code": "A", "qty": 2}, {"code": "B", "qty": 1}, {"code": "A", "qty": 3}]},
+    )
+
+    assert response.status_code == 200, response.text
+    assert response.json()["total"] == 34
+    # Lines are inserted in cart order; on a freshly emptied table that is
+    # also their physical order.
+    lines = db.execute(text("SELECT barcode_code, qty, line_total FROM sale_items ORDER BY ctid")).all()
+    assert [(code, qty, float(total)) for code, qty, total in lines] == [("A", 2, 10), ("B", 1, 9), ("A", 3, 15)]
+    assert stock_of(client, auth, "A") == 5
+    assert stock_of(client, auth, "B") == 9
+
+
+def test_oldest_batch_is_sold_first(client, auth, db, add_product):
+    a = add_product("A", qty=2)
+    add_batch(db, a["variant_id"], "LOT-2", 5)
+
+    response = client.post("/sales/checkout", headers=auth, json={"items": [{"code": "A", "qty": 4}]})
+
+    assert response.status_code == 200, response.text
+    taken = db.execute(
+        text(
+            """
+            SELECT ib.batch_code, sm.qty_delta, sb.qty_on_hand
+            FROM stock_movements sm
+            JOIN inventory_batches ib ON ib.id = sm.batch_id
+            JOIN stock_balances sb ON sb.batch_id = sm.batch_id
+            WHERE sm.movement_type = 'DECREASE_SALE'
+            ORDER BY ib.created_at
+            """
+        )
+    ).all()
+    assert [tuple(row) for row in taken] == [("DEFAULT", -2, 0), ("LOT-2", -2, 3)]
+    assert stock_of(client, auth, "A") == 3
+
+
+def test_rejected_cart_changes_nothing(client, auth, db, add_product):
+    add_product("A", qty=3)
+    add_product("B", qty=1)
+
+    short = client.post(
+        "/sales/checkout", headers=auth, json={"items": [{"code": "A", "qty": 1}, {"code": "B", "qty": 2}]}
+    )
+    unknown = client.post(
+        "/sales/checkout", headers=auth, json={"items": [{"code": "A", "qty": 1}, {"code": "NOPE", "qty": 1}]}
+    )
+
+    assert short.status_code == 400
+    assert "Insufficient stock" in short.json()["detail"]
+    assert unknown.status_code == 404
+    counts = db.execute(
+        text("SELECT (SELECT count(*) FROM sales), (SELECT count(*) FROM sale_items), (SELECT count(*) FROM stock_movements WHERE qty_delta < 0)")
+    ).one()
+    assert tuple(counts) == (0, 0, 0)
+    assert stock_of(client, auth, "A") == 3
+    assert stock_of(client, auth, "B") == 1
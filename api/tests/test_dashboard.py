@@ -0,0 +1,74 @@
+from concurrent.futures import ThreadPoolExecutor
+
+from app.services.dashboard import get_dashboard_totals, recompute_dashboard_totals
+
+
+def assert_totals_match_recompute(db):
+    db.rollback()
+    stored = get_dashboard_totals(db)
+    assert stored == recompute_dashboard_totals(db)
+    return stored
+
+
+def test_incremental_totals_follow_every_write(client, auth, db, add_product):
+    a = add_product("A", qty=10, purchase_price=2, sale_price=5)
+    b = add_product("B", qty=4, purchase_price=3.5, sale_price=9)
+    add_product("C")
+    assert assert_totals_match_recompute(db)["invested_amount"] == 34
+
+    response = client.post(
+        "/sales/checkout", headers=auth, json={"items": [{"code": "A", "qty": 3}, {"code": "B", "qty": 1}]}
+    )
+    assert response.status_code == 200, response.text
+    assert assert_totals_match_recompute(db)["gross_sales"] == 24
+
+    assert client.post("/inventory/scan-increase", headers=auth, json={"code": "A", "qty": 5}).status_code == 200
+    response = client.post(
+        "/inventory/scan-increase/batch",
+        headers=auth,
+        json={"items": [{"code": "B", "qty": 2}, {"code": "C", "qty": 1}, {"code": "NOPE", "qty": 1}]},
+    )
+    assert response.status_code == 200, response.text
+    assert_totals_match_recompute(db)
+
+    # Repricing moves both the stock still on hand and the COGS of past sales.
+    response = client.patch(f"/inventory/items/{a['variant_id']}", headers=auth, json={"purchase_price": 2.75})
+    assert response.status_code == 200, response.text
+    assert_totals_match_recompute(db)
+
+    assert client.post("/sales/checkout", headers=auth, json={"items": [{"code": "A", "qty": 2}]}).status_code == 200
+    assert client.delete(f"/inventory/items/{b['variant_id']}", headers=auth).status_code == 200
+    assert_totals_match_recompute(db)
+
+    csv_file = "code,product_name,purchase_price,sale_price,initial_qty\nD,Imported,1.25,3,8\n"
+    response = client.post("/catalog/import", headers=auth, files={"file": ("items.csv", csv_file, "text/csv")})
+    assert response.status_code == 200, response.text
+    assert response.json()["created"] == 1
+    assert_totals_match_recompute(db)
+
+
+def test_concurrent_reprices_checkouts_and_deletes_do_not_deadlock(client, auth, db, add_product):
+    a = add_product("A", qty=40, purchase_price=2, sale_price=5)
+    add_product("B", qty=40, purchase_price=3, sale_price=6)
+    doomed = add_product("Z", qty=5, purchase_price=1, sale_price=2)
+
+    def checkout(_):
+        return client.post(
+            "/sales/checkout", headers=auth, json={"items": [{"code": "A", "qty": 1}, {"code": "B", "qty": 1}]}
+        )
+
+    def reprice(i):
+        return client.patch(
+            f"/inventory/items/{a['variant_id']}", headers=auth, json={"purchase_price": 2 + (i % 4) / 4}
+        )
+
+    def scan(_):
+        return client.post("/inventory/scan-increase", headers=auth, json={"code": "B", "qty": 1})
+
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        futures = [pool.submit(job, i) for i in range(10) for job in (checkout, reprice, scan)]
+        futures.append(pool.submit(lambda: client.delete(f"/inventory/items/{doomed['variant_id']}", headers=auth)))
+        responses = [future.result() for future in futures]
+
+    assert [response.status_code for response in responses] == [200] * len(responses)
+    assert_totals_match_recompute(db)
@@ -0,0 +1,116 @@
+from concurrent.futures import ThreadPoolExecutor
+
+from sqlalchemy import text
+
+
+def stock_of(client, auth, code):
+    response = client.get(f"/inventory/by-code/{code}", headers=auth)
+    assert response.status_code == 200, response.text
+    return response.json()["qty_on_hand"]
+
+
+def sale_count(db):
+    db.rollback()
+    return db.execute(text("SELECT count(*) FROM sales")).scalar_one()
+
+
+def test_repeated_key_returns_the_stored_checkout(client, auth, db, add_product):
+    add_product("A", qty=10)
+    body = {"items": [{"code": "A", "qty": 2}]}
+    headers = {**auth, "Idempotency-Key": "sale-1"}
+
+    first = client.post("/sales/checkout", headers=headers, json=body)
+    again = client.post("/sales/checkout", headers=headers, json=body)
+
+    assert first.status_code == again.status_code == 200, again.text
+    assert again.json() == first.json()
+    assert sale_count(db) == 1
+    assert stock_of(client, auth, "A") == 8
+
+
+def test_new_key_with_identical_body_is_applied_again(client, auth, db, add_product):
+    add_product("A", qty=10)
+    body = {"items": [{"code": "A", "qty": 2}]}
+
+    first = client.post("/sales/checkout", headers={**auth, "Idempotency-Key": "sale-1"}, json=body)
+    second = client.post("/sales/checkout", headers={**auth, "Idempotency-Key": "sale-2"}, json=body)
+
+    assert first.status_code == second.status_code == 200
+    assert first.json()["sale_id"] != second.json()["sale_id"]
+    assert sale_count(db) == 2
+    assert stock_of(client, auth, "A") == 6
+
+
+def test_key_reused_with_another_body_conflicts(client, auth, db, add_product):
+    add_product("A", qty=10)
+    headers = {**auth, "Idempotency-Key": "scan-1"}
+
+    assert client.post("/inventory/scan-increase", headers=headers, json={"code": "A", "qty": 1}).status_code == 200
+    response = client.post("/inventory/scan-increase", headers=headers, json={"code": "A", "qty": 5})
+
+    assert response.status_code == 422
+    assert stock_of(client, auth, "A") == 11
+
+
+def test_keys_are_scoped_per_endpoint_and_user(client, auth, db, add_product):
+    add_product("A", qty=10)
+    headers = {**auth, "Idempotency-Key": "shared"}
+
+    assert client.post("/inventory/scan-increase", headers=headers, json={"code": "A", "qty": 1}).status_code == 200
+    response = client.post("/sales/checkout", headers=headers, json={"items": [{"code": "A", "qty": 1}]})
+
+    assert response.status_code == 422
+    assert stock_of(client, auth, "A") == 11
+
+
+def test_errors_are_not_stored(client, auth, db, add_product):
+    headers = {**auth, "Idempotency-Key": "scan-1"}
+    body = {"code": "LATER", "qty": 3}
+
+    assert client.post("/inventory/scan-increase", headers=headers, json=body).status_code == 404
+    add_product("LATER", qty=1)
+    response = client.post("/inventory/scan-increase", headers=headers, json=body)
+
+    assert response.status_code == 200, response.text
+    assert stock_of(client, auth, "LATER") == 4
+
+
+def test_scan_upsert_replay_returns_the_created_variant(client, auth, db):
+    body = {"code": "NEW", "product_name": "New", "purchase_price": 1, "sale_price": 2, "initial_qty": 5}
+    headers = {**auth, "Idempotency-Key": "create-1"}
+
+    first = client.post("/catalog/scan-upsert", headers=headers, json=body)
+    again = client.post("/catalog/scan-upsert", headers=headers, json=body)
+
+    assert first.status_code == again.status_code == 200, again.text
+    assert again.json() == first.json()
+    assert stock_of(client, auth, "NEW") == 5
+
+
+def test_expired_key_is_taken_over(client, auth, db, add_product):
+    add_product("A", qty=10)
+    headers = {**auth, "Idempotency-Key": "scan-1"}
+    body = {"code": "A", "qty": 1}
+
+    assert client.post("/inventory/scan-increase", headers=headers, json=body).status_code == 200
+    db.execute(text("UPDATE idempotency_keys SET expires_at = now() - interval '1 second'"))
+    db.commit()
+    assert client.post("/inventory/scan-increase", headers=headers, json=body).status_code == 200
+
+    assert stock_of(client, auth, "A") == 12
+
+
+def test_concurrent_duplicates_apply_once(client, auth, db, add_product):
+    add_product("A", qty=50)
+    headers = {**auth, "Idempotency-Key": "sale-1"}
+    body = {"items": [{"code": "A", "qty": 1}]}
+
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        responses = list(pool.map(lambda _: client.post("/sales/checkout", headers=headers, json=body), range(8)))
+
+    ok = [response.json() for response in responses if response.status_code == 200]
+    # A duplicate that cannot wait for the first one gets 409 and retries.
+    assert {response.status_code for response in responses} <= {200, 409}
+    assert ok and all(result == ok[0] for result in ok)
+    assert sale_count(db) == 1
+    assert stock_of(client, auth, "A") == 49
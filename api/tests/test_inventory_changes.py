@@ -0,0 +1,67 @@
+def changes(client, auth, since=None, limit=500):
+    params = {"limit": limit, **({"since": since} if since else {})}
+    response = client.get("/inventory/changes", headers=auth, params=params)
+    assert response.status_code == 200, response.text
+    return response.json()
+
+
+def sync(client, auth, since=None, limit=500):
+    items, removed, pages = {}, [], 0
+    while True:
+        body = changes(client, auth, since, limit)
+        pages += 1
+        items.update({item["variant_id"]: item for item in body["items"]})
+        removed += body["removed"]
+        since = body["cursor"]
+        if not body["has_more"]:
+            return items, removed, since, pages
+
+
+def test_first_sync_returns_the_whole_catalog(client, auth, add_product):
+    codes = {add_product(f"C{i}", qty=i)["variant_id"]: f"C{i}" for i in range(5)}
+
+    body = changes(client, auth)
+
+    assert {item["variant_id"]: item["primary_code"] for item in body["items"]} == codes
+    assert body["removed"] == []
+    assert body["cursor"] and body["has_more"] is False
+
+
+def test_next_sync_returns_only_what_changed(client, auth, add_product):
+    a = add_product("A", qty=5)
+    add_product("B", qty=5)
+    c = add_product("C", qty=5)
+    _, _, since, _ = sync(client, auth)
+
+    assert changes(client, auth, since)["items"] == []
+
+    client.post("/inventory/scan-increase", headers=auth, json={"code": "A", "qty": 1})
+    client.delete(f"/inventory/items/{c['variant_id']}", headers=auth)
+    d = add_product("D", qty=1)
+    items, removed, since, _ = sync(client, auth, since)
+
+    assert set(items) == {a["variant_id"], d["variant_id"]}
+    assert items[a["variant_id"]]["qty_on_hand"] == 6
+    assert removed == [c["variant_id"]]
+    assert sync(client, auth, since)[:2] == ({}, [])
+
+
+def test_small_pages_deliver_every_change_once(client, auth, add_product):
+    variants = [add_product(f"C{i:02d}", qty=1)["variant_id"] for i in range(7)]
+    _, _, since, _ = sync(client, auth)
+    for i in range(0, 7, 2):
+        client.post("/inventory/scan-increase", headers=auth, json={"code": f"C{i:02d}", "qty": 1})
+    client.delete(f"/inventory/items/{variants[1]}", headers=auth)
+
+    first = changes(client, auth, since, limit=2)
+    items, removed, since, pages = sync(client, auth, since, limit=2)
+
+    assert first["has_more"] is True and len(first["items"]) + len(first["removed"]) == 2
+    assert pages == 3
+    assert set(items) == {variants[i] for i in range(0, 7, 2)}
+    assert removed == [variants[1]]
+    assert sync(client, auth, since)[:2] == ({}, [])
+
+
+def test_bad_cursor_is_rejected(client, auth):
+    assert client.get("/inventory/changes", headers=auth, params={"since": "garbage"}).status_code == 400
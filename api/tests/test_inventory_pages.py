@@ -0,0 +1,103 @@
+import pytest
+
+from app.services.pagination import encode_cursor
+
+SORT_VALUES = {
+    "name": lambda item: (item["product_name"], item["variant_name"] or "", item["variant_id"]),
+    "qty": lambda item: (item["qty_on_hand"], item["product_name"], item["variant_name"] or "", item["variant_id"]),
+    "price": lambda item: (item["sale_price"], item["variant_id"]),
+}
+
+
+def walk(client, auth, limit, **params):
+    pages = []
+    cursor = None
+    while True:
+        query = {**params, "limit": limit, **({"cursor": cursor} if cursor else {})}
+        response = client.get("/inventory/items", headers=auth, params=query)
+        assert response.status_code == 200, response.text
+        pages.append(response.json())
+        cursor = response.headers.get("X-Next-Cursor")
+        if cursor is None:
+            return pages
+        assert len(pages[-1]) == limit
+
+
+@pytest.fixture
+def catalog(add_product):
+    # Repeated names, prices and quantities so every tie-breaker is exercised.
+    for i in range(23):
+        add_product(
+            f"C{i:02d}",
+            qty=i % 4,
+            sale_price=5 + i % 3,
+            product_name=f"Item {i % 5}",
+            category="Tops" if i % 2 else "Shoes",
+            brand="Acme" if i % 3 else None,
+        )
+
+
+@pytest.mark.parametrize("sort", ["name", "qty", "price", "updated"])
+@pytest.mark.parametrize("order", ["asc", "desc"])
+def test_pages_cover_the_catalog_once_in_order(client, auth, catalog, sort, order):
+    everything = client.get("/inventory/items", headers=auth, params={"sort": sort, "order": order, "limit": 500})
+    assert "X-Next-Cursor" not in everything.headers
+
+    pages = walk(client, auth, 4, sort=sort, order=order)
+    walked = [item for page in pages for item in page]
+
+    assert len(pages) == 6
+    assert walked == everything.json()
+    assert len({item["variant_id"] for item in walked}) == 23
+    if sort in SORT_VALUES:
+        keys = [SORT_VALUES[sort](item) for item in walked]
+        assert keys == sorted(keys, reverse=order == "desc")
+
+
+def test_filters_apply_on_every_page(client, auth, catalog):
+    pages = walk(client, auth, 2, sort="qty", order="desc", category="Tops", brand="Acme", min_qty=1)
+    walked = [item for page in pages for item in page]
+
+    assert walked
+    assert all(item["category"] == "Tops" and item["brand"] == "Acme" and item["qty_on_hand"] >= 1 for item in walked)
+    everything = client.get(
+        "/inventory/items",
+        headers=auth,
+        params={"sort": "qty", "order": "desc", "category": "Tops", "brand": "Acme", "min_qty": 1},
+    ).json()
+    assert walked == everything
+
+
+def test_cursor_is_bound_to_its_sort(client, auth, catalog):
+    response = client.get("/inventory/items", headers=auth, params={"sort": "price", "limit": 3})
+    cursor = response.headers["X-Next-Cursor"]
+
+    assert client.get("/inventory/items", headers=auth, params={"sort": "name", "cursor": cursor}).status_code == 400
+    assert client.get("/inventory/items", headers=auth, params={"cursor": "garbage"}).status_code == 400
+
+
+@pytest.mark.parametrize(
+    "sort, values",
+    [
+        ("qty", ["x", "a", "b", "not-a-uuid"]),
+        ("price", ["cheap", "00000000-0000-0000-0000-000000000000"]),
+        ("updated", ["not-a-time", "00000000-0000-0000-0000-000000000000"]),
+        ("name", [{"a": 1}, "b", "00000000-0000-0000-0000-000000000000"]),
+    ],
+)
+def test_cursor_with_badly_typed_values_is_rejected(client, auth, catalog, sort, values):
+    cursor = encode_cursor(f"{sort}:asc", values)
+
+    response = client.get("/inventory/items", headers=auth, params={"sort": sort, "cursor": cursor})
+
+    assert response.status_code == 400
+    assert client.get("/inventory/items", headers=auth, params={"sort": sort}).status_code == 200
+
+
+@pytest.mark.parametrize("sort, values", [("qty", ["x", "a", "b", "not-a-uuid"]), ("cover", ["long", "not-a-uuid"])])
+def test_low_stock_cursor_with_badly_typed_values_is_rejected(client, auth, catalog, sort, values):
+    cursor = encode_cursor(f"low_stock:{sort}", values)
+
+    response = client.get("/inventory/alerts/low-stock", headers=auth, params={"sort": sort, "cursor": cursor})
+
+    assert response.status_code == 400
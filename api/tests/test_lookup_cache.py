@@ -0,0 +1,39 @@
+from sqlalchemy import text
+
+from app.services.dashboard import adjust_invested_for_stock, get_dashboard_totals, recompute_dashboard_totals
+from app.services.lookup_cache import code_cache, stock_cache, variant_cache
+
+
+def test_stale_cached_code_cannot_add_stock_to_a_deleted_variant(client, auth, db, add_product):
+    a = add_product("A", qty=3)
+    assert client.get("/inventory/by-code/A", headers=auth).status_code == 200
+    cached = (code_cache.get("A"), variant_cache.get(a["variant_id"]), stock_cache.get(a["variant_id"]))
+    assert None not in cached
+
+    # Deleted through another API process: this one's caches are not told.
+    assert client.delete(f"/inventory/items/{a['variant_id']}", headers=auth).status_code == 200
+    code_cache.set("A", cached[0])
+    variant_cache.set(a["variant_id"], cached[1])
+    stock_cache.set(a["variant_id"], cached[2])
+
+    response = client.post("/inventory/scan-increase", headers=auth, json={"code": "A", "qty": 5})
+
+    assert response.status_code == 404
+    assert code_cache.get("A") is None
+    db.rollback()
+    assert db.execute(text("SELECT count(*) FROM stock_movements WHERE qty_delta = 5")).scalar_one() == 0
+    assert get_dashboard_totals(db) == recompute_dashboard_totals(db)
+
+
+def test_invested_ignores_stock_of_inactive_variants(client, auth, db, add_product):
+    a = add_product("A", qty=3, purchase_price=2)
+    add_product("B", qty=1, purchase_price=4)
+    assert client.delete(f"/inventory/items/{a['variant_id']}", headers=auth).status_code == 200
+
+    # A batch scan that read A before the delete committed.
+    db.rollback()
+    adjust_invested_for_stock(db, {a["variant_id"]: 5})
+    db.commit()
+
+    assert get_dashboard_totals(db) == recompute_dashboard_totals(db)
+    assert get_dashboard_totals(db)["invested_amount"] == 4
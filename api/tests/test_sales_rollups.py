@@ -0,0 +1,31 @@
+from sqlalchemy import text
+
+from app.services.sales_reports import check_sales_rollups, rebuild_sales_rollups
+
+
+def category_rows(db, table):
+    db.rollback()
+    return db.execute(
+        text(f"SELECT category, SUM(units)::int FROM {table} GROUP BY category ORDER BY category")
+    ).all()
+
+
+def test_recategorized_variant_keeps_earlier_sales_in_their_category(client, auth, db, add_product):
+    a = add_product("A", qty=10, category="Blusas")
+    sale = {"items": [{"code": "A", "qty": 2}]}
+
+    assert client.post("/sales/checkout", headers=auth, json=sale).status_code == 200
+    response = client.patch(f"/inventory/items/{a['variant_id']}", headers=auth, json={"category": "Camisas"})
+    assert response.status_code == 200, response.text
+    assert client.post("/sales/checkout", headers=auth, json=sale).status_code == 200
+
+    expected = [("Blusas", 2), ("Camisas", 2)]
+    assert category_rows(db, "sales_daily_categories") == expected
+    assert category_rows(db, "sales_daily_variants") == expected
+    assert check_sales_rollups(db) == []
+
+    # The ledger only knows the current category.
+    rebuild_sales_rollups(db)
+    db.commit()
+    assert category_rows(db, "sales_daily_variants") == [("Camisas", 4)]
+    assert check_sales_rollups(db) == []
@@ -0,0 +1,35 @@
+def search(client, auth, q, **params):
+    response = client.get("/catalog/search", headers=auth, params={"q": q, **params})
+    assert response.status_code == 200, response.text
+    return response.json()
+
+
+def test_typo_is_matched_by_trigrams_only(client, auth, add_product):
+    add_product("J1", product_name="Chaqueta negra")
+    add_product("V1", product_name="Vestido azul")
+
+    results = search(client, auth, "chaqeta")
+
+    assert [item["primary_code"] for item in results] == ["J1"]
+
+
+def test_tiers_rank_code_then_words_then_fuzzy(client, auth, add_product):
+    add_product("BLUS", product_name="Falda corta")
+    add_product("X1", product_name="Blusa roja")
+    add_product("X3", product_name="Bluza rosada")
+
+    results = search(client, auth, "BLUS")
+
+    assert [item["primary_code"] for item in results] == ["BLUS", "X1", "X3"]
+
+
+def test_fuzzy_arm_is_capped(client, auth, add_product, monkeypatch):
+    from app.services import catalog
+
+    for i in range(6):
+        add_product(f"C{i}", product_name=f"Camisa {i}")
+    monkeypatch.setattr(catalog, "SEARCH_CANDIDATES", 4)
+
+    results = search(client, auth, "camsa", limit=100)
+
+    assert len(results) == 4
@@ -0,0 +1,141 @@
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy import text
+from sqlalchemy.exc import OperationalError
+
+from app import main
+
+
+def op(client_id, type_, payload, minutes_ago=10, **fields):
+    timestamp = datetime.now(timezone.utc) - timedelta(minutes=minutes_ago)
+    return {"client_id": client_id, "client_timestamp": timestamp.isoformat(), "type": type_, "payload": payload, **fields}
+
+
+def replay(client, auth, *operations):
+    response = client.post("/sync/replay", headers=auth, json={"operations": list(operations)})
+    assert response.status_code == 200, response.text
+    return response.json()
+
+
+def stock_of(client, auth, code):
+    return client.get(f"/inventory/by-code/{code}", headers=auth).json()["qty_on_hand"]
+
+
+def test_operations_apply_in_the_order_sent(client, auth, add_product):
+    add_product("A", qty=1)
+
+    body = replay(
+        client,
+        auth,
+        op("1", "checkout", {"items": [{"code": "A", "qty": 3}]}),
+        op("2", "scan_increase", {"code": "A", "qty": 5}),
+        op("3", "checkout", {"items": [{"code": "A", "qty": 3}]}),
+        op("4", "scan_upsert", {"code": "NEW", "product_name": "New", "initial_qty": 2}),
+        op("5", "scan_increase", {"code": "NEW", "qty": 1}),
+    )
+
+    assert [(r["client_id"], r["ok"], r["status_code"]) for r in body["results"]] == [
+        ("1", False, 400),
+        ("2", True, 200),
+        ("3", True, 200),
+        ("4", True, 200),
+        ("5", True, 200),
+    ]
+    assert (body["applied"], body["failed"]) == (4, 1)
+    assert stock_of(client, auth, "A") == 3
+    assert stock_of(client, auth, "NEW") == 3
+
+
+def test_resending_a_batch_replays_stored_results(client, auth, db, add_product):
+    add_product("A", qty=5)
+    operations = [
+        op("sale", "checkout", {"items": [{"code": "A", "qty": 2}]}),
+        op("scan", "scan_increase", {"code": "A", "qty": 1}),
+        op("missing", "scan_increase", {"code": "NOPE", "qty": 1}),
+    ]
+
+    first = replay(client, auth, *operations)
+    again = replay(client, auth, *operations)
+
+    assert again == first
+    assert stock_of(client, auth, "A") == 4
+    db.rollback()
+    assert db.execute(text("SELECT count(*) FROM sales")).scalar_one() == 1
+
+
+def test_edit_older_than_a_server_edit_is_rejected(client, auth, add_product):
+    a = add_product("A", sale_price=5)
+    assert client.patch(f"/inventory/items/{a['variant_id']}", headers=auth, json={"sale_price": 6}).status_code == 200
+
+    body = replay(
+        client,
+        auth,
+        op("stale", "item_update", {"sale_price": 7}, minutes_ago=10, variant_id=a["variant_id"]),
+        op("fresh", "item_update", {"sale_price": 8}, minutes_ago=-1, variant_id=a["variant_id"]),
+        # Edits made earlier in the same batch do not make this one stale.
+        op("fresh-2", "item_update", {"location": "B2"}, minutes_ago=-1, variant_id=a["variant_id"]),
+    )
+
+    assert [(r["ok"], r["status_code"]) for r in body["results"]] == [(False, 409), (True, 200), (True, 200)]
+    item = client.get("/inventory/by-code/A", headers=auth).json()
+    assert item["sale_price"] == 8
+
+
+def test_invalid_variant_id_fails_only_that_operation(client, auth, add_product):
+    add_product("A", qty=1)
+
+    body = replay(
+        client,
+        auth,
+        op("bad", "item_update", {"sale_price": 1}, variant_id="not-a-uuid"),
+        op("ok", "scan_increase", {"code": "A", "qty": 1}),
+    )
+
+    assert [(r["ok"], r["status_code"]) for r in body["results"]] == [(False, 400), (True, 200)]
+    assert stock_of(client, auth, "A") == 2
+
+
+def test_database_failure_fails_only_that_operation(client, auth, add_product, monkeypatch):
+    add_product("A", qty=1)
+    increase_stock = main.increase_stock
+
+    def flaky_increase_stock(db, payload, user, idempotency_key=None):
+        if idempotency_key == "flaky":
+            db.execute(text("SELECT 1"))
+            raise OperationalError("SELECT 1", {}, Exception("lock timeout"))
+        return increase_stock(db, payload, user, idempotency_key)
+
+    monkeypatch.setattr(main, "increase_stock", flaky_increase_stock)
+    body = replay(
+        client,
+        auth,
+        op("flaky", "scan_increase", {"code": "A", "qty": 1}),
+        op("ok", "scan_increase", {"code": "A", "qty": 2}),
+    )
+
+    assert [(r["ok"], r["status_code"]) for r in body["results"]] == [(False, 503), (True, 200)]
+    assert stock_of(client, auth, "A") == 3
+
+    # Nothing of the failed operation was kept: resending it applies it.
+    monkeypatch.setattr(main, "increase_stock", increase_stock)
+    body = replay(client, auth, op("flaky", "scan_increase", {"code": "A", "qty": 1}))
+    assert body["results"][0]["ok"]
+    assert stock_of(client, auth, "A") == 4
+
+
+def test_database_failure_in_checkout_is_reported_as_busy(client, auth, add_product, monkeypatch):
+    add_product("A", qty=5)
+
+    def locked(db, variant_ids):
+        raise OperationalError("SELECT 1", {}, Exception("lock timeout"))
+
+    monkeypatch.setattr(main, "notify_inventory_change", locked)
+    body = replay(client, auth, op("sale", "checkout", {"items": [{"code": "A", "qty": 1}]}))
+    response = client.post("/sales/checkout", headers=auth, json={"items": [{"code": "A", "qty": 1}]})
+
+    assert [(r["ok"], r["status_code"], r["error"]) for r in body["results"]] == [
+        (False, 503, "Database busy, try again")
+    ]
+    assert response.status_code == 503
+    assert response.json() == {"detail": "Database busy, try again"}
+    assert stock_of(client, auth, "A") == 5
@@ -1,34 +1,140 @@
 ﻿import { API_BASE_URL } from "../config";
 
-async function request(path, { method = "GET", token, body } = {}) {
-  const res = await fetch(`${API_BASE_URL}${path}`, {
-    method,
-    headers: {
-      "Content-Type": "application/json",
-      ...(token ? { Authorization: `Bearer ${token}` } : {})
-    },
-    body: body ? JSON.stringify(body) : undefined
-  });
-
-  let payload = null;
-  try {
-    payload = await res.json();
-  } catch {
-    payload = null;
-  }
+function withQuery(path, params = {}) {
+  const query = Object.entries(params)
+    .filter(([, value]) => value !== undefined && value !== null && value !== "")
+    .map(([key, value]) => `${encodeURIComponent(key)}=${encodeURIComponent(value)}`)
+    .join("&");
+  return query ? `${path}?${query}` : path;
+}
+
+const IDEMPOTENT_RETRIES = 2;
+
+// One Idempotency-Key per user action (a checkout, a scan), created by the
+// screen when the action starts and passed on every retry of it, including
+// the user tapping again after a failure, so the server applies it at most
+// once. A new action gets a new key, even with the same body.
+export function newIdempotencyKey() {
+  return `${Date.now().toString(36)}-${Math.random().toString(36).slice(2, 12)}`;
+}
+
+// Whether a write that failed may already be applied, or still be running,
+// on the server: no response at all, a 5xx, or 409 (the first attempt with
+// that key is in progress). Its key must then be kept for the retry. Any
+// other 4xx is final and the key can be dropped.
+export function isRetryableWriteError(err) {
+  return !err.status || err.status >= 500 || err.status === 409;
+}
+
+function wait(ms) {
+  return new Promise((resolve) => setTimeout(resolve, ms));
+}
+
+async function send(path, { method = "GET", token, body, idempotencyKey = null } = {}) {
+  for (let attempt = 0; ; attempt += 1) {
+    let res;
+    try {
+      res = await fetch(`${API_BASE_URL}${path}`, {
+        method,
+        headers: {
+          "Content-Type": "application/json",
+          ...(token ? { Authorization: `Bearer ${token}` } : {}),
+          ...(idempotencyKey ? { "Idempotency-Key": idempotencyKey } : {})
+        },
+        body: body ? JSON.stringify(body) : undefined
+      });
+    } catch (err) {
+      if (idempotencyKey && attempt < IDEMPOTENT_RETRIES) {
+        await wait(1000 * (attempt + 1));
+        continue;
+      }
+      throw err;
+    }
+
+    if (idempotencyKey && res.status === 409 && attempt < IDEMPOTENT_RETRIES) {
+      await wait(1000 * Number(res.headers.get("Retry-After") || 1));
+      continue;
+    }
+
+    let payload = null;
+    try {
+      payload = await res.json();
+    } catch {
+      payload = null;
+    }
+
+    if (!res.ok) {
+      const err = new Error(payload?.detail || "Request failed");
+      err.status = res.status;
+      throw err;
+    }
 
-  if (!res.ok) {
-    throw new Error(payload?.detail || "Request failed");
+    return { payload, headers: res.headers };
   }
+}
 
+async function request(path, options) {
+  const { payload } = await send(path, options);
   return payload;
 }
 
+async function getInventoryPage(token, params = {}) {
+  const { payload, headers } = await send(withQuery("/inventory/items", params), { token });
+  return { items: payload, nextCursor: headers.get("X-Next-Cursor") };
+}
+
+async function getAllInventoryItems(token, params = {}) {
+  const items = [];
+  let cursor = null;
+  do {
+    const page = await getInventoryPage(token, { ...params, limit: 500, cursor });
+    items.push(...page.items);
+    cursor = page.nextCursor;
+  } while (cursor);
+  return items;
+}
+
+async function getAllLowStock(token) {
+  const items = [];
+  let cursor = null;
+  do {
+    const { payload, headers } = await send(
+      withQuery("/inventory/alerts/low-stock", { limit: 500, cursor }),
+      { token }
+    );
+    items.push(...payload);
+    cursor = headers.get("X-Next-Cursor");
+  } while (cursor);
+  return items;
+}
+
+async function searchCatalog(token, q, cursor) {
+  const { payload, headers } = await send(withQuery("/catalog/search", { q, cursor }), { token });
+  return { items: payload, nextCursor: headers.get("X-Next-Cursor") };
+}
+
+// Operations queued while offline ({client_id, client_timestamp, type,
+// payload}), sent in order in batches the server accepts.
+async function replayOperations(token, operations) {
+  const results = [];
+  for (let start = 0; start < operations.length; start += 500) {
+    const { payload } = await send("/sync/replay", {
+      method: "POST",
+      token,
+      body: { operations: operations.slice(start, start + 500) }
+    });
+    results.push(...payload.results);
+  }
+  return results;
+}
+
 export const api = {
   login: (data) => request("/auth/login", { method: "POST", body: data }),
   getDashboardSummary: (token) => request("/dashboard/summary", { token }),
-  getLowStock: (token) => request("/inventory/alerts/low-stock", { token }),
-  getInventoryItems: (token) => request("/inventory/items", { token }),
+  getLowStock: getAllLowStock,
+  getInventoryPage,
+  getInventoryItems: getAllInventoryItems,
+  getInventoryChanges: (token, since) => request(withQuery("/inventory/changes", { since }), { token }),
   updateInventoryItem: (token, variantId, data) =>
     request(`/inventory/items/${encodeURIComponent(variantId)}`, {
       method: "PATCH",
@@ -40,8 +146,15 @@ export const api = {
       method: "DELETE",
       token
     }),
+  searchCatalog,
   getByCode: (token, code) => request(`/inventory/by-code/${encodeURIComponent(code)}`, { token }),
-  scanIncrease: (token, data) => request("/inventory/scan-increase", { method: "POST", token, body: data }),
-  scanUpsert: (token, data) => request("/catalog/scan-upsert", { method: "POST", token, body: data }),
-  checkout: (token, data) => request("/sales/checkout", { method: "POST", token, body: data })
+  scanIncrease: (token, data, idempotencyKey) =>
+    request("/inventory/scan-increase", { method: "POST", token, body: data, idempotencyKey }),
+  scanIncreaseBatch: (token, items) =>
+    request("/inventory/scan-increase/batch", { method: "POST", token, body: { items } }),
+  scanUpsert: (token, data, idempotencyKey) =>
+    request("/catalog/scan-upsert", { method: "POST", token, body: data, idempotencyKey }),
+  checkout: (token, data, idempotencyKey) =>
+    request("/sales/checkout", { method: "POST", token, body: data, idempotencyKey }),
+  replayOperations
 };
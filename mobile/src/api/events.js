@@ -0,0 +1,68 @@
+import { API_BASE_URL } from "../config";
+
+const RECONNECT_DELAY_MS = 5000;
+// responseText keeps every byte received on the connection. Past this many
+// characters the stream is reopened; the server starts each connection with
+// a fresh snapshot, so nothing is missed.
+const MAX_BUFFER_CHARS = 256 * 1024;
+
+function parseEvents(chunk) {
+  return chunk
+    .split("\n\n")
+    .map((block) => {
+      const lines = block.split("\n");
+      const data = lines
+        .filter((line) => line.startsWith("data:"))
+        .map((line) => line.slice(5).trim())
+        .join("\n");
+      return data ? JSON.parse(data) : null;
+    })
+    .filter(Boolean);
+}
+
+// React Native's fetch cannot stream response bodies, so the event stream is
+// read incrementally from XMLHttpRequest.responseText.
+export function subscribeInventoryEvents(token, onEvent) {
+  let xhr = null;
+  let closed = false;
+  let retryTimer = null;
+
+  const connect = () => {
+    let offset = 0;
+    xhr = new XMLHttpRequest();
+    xhr.open("GET", `${API_BASE_URL}/events/stream`);
+    xhr.setRequestHeader("Accept", "text/event-stream");
+    xhr.setRequestHeader("Authorization", `Bearer ${token}`);
+    xhr.onprogress = () => {
+      const end = xhr.responseText.lastIndexOf("\n\n");
+      if (end < offset) return;
+      const chunk = xhr.responseText.slice(offset, end);
+      offset = end + 2;
+      try {
+        parseEvents(chunk).forEach(onEvent);
+      } catch {
+        // Ignore a malformed event; the next snapshot resynchronizes.
+      }
+      if (offset > MAX_BUFFER_CHARS && !closed) {
+        xhr.onprogress = null;
+        xhr.onloadend = null;
+        xhr.abort();
+        connect();
+      }
+    };
+    xhr.onloadend = () => {
+      if (!closed) {
+        retryTimer = setTimeout(connect, RECONNECT_DELAY_MS);
+      }
+    };
+    xhr.send();
+  };
+
+  connect();
+
+  return () => {
+    closed = true;
+    clearTimeout(retryTimer);
+    xhr?.abort();
+  };
+}
@@ -1,7 +1,7 @@
 ﻿import { Alert, ScrollView, StyleSheet, Text, TextInput, TouchableOpacity, View } from "react-native";
-import { useState } from "react";
+import { useEffect, useRef, useState } from "react";
 
-import { api } from "../api/client";
+import { api, isRetryableWriteError, newIdempotencyKey } from "../api/client";
 import { useAuth } from "../context/AuthContext";
 import { useCart } from "../context/CartContext";
 import { generateAndShareInvoice } from "../utils/invoice";
@@ -16,6 +16,12 @@ export default function CartScreen({ navigation }) {
   const [customerName, setCustomerName] = useState("");
   const [customerPhone, setCustomerPhone] = useState("");
   const [loading, setLoading] = useState(false);
+  // Kept across retries of the same sale; a changed cart is a new sale.
+  const checkoutKey = useRef(null);
+
+  useEffect(() => {
+    checkoutKey.current = null;
+  }, [items, customerName, customerPhone]);
 
   const checkout = async () => {
     if (!items.length) {
@@ -31,7 +37,9 @@ export default function CartScreen({ navigation }) {
         items: items.map((i) => ({ code: i.code, qty: i.qty }))
       };
 
-      const sale = await api.checkout(token, payload);
+      checkoutKey.current = checkoutKey.current || newIdempotencyKey();
+      const sale = await api.checkout(token, payload, checkoutKey.current);
+      checkoutKey.current = null;
       await generateAndShareInvoice({
         sale,
         customerName,
@@ -48,6 +56,9 @@ export default function CartScreen({ navigation }) {
       setCustomerPhone("");
       Alert.alert("Venta confirmada", `Ticket #${sale.ticket_number}`);
     } catch (err) {
+      if (!isRetryableWriteError(err)) {
+        checkoutKey.current = null;
+      }
       Alert.alert("Error de venta", err.message);
     } finally {
       setLoading(false);
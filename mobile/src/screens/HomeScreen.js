@@ -1,6 +1,6 @@
 ﻿import AsyncStorage from "@react-native-async-storage/async-storage";
 import { Audio } from "expo-av";
-import { useCallback, useEffect, useMemo, useState } from "react";
+import { useCallback, useEffect, useMemo, useRef, useState } from "react";
 import {
   Modal,
   RefreshControl,
@@ -12,6 +12,7 @@ import {
 } from "react-native";
 
 import { api } from "../api/client";
+import { subscribeInventoryEvents } from "../api/events";
 import { useAuth } from "../context/AuthContext";
 
 const NOTIFICATIONS_KEY = "stock_notifications_v1";
@@ -98,7 +99,7 @@ export default function HomeScreen({ navigation }) {
       const now = new Date().toISOString();
       const prevByVariant = new Map(prev.map((n) => [n.variant_id, n]));
       const synced = alerts
-        .filter((item) => item.qty_on_hand <= 1)
+        .filter((item) => item.qty_on_hand <= (item.reorder_point ?? 1))
         .map((item) => ({
           id:
             prevByVariant.get(item.variant_id)?.id ||
@@ -137,6 +138,8 @@ export default function HomeScreen({ navigation }) {
     }
   }, [persistNotifications]);
 
+  const lowStockRef = useRef(new Map());
+
   const load = useCallback(async () => {
     setLoading(true);
     try {
@@ -145,6 +148,7 @@ export default function HomeScreen({ navigation }) {
         api.getLowStock(token)
       ]);
       setSummary(s);
+      lowStockRef.current = new Map(alerts.map((item) => [item.variant_id, item]));
       await mergeNotifications(alerts);
     } finally {
       setLoading(false);
@@ -156,11 +160,18 @@ export default function HomeScreen({ navigation }) {
   }, [load]);
 
   useEffect(() => {
-    const interval = setInterval(() => {
-      load();
-    }, 30000);
-    return () => clearInterval(interval);
-  }, [load]);
+    if (!token) return undefined;
+    return subscribeInventoryEvents(token, (event) => {
+      setSummary(event.summary);
+      if (event.event === "snapshot") {
+        lowStockRef.current = new Map(event.low_stock.map((item) => [item.variant_id, item]));
+      } else {
+        event.low_stock_remove.forEach((variantId) => lowStockRef.current.delete(variantId));
+        event.low_stock_upsert.forEach((item) => lowStockRef.current.set(item.variant_id, item));
+      }
+      mergeNotifications(Array.from(lowStockRef.current.values()));
+    });
+  }, [mergeNotifications, token]);
 
   const notificationCount = useMemo(
     () => notifications.filter((item) => !item.read).length,
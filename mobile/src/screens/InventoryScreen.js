@@ -1,4 +1,4 @@
-﻿import { useCallback, useEffect, useMemo, useState } from "react";
+﻿import { useCallback, useEffect, useMemo, useRef, useState } from "react";
 import * as ImagePicker from "expo-image-picker";
 import {
   Alert,
@@ -13,7 +13,7 @@ import {
   View
 } from "react-native";
 
-import { api } from "../api/client";
+import { api, isRetryableWriteError, newIdempotencyKey } from "../api/client";
 import { useAuth } from "../context/AuthContext";
 
 function money(value) {
@@ -29,6 +29,14 @@ function normalizeText(value) {
     .trim();
 }
 
+function sortItems(items) {
+  return items.sort(
+    (a, b) =>
+      String(a.product_name || "").localeCompare(String(b.product_name || "")) ||
+      String(a.variant_name || "").localeCompare(String(b.variant_name || ""))
+  );
+}
+
 function parseDecimalInput(value) {
   const raw = String(value ?? "").trim();
   if (!raw) return 0;
@@ -37,6 +45,13 @@ function parseDecimalInput(value) {
   return Number.isFinite(parsed) ? parsed : null;
 }
 
+function parseCountInput(value, { min = 0, allowEmpty = false } = {}) {
+  const raw = String(value ?? "").trim();
+  if (!raw) return allowEmpty ? undefined : null;
+  const parsed = Number(raw);
+  return Number.isInteger(parsed) && parsed >= min ? parsed : null;
+}
+
 export default function InventoryScreen({ navigation }) {
   const { token } = useAuth();
   const [manualCode, setManualCode] = useState("");
@@ -53,14 +68,34 @@ export default function InventoryScreen({ navigation }) {
     location: "",
     purchase_price: "0",
     sale_price: "0",
+    reorder_point: "1",
+    reorder_qty: "",
     photo_url: ""
   });
 
+  const replicaRef = useRef({ token: null, byId: new Map(), cursor: null });
+  // Idempotency key of the pending manual increase, kept across its retries.
+  const increaseKey = useRef(null);
+
+  useEffect(() => {
+    increaseKey.current = null;
+  }, [manualCode, qty]);
+
   const loadItems = useCallback(async () => {
     setLoading(true);
     try {
-      const data = await api.getInventoryItems(token);
-      setItems(data);
+      if (replicaRef.current.token !== token) {
+        replicaRef.current = { token, byId: new Map(), cursor: null };
+      }
+      const replica = replicaRef.current;
+      let page;
+      do {
+        page = await api.getInventoryChanges(token, replica.cursor);
+        page.items.forEach((item) => replica.byId.set(item.variant_id, item));
+        page.removed.forEach((variantId) => replica.byId.delete(variantId));
+        replica.cursor = page.cursor;
+      } while (page.has_more);
+      setItems(sortItems(Array.from(replica.byId.values())));
     } catch (err) {
       Alert.alert("Error", err.message || "No se pudo cargar inventario");
     } finally {
@@ -80,11 +115,16 @@ export default function InventoryScreen({ navigation }) {
   const addByCode = async () => {
     if (!manualCode) return;
     try {
-      await api.scanIncrease(token, { code: manualCode, qty: Number(qty || 1) });
+      increaseKey.current = increaseKey.current || newIdempotencyKey();
+      await api.scanIncrease(token, { code: manualCode, qty: Number(qty || 1) }, increaseKey.current);
+      increaseKey.current = null;
       Alert.alert("Stock actualizado", "Se incremento inventario correctamente.");
       setManualCode("");
       await loadItems();
     } catch (err) {
+      if (!isRetryableWriteError(err)) {
+        increaseKey.current = null;
+      }
       Alert.alert("Error", err.message);
     }
   };
@@ -99,6 +139,8 @@ export default function InventoryScreen({ navigation }) {
       location: item.location || "",
       purchase_price: String(item.purchase_price ?? 0),
       sale_price: String(item.sale_price ?? 0),
+      reorder_point: String(item.reorder_point ?? 1),
+      reorder_qty: item.reorder_qty ? String(item.reorder_qty) : "",
       photo_url: item.photo_url || ""
     });
   };
@@ -154,6 +196,13 @@ export default function InventoryScreen({ navigation }) {
       return;
     }
 
+    const reorderPoint = parseCountInput(editForm.reorder_point);
+    const reorderQty = parseCountInput(editForm.reorder_qty, { min: 1, allowEmpty: true });
+    if (reorderPoint === null || reorderQty === null) {
+      Alert.alert("Reposicion invalida", "Usa numeros enteros para el punto y la cantidad de reposicion.");
+      return;
+    }
+
     try {
       await api.updateInventoryItem(token, editingItem.variant_id, {
         product_name: editForm.product_name.trim(),
@@ -163,6 +212,8 @@ export default function InventoryScreen({ navigation }) {
         location: editForm.location || null,
         purchase_price: purchasePrice,
         sale_price: salePrice,
+        reorder_point: reorderPoint,
+        reorder_qty: reorderQty ?? null,
         photo_url: editForm.photo_url || null
       });
       Alert.alert("Actualizado", "Producto actualizado correctamente.");
@@ -285,7 +336,7 @@ export default function InventoryScreen({ navigation }) {
               <Text style={styles.meta}>Venta: {money(item.sale_price)}</Text>
 
               <View style={styles.cardFooter}>
-                <View style={[styles.stockPill, item.qty_on_hand <= 1 ? styles.stockLow : styles.stockOk]}>
+                <View style={[styles.stockPill, item.qty_on_hand <= (item.reorder_point ?? 1) ? styles.stockLow : styles.stockOk]}>
                   <Text style={styles.stockText}>Stock: {item.qty_on_hand}</Text>
                 </View>
                 <View style={styles.cardActions}>
@@ -357,6 +408,20 @@ export default function InventoryScreen({ navigation }) {
                 value={editForm.sale_price}
                 onChangeText={(v) => updateEditField("sale_price", v)}
               />
+              <TextInput
+                style={styles.input}
+                placeholder="Avisar con stock de (punto de reposicion)"
+                keyboardType="number-pad"
+                value={editForm.reorder_point}
+                onChangeText={(v) => updateEditField("reorder_point", v)}
+              />
+              <TextInput
+                style={styles.input}
+                placeholder="Cantidad a reponer (opcional)"
+                keyboardType="number-pad"
+                value={editForm.reorder_qty}
+                onChangeText={(v) => updateEditField("reorder_qty", v)}
+              />
 
               <TouchableOpacity style={styles.photoBtn} onPress={takePhotoForEdit}>
                 <Text style={styles.photoBtnText}>
@@ -1,4 +1,4 @@
-﻿import { useState } from "react";
+﻿import { useEffect, useRef, useState } from "react";
 import {
   Alert,
   Image,
@@ -12,7 +12,7 @@ import {
 import { CameraView, useCameraPermissions } from "expo-camera";
 import * as ImagePicker from "expo-image-picker";
 
-import { api } from "../api/client";
+import { api, isRetryableWriteError, newIdempotencyKey } from "../api/client";
 import { useAuth } from "../context/AuthContext";
 import { useCart } from "../context/CartContext";
 
@@ -38,6 +38,25 @@ export default function ScannerScreen({ route, navigation }) {
   const [purchasePrice, setPurchasePrice] = useState("");
   const [salePrice, setSalePrice] = useState("");
   const [initialQty, setInitialQty] = useState("");
+  // Idempotency key of the pending stock write, kept across retries of it.
+  // Editing the form makes the next tap a new write.
+  const writeKey = useRef(null);
+
+  useEffect(() => {
+    writeKey.current = null;
+  }, [
+    code,
+    qty,
+    productName,
+    brand,
+    category,
+    variantName,
+    location,
+    photoUrl,
+    purchasePrice,
+    salePrice,
+    initialQty
+  ]);
 
   const resetState = () => {
     setLocked(false);
@@ -93,10 +112,15 @@ export default function ScannerScreen({ route, navigation }) {
 
   const increaseStock = async () => {
     try {
-      await api.scanIncrease(token, { code, qty: Number(qty || 1) });
+      writeKey.current = writeKey.current || newIdempotencyKey();
+      await api.scanIncrease(token, { code, qty: Number(qty || 1) }, writeKey.current);
+      writeKey.current = null;
       Alert.alert("Stock actualizado", "Inventario aumentado.");
       navigation.goBack();
     } catch (err) {
+      if (!isRetryableWriteError(err)) {
+        writeKey.current = null;
+      }
       Alert.alert("Error", err.message);
     }
   };
@@ -108,6 +132,7 @@ export default function ScannerScreen({ route, navigation }) {
     }
 
     try {
+      writeKey.current = writeKey.current || newIdempotencyKey();
       await api.scanUpsert(token, {
         code,
         product_name: productName,
@@ -119,10 +144,14 @@ export default function ScannerScreen({ route, navigation }) {
         purchase_price: Number(purchasePrice || 0),
         sale_price: Number(salePrice || 0),
         initial_qty: Number(initialQty || 0)
-      });
+      }, writeKey.current);
+      writeKey.current = null;
       Alert.alert("Producto creado", "Se creo producto/variante y stock inicial.");
       navigation.goBack();
     } catch (err) {
+      if (!isRetryableWriteError(err)) {
+        writeKey.current = null;
+      }
       Alert.alert("Error", err.message);
     }
   };